@@ -1,30 +1,51 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db.models import Case, Value, When
 from .models.base import Account, Transaction, TransactionCategory
+from .models.budget import Budget, BudgetPeriod
+from .models.currency import ExchangeRate
+from .models.rules import CategorizationRule
+from .models.archive import ClosedPeriod, AccountPeriodBalance, ArchivedTransaction
+from .models.jobs import Job
+from .models.ledger import LedgerEntry, LedgerSnapshot
+from .models.anomaly import TransactionAnomaly
+from .services import choices, search
+from .admin_performance import AutocompleteFilter, CachedDateFilter, LedgerAdminMixin
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
-    list_display = ('name', 'institution', 'account_type', 'current_balance', 'created_at', 'is_active')
+    list_display = ('name', 'institution', 'account_type', 'currency', 'current_balance', 'created_at', 'is_active')
     search_fields = ('name', 'institution')
-    list_filter = ('account_type', 'is_active', 'created_at')
+    list_filter = ('account_type', 'currency', 'is_active', 'created_at')
     actions = ['mark_as_active', 'mark_as_inactive']
 
     @admin.action(description="Mark selected accounts as active")
     def mark_as_active(self, request, queryset):
         queryset.update(is_active=True)
+        # update() non emette post_save: le opzioni dei form vanno invalidate qui
+        choices.invalidate_choices(sender=Account)
 
     @admin.action(description="Mark selected accounts as inactive")
     def mark_as_inactive(self, request, queryset):
         queryset.update(is_active=False)
+        choices.invalidate_choices(sender=Account)
 
+    def get_queryset(self, request):
+        """Annotate balances in the changelist query instead of one aggregate per row"""
+        return super().get_queryset(request).with_balance()
+
+    @admin.display(description='Current Balance', ordering='balance')
     def current_balance(self, obj):
-        return f"{obj.current_balance()} €"
-    current_balance.short_description = 'Current Balance'
+        return f"{obj.balance} {obj.currency_symbol}"
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
-    list_display = ('date', 'account', 'amount', 'transaction_type', 'category', 'description')
+class TransactionAdmin(LedgerAdminMixin, admin.ModelAdmin):
+    list_display = ('date', 'account', 'amount', 'currency', 'transaction_type', 'category', 'description')
     list_filter = ('transaction_type', 'category', 'date', 'account')
+    performance_list_filter = (
+        'transaction_type', CachedDateFilter, ('account', AutocompleteFilter), ('category', AutocompleteFilter),
+    )
     search_fields = ('description', 'category__name', 'account__name')
     date_hierarchy = 'date'
     readonly_fields = ('created_at', 'modified_at')
@@ -33,6 +54,18 @@ class TransactionAdmin(admin.ModelAdmin):
         """Optimize queries by prefetching related fields"""
         return super().get_queryset(request).select_related('account', 'category')
 
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of icontains scans over search_fields"""
+        if not search_term.strip():
+            return queryset, False
+        ids = search.search_ids(queryset, search_term)
+        queryset = queryset.filter(pk__in=ids)
+        if ORDER_VAR in request.GET:
+            return queryset, False
+        # Ordine di rilevanza, salvo un ordinamento scelto dall'utente
+        rank = Case(*(When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)), default=Value(len(ids)))
+        return queryset.order_by(rank, '-pk'), False
+
 
 @admin.register(TransactionCategory)
 class TransactionCategoryAdmin(admin.ModelAdmin):
@@ -42,4 +75,136 @@ class TransactionCategoryAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         """Get complete category hierarchy for better display"""
-        return super().get_queryset(request).select_related('parent')
\ No newline at end of file
+        return super().get_queryset(request).select_related('parent')
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'account', 'amount', 'alert_threshold', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'category__name', 'account__name')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('category__parent', 'account')
+
+
+@admin.register(BudgetPeriod)
+class BudgetPeriodAdmin(admin.ModelAdmin):
+    list_display = ('budget', 'year', 'month', 'spent', 'remaining', 'alert_level')
+    list_filter = ('year', 'month')
+    readonly_fields = ('spent', 'alert_level', 'updated_at')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('budget')
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'date', 'rate')
+    list_filter = ('currency',)
+    date_hierarchy = 'date'
+
+
+@admin.register(CategorizationRule)
+class CategorizationRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'priority', 'match_type', 'pattern', 'transaction_type', 'account', 'category', 'is_active')
+    list_editable = ('priority', 'is_active')
+    list_filter = ('transaction_type', 'match_type', 'is_active')
+    search_fields = ('name', 'pattern', 'category__name')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('account', 'category__parent')
+
+
+class AccountPeriodBalanceInline(admin.TabularInline):
+    model = AccountPeriodBalance
+    readonly_fields = ('account', 'closing_balance')
+    extra = 0
+    can_delete = False
+
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('end_date', 'archived_count', 'closed_at')
+    readonly_fields = ('end_date', 'archived_count', 'closed_at')
+    inlines = [AccountPeriodBalanceInline]
+
+    def has_add_permission(self, request):
+        """Periods are closed with the close_period command"""
+        return False
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(LedgerAdminMixin, admin.ModelAdmin):
+    list_display = ('date', 'account', 'amount', 'currency', 'transaction_type', 'category', 'description')
+    list_filter = ('transaction_type', 'period', 'account')
+    performance_list_filter = ('transaction_type', 'period', CachedDateFilter, ('account', AutocompleteFilter))
+    date_hierarchy = 'date'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('account', 'category')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'key', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'result', 'last_error', 'created_at', 'finished_at')
+    actions = ['requeue']
+
+    @admin.action(description="Rimetti in coda")
+    def requeue(self, request, queryset):
+        queryset.filter(status=Job.FAILED).update(status=Job.QUEUED, attempts=0, finished_at=None)
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('account', 'sequence', 'kind', 'date', 'amount', 'transaction_id', 'recorded_at')
+    list_filter = ('kind', 'account')
+    search_fields = ('=transaction_id',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('account')
+
+    # Il registro è in sola aggiunta
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerSnapshot)
+class LedgerSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('account', 'sequence', 'total', 'recorded_at')
+    list_filter = ('account',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransactionAnomaly)
+class TransactionAnomalyAdmin(admin.ModelAdmin):
+    list_display = ('transaction', 'amount_score', 'new_description', 'detected_at')
+    list_filter = ('new_description',)
+    search_fields = ('=transaction__id',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('transaction')
+
+    # Le segnalazioni sono calcolate a ogni scrittura delle transazioni
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
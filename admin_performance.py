@@ -0,0 +1,189 @@
+"""
+Modalità prestazioni dell'admin per tabelle con milioni di transazioni.
+
+Con TRANSACTIONS_ADMIN_PERFORMANCE_MODE = True le changelist di transazioni e
+archivio:
+- filtrano conto e categoria con un campo di autocompletamento (la vista
+  autocomplete dell'admin) invece di elencare tutti gli oggetti collegati;
+- sostituiscono date_hierarchy, che esegue SELECT DISTINCT sulle date
+  dell'intera tabella a ogni pagina, con un filtro per anno e mese i cui
+  valori restano in cache per TRANSACTIONS_ADMIN_DATES_TIMEOUT secondi;
+- su PostgreSQL usano la stima delle righe del catalogo al posto di COUNT(*)
+  quando la lista non è filtrata e la tabella supera
+  TRANSACTIONS_ADMIN_ESTIMATE_THRESHOLD righe.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+from dateutil.relativedelta import relativedelta
+
+
+ESTIMATE_THRESHOLD = getattr(settings, 'TRANSACTIONS_ADMIN_ESTIMATE_THRESHOLD', 100000)
+DATES_TIMEOUT = getattr(settings, 'TRANSACTIONS_ADMIN_DATES_TIMEOUT', 600)
+
+
+def performance_mode():
+    return getattr(settings, 'TRANSACTIONS_ADMIN_PERFORMANCE_MODE', False)
+
+
+def estimated_count(model, using='default'):
+    """
+    Numero di righe stimato dalle statistiche di PostgreSQL (somma delle
+    partizioni per le tabelle partizionate), None sugli altri database
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+            FROM pg_class c
+            WHERE c.oid = %s::regclass
+               OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+            """,
+            [model._meta.db_table, model._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator che evita COUNT(*) sulla tabella intera quando la stima è
+    sufficiente; con filtri o tabelle piccole il conteggio resta esatto
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Filtro su una ForeignKey con un campo di autocompletamento: la pagina
+    carica solo l'oggetto selezionato, le opzioni arrivano dalla vista
+    autocomplete dell'admin del modello collegato (che deve avere search_fields)
+    """
+    template = 'admin/transactions/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.title = field.verbose_name
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    @property
+    def value(self):
+        value = self.used_parameters.get(self.lookup_kwarg)
+        # Django >= 5.0 passa i parametri come liste
+        return value[-1] if isinstance(value, list) else value
+
+    def choices(self, changelist):
+        # URL con un segnaposto per il valore, usato dallo script del template
+        self.url_template = changelist.get_query_string({self.lookup_kwarg: '__value__'})
+        yield {
+            'selected': self.value is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+
+    def widget_id(self):
+        return f'autocomplete-filter-{self.field_path}'
+
+    def rendered_widget(self):
+        widget = AutocompleteSelect(self.field, self.admin_site, attrs={'id': self.widget_id()})
+        widget.choices = self.field.formfield().choices
+        return widget.render(self.lookup_kwarg, self.value)
+
+
+class CachedDateFilter(admin.SimpleListFilter):
+    """
+    Filtro per anno e, scelto l'anno, per mese. Gli anni e i mesi presenti
+    vengono letti una volta e tenuti in cache; il filtro usa un intervallo di
+    date, coperto dall'indice su date.
+    """
+    title = 'date'
+    parameter_name = 'period'
+    date_field = 'date'
+
+    def months(self, model):
+        key = f'transactions:admin_months:{model._meta.label_lower}'
+        months = cache.get(key)
+        if months is None:
+            months = [day.strftime('%Y-%m') for day in model._default_manager.dates(self.date_field, 'month')]
+            cache.set(key, months, DATES_TIMEOUT)
+        return months
+
+    def lookups(self, request, model_admin):
+        months = self.months(model_admin.model)
+        selected_year = (self.value() or '')[:4]
+        choices = []
+        for year in sorted({month[:4] for month in months}, reverse=True):
+            choices.append((year, year))
+            if year == selected_year:
+                choices.extend((month, f'… {month}') for month in reversed(months) if month.startswith(year))
+        return choices
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        try:
+            if len(value) == 4:
+                start = date(int(value), 1, 1)
+                end = start + relativedelta(years=1)
+            else:
+                start = date(int(value[:4]), int(value[5:7]), 1)
+                end = start + relativedelta(months=1)
+        except ValueError:
+            return queryset.none()
+        return queryset.filter(**{f'{self.date_field}__gte': start, f'{self.date_field}__lt': end})
+
+
+class LedgerAdminMixin:
+    """
+    Applica la modalità prestazioni a una ModelAdmin con campo `date` e
+    ForeignKey verso conti e categorie. `performance_list_filter` sostituisce
+    list_filter quando la modalità è attiva.
+    """
+    performance_list_filter = ()
+
+    def __init__(self, model, admin_site):
+        super().__init__(model, admin_site)
+        self.performance_mode = performance_mode()
+        if self.performance_mode:
+            self.date_hierarchy = None
+            self.show_full_result_count = False
+            self.paginator = EstimatedCountPaginator
+
+    def get_list_filter(self, request):
+        if self.performance_mode:
+            return self.performance_list_filter
+        return super().get_list_filter(request)
+
+    @property
+    def media(self):
+        media = super().media
+        if self.performance_mode:
+            # select2 e l'inizializzazione dei campi di autocompletamento
+            media += AutocompleteSelect(self.model._meta.get_field('account'), self.admin_site).media
+        return media
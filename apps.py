@@ -1,57 +1,57 @@
-import logging
 from django.apps import AppConfig
 from django.db.models.signals import post_migrate
-from django.db.utils import OperationalError, ProgrammingError
 
-logger = logging.getLogger(__name__)
 
 class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions'
 
     def ready(self):
-        post_migrate.connect(create_default_categories, sender=self)
-        post_migrate.connect(create_default_account, sender=self)
-
-def create_default_categories(sender, **kwargs):
-    from .models.base import TransactionCategory
-    default_categories = [
-        {"name": "Transfer Expense", "transaction_type": "expense"},
-        {"name": "Transfer Income", "transaction_type": "income"},
-        {"name": "Transfer Commission", "transaction_type": "expense"},
-    ]
-
-    for category_data in default_categories:
-        try:
-            TransactionCategory.objects.get_or_create(**category_data)
-        except (OperationalError, ProgrammingError) as e:
-            # Logga un messaggio di errore se le tabelle non sono pronte
-            logger.error("Could not create default transaction categories. "
-                         "This might be due to the tables not being ready. "
-                         "Error: %s", e)
-
-
-def create_default_account(sender, **kwargs):
-    from .models.base import Account
-    
-    # Definizione dei dati dell'account di default
-    default_account = {
-        "name": "Contanti",
-        "account_type": "cash",
-        "institution": "None",
-        "initial_balance": 0,
-    }
-
-    try:
-        # Controlla se esiste già almeno un oggetto Account
-        if not Account.objects.exists():
-            # Crea l'account di default se nessun account è presente
-            Account.objects.get_or_create(**default_account)
-            logger.info("Default account created successfully.")
-    except (OperationalError, ProgrammingError) as e:
-        # Logga un messaggio di errore se le tabelle non sono pronte o c'è un altro problema
-        logger.error(
-            "Could not create default account. "
-            "This might be due to the tables not being ready. "
-            "Error: %s", e
-        )
+        from django.db.models.signals import pre_save, post_save, post_delete
+        from .models.base import Account, Transaction, TransactionCategory
+        from .models.currency import ExchangeRate
+        from .models.rules import CategorizationRule
+        from .models.archive import ClosedPeriod
+        from .models.budget import Budget
+        from . import signals
+        from .services import anomaly, archive, budgets, categorization, choices, dashboard, fragments, fx, ledger, search, seed
+
+        post_migrate.connect(seed.seed_defaults, sender=self)
+        post_migrate.connect(search.setup_search_index, sender=self)
+
+        pre_save.connect(signals.capture_previous_state, sender=Transaction)
+        post_save.connect(signals.notify_saved, sender=Transaction)
+        post_delete.connect(signals.notify_deleted, sender=Transaction)
+
+        signals.transactions_changed.connect(budgets.on_transactions_changed, sender=Transaction)
+        post_save.connect(budgets.invalidate_parents, sender=TransactionCategory)
+        post_delete.connect(budgets.invalidate_parents, sender=TransactionCategory)
+        for model in (Budget, TransactionCategory):
+            pre_save.connect(budgets.capture_previous_scope, sender=model)
+            post_save.connect(budgets.on_scope_changed, sender=model)
+
+        signals.transactions_changed.connect(search.on_transactions_changed, sender=Transaction)
+        signals.transactions_changed.connect(ledger.on_transactions_changed, sender=Transaction)
+        signals.transactions_changed.connect(fragments.invalidate_balances, sender=Transaction)
+        signals.transactions_changed.connect(anomaly.on_transactions_changed, sender=Transaction)
+        signals.transactions_changed.connect(dashboard.on_transactions_changed, sender=Transaction)
+        for model in (Account, TransactionCategory):
+            pre_save.connect(search.capture_previous_name, sender=model)
+            post_save.connect(search.on_name_changed, sender=model)
+            post_save.connect(choices.invalidate_choices, sender=model)
+            post_delete.connect(choices.invalidate_choices, sender=model)
+        post_save.connect(fragments.invalidate_balances, sender=Account)
+        post_delete.connect(fragments.invalidate_balances, sender=Account)
+
+        post_save.connect(categorization.invalidate_rules, sender=CategorizationRule)
+        post_delete.connect(categorization.invalidate_rules, sender=CategorizationRule)
+
+        post_save.connect(archive.clear_closed_until, sender=ClosedPeriod)
+        post_delete.connect(archive.clear_closed_until, sender=ClosedPeriod)
+        post_save.connect(fragments.invalidate_balances, sender=ClosedPeriod)
+        post_delete.connect(fragments.invalidate_balances, sender=ClosedPeriod)
+
+        pre_save.connect(fx.capture_previous_currency, sender=Account)
+        post_save.connect(fx.on_account_currency_changed, sender=Account)
+        post_save.connect(fx.clear_rate_cache, sender=ExchangeRate)
+        post_delete.connect(fx.clear_rate_cache, sender=ExchangeRate)
@@ -1,20 +1,55 @@
 from django import forms
 from .models.base import Account, Transaction, TransactionCategory
+from .services.choices import account_choices, category_choices
+
+
+class CachedChoiceIterator(forms.models.ModelChoiceIterator):
+    """
+    Opzioni di CachedModelChoiceField lette dal provider anziché dal queryset
+    """
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        yield from self.field.provider()
+
+    def __len__(self):
+        return len(self.field.provider()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.provider())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField che mostra le opzioni in cache restituite da `provider`
+    (vedi services.choices); il queryset serve solo a validare il valore inviato
+    """
+    iterator = CachedChoiceIterator
+
+    def __init__(self, queryset, provider, **kwargs):
+        self.provider = provider
+        super().__init__(queryset, **kwargs)
+
+    def limit_to(self, queryset, provider):
+        self.provider = provider
+        self.queryset = queryset
 
 
 class AccountForm(forms.ModelForm):
     class Meta:
         model = Account
-        fields = ['name', 'account_type', 'institution', 'initial_balance', 'is_active']
+        fields = ['name', 'account_type', 'institution', 'initial_balance', 'currency', 'is_active']
         labels = {
             'name': 'Nome del Conto',
             'account_type': 'Tipo di Conto',
             'institution': 'Istituzione',
             'initial_balance': 'Bilancio Iniziale',
+            'currency': 'Valuta',
             'is_active': 'Attivo',
         }
         widgets = {
             'initial_balance': forms.NumberInput(attrs={'class': 'form-control'}),
+            'currency': forms.Select(attrs={'class': 'form-control'}),
             'account_type': forms.Select(attrs={'class': 'form-control'}),
             'institution': forms.TextInput(attrs={'class': 'form-control'}),
             'name': forms.TextInput(attrs={'class': 'form-control'}),
@@ -22,7 +57,23 @@ class AccountForm(forms.ModelForm):
         }
 
 
+def limit_categories(field, transaction_type):
+    field.limit_to(
+        TransactionCategory.objects.filter(transaction_type=transaction_type),
+        lambda: category_choices(transaction_type),
+    )
+
+
 class TransactionForm(forms.ModelForm):
+    category = CachedModelChoiceField(
+        queryset=TransactionCategory.objects.all(), provider=category_choices,
+        label='Categoria', widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    account = CachedModelChoiceField(
+        queryset=Account.objects.all(), provider=lambda: account_choices(active_only=False),
+        label='Conto Associato', widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
     class Meta:
         model = Transaction
         fields = ['date', 'amount', 'description', 'transaction_type', 'category', 'account']
@@ -31,18 +82,20 @@ class TransactionForm(forms.ModelForm):
             'amount': 'Importo',
             'description': 'Descrizione',
             'transaction_type': 'Tipo di Transazione',
-            'category': 'Categoria',
-            'account': 'Conto Associato',
         }
         widgets = {
             'date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'amount': forms.NumberInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'transaction_type': forms.Select(attrs={'class': 'form-control'}),
-            'category': forms.Select(attrs={'class': 'form-control'}),
-            'account': forms.Select(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, transaction_type=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        transaction_type = transaction_type or self.instance.transaction_type
+        if transaction_type:
+            limit_categories(self.fields['category'], transaction_type)
+
     def clean(self):
         cleaned_data = super().clean()
         transaction_type = cleaned_data.get('transaction_type')
@@ -63,13 +116,13 @@ class TransferFundsForm(forms.Form):
         max_digits=10, decimal_places=2, min_value=0.01,
         label='Importo', widget=forms.NumberInput(attrs={'class': 'form-control'})
     )
-    source_fund = forms.ModelChoiceField(
-        queryset=Account.objects.filter(is_active=True),
+    source_fund = CachedModelChoiceField(
+        queryset=Account.objects.filter(is_active=True), provider=account_choices,
         label='Conto di Origine',
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    destination_fund = forms.ModelChoiceField(
-        queryset=Account.objects.filter(is_active=True),
+    destination_fund = CachedModelChoiceField(
+        queryset=Account.objects.filter(is_active=True), provider=account_choices,
         label='Conto di Destinazione',
         widget=forms.Select(attrs={'class': 'form-control'})
     )
@@ -140,12 +193,12 @@ class RecurringTransactionForm(forms.Form):
         choices=Transaction.TRANSACTION_TYPES,
         label='Tipo di Transazione', widget=forms.Select(attrs={'class': 'form-control'})
     )
-    category = forms.ModelChoiceField(
-        queryset=TransactionCategory.objects.all(),
+    category = CachedModelChoiceField(
+        queryset=TransactionCategory.objects.all(), provider=category_choices,
         label='Categoria', widget=forms.Select(attrs={'class': 'form-control'})
     )
-    account = forms.ModelChoiceField(
-        queryset=Account.objects.filter(is_active=True),
+    account = CachedModelChoiceField(
+        queryset=Account.objects.filter(is_active=True), provider=account_choices,
         label='Conto Associato', widget=forms.Select(attrs={'class': 'form-control'})
     )
     start_date = forms.DateField(
@@ -159,6 +212,11 @@ class RecurringTransactionForm(forms.Form):
         label='Frequenza', widget=forms.Select(attrs={'class': 'form-control'})
     )
 
+    def __init__(self, *args, transaction_type=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if transaction_type:
+            limit_categories(self.fields['category'], transaction_type)
+
     def clean(self):
         cleaned_data = super().clean()
         start_date = cleaned_data.get('start_date')
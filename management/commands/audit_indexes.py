@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from transactions.services.index_audit import HOT_PATHS, SEQUENTIAL, audit
+
+
+class Command(BaseCommand):
+    help = (
+        "Esegue i percorsi critici dell'applicazione, cattura le query generate e "
+        "ne mostra il piano di esecuzione (EXPLAIN), segnalando le letture complete delle tabelle"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', choices=[[], *HOT_PATHS], metavar='path',
+                            help=f"Percorsi da verificare: {', '.join(HOT_PATHS)} (default: tutti)")
+        parser.add_argument('--plans', action='store_true', help="Stampa SQL e piano completo di ogni query")
+
+    def handle(self, *args, **options):
+        sequential = 0
+        for name, queries in audit(options['paths'] or None).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for sql, plan, findings in queries:
+                if options['plans']:
+                    self.stdout.write(f"  {sql}")
+                    for line in plan:
+                        self.stdout.write(f"    {line}")
+                for kind, line in findings:
+                    if kind == SEQUENTIAL:
+                        sequential += 1
+                        self.stdout.write(self.style.WARNING(f"  [{kind}] {line}"))
+                    else:
+                        self.stdout.write(f"  [{kind}] {line}")
+
+        if sequential:
+            self.stdout.write(self.style.WARNING(f"{sequential} sequential scans found."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No sequential scans found."))
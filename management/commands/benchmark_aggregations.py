@@ -0,0 +1,106 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+
+from transactions.models.base import Account, Transaction, TransactionCategory
+from transactions.models.aggregated import (
+    DailyTransactionAggregation,
+    WeeklyTransactionAggregation,
+    MonthlyTransactionAggregation,
+    QuarterlyTransactionAggregation,
+    YearlyTransactionAggregation,
+)
+
+
+# modello -> argomenti per ricalcolare un solo periodo recente
+def incremental_arguments(day):
+    return {
+        DailyTransactionAggregation: {'start_date': day, 'end_date': day},
+        WeeklyTransactionAggregation: {'year': day.year, 'week': day.isocalendar()[1]},
+        MonthlyTransactionAggregation: {'year': day.year, 'month': day.month},
+        QuarterlyTransactionAggregation: {'year': day.year, 'quarter': (day.month - 1) // 3 + 1},
+        YearlyTransactionAggregation: {'year': day.year},
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Misura i tempi di ricostruzione completa e di aggiornamento di un periodo "
+        "delle tabelle di aggregazione e il numero di indici mantenuti. Con --rows "
+        "genera transazioni sintetiche, annullate al termine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=0,
+                            help="Transazioni sintetiche da generare per la misura")
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--cluster', action='store_true',
+                            help="PostgreSQL: riordina fisicamente le tabelle sulla chiave (periodo, conto, ...)")
+
+    def handle(self, *args, **options):
+        if options['cluster']:
+            self.cluster()
+            return
+
+        with db_transaction.atomic():
+            if options['rows']:
+                self.generate(options['rows'])
+            today = date.today()
+            for model, arguments in incremental_arguments(today).items():
+                full = self.measure(model.aggregate_transactions, {}, options['repeat'])
+                incremental = self.measure(model.aggregate_transactions, arguments, options['repeat'])
+                self.stdout.write(
+                    f"{model.__name__}: {self.index_count(model)} indexes, "
+                    f"{model.objects.count()} rows, full rebuild {full * 1000:.1f} ms, "
+                    f"one period {incremental * 1000:.1f} ms"
+                )
+            # Le righe generate e le aggregazioni ricalcolate non vengono salvate
+            db_transaction.set_rollback(True)
+
+    def measure(self, function, arguments, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(**arguments)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def index_count(self, model):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return sum(1 for constraint in constraints.values() if constraint['index'] or constraint['unique'])
+
+    def generate(self, rows):
+        accounts = list(Account.objects.values_list('pk', flat=True))
+        categories = list(TransactionCategory.objects.values_list('pk', 'transaction_type'))
+        if not accounts or not categories:
+            raise CommandError("At least one account and one category are needed to generate rows.")
+        today = date.today()
+        Transaction.objects.bulk_create([
+            Transaction(
+                account_id=random.choice(accounts),
+                category_id=category_id,
+                transaction_type=transaction_type,
+                date=today - timedelta(days=random.randrange(3 * 365)),
+                amount=Decimal(random.randrange(100, 100000)) / 100,
+            )
+            for category_id, transaction_type in (random.choice(categories) for _ in range(rows))
+        ], batch_size=1000)
+
+    def cluster(self):
+        if connection.vendor != 'postgresql':
+            raise CommandError("CLUSTER is only available on PostgreSQL.")
+        with connection.cursor() as cursor:
+            for model in incremental_arguments(date.today()):
+                table = model._meta.db_table
+                constraints = connection.introspection.get_constraints(cursor, table)
+                unique = next(
+                    name for name, constraint in constraints.items()
+                    if constraint['unique'] and not constraint['primary_key'] and len(constraint['columns']) > 2
+                )
+                cursor.execute(f'CLUSTER "{table}" USING "{unique}"')
+                self.stdout.write(f"{table} clustered on {unique}")
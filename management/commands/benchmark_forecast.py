@@ -0,0 +1,69 @@
+import random
+import time
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from transactions.models.base import Account, TransactionCategory
+from transactions.models.aggregated import MonthlyTransactionAggregation
+from transactions.services.forecast import forecast_balances
+
+
+class Command(BaseCommand):
+    help = (
+        "Misura il tempo di forecast_balances su conti e aggregazioni mensili "
+        "sintetici, annullati al termine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=1000)
+        parser.add_argument('--months', type=int, default=24,
+                            help="Mesi da prevedere")
+        parser.add_argument('--history', type=int, default=24,
+                            help="Mesi di storico aggregato per conto")
+        parser.add_argument('--categories', type=int, default=3,
+                            help="Categorie di spesa con movimenti in ogni mese di storico")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with db_transaction.atomic():
+            account_ids = self.generate(options['accounts'], options['history'], options['categories'])
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                forecast_balances(months=options['months'], accounts=account_ids, history_months=options['history'])
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{len(account_ids)} accounts x {options['months']} months: "
+                f"best {min(timings) * 1000:.1f} ms of {options['repeat']}"
+            )
+            # I dati generati non vengono salvati
+            db_transaction.set_rollback(True)
+
+    def generate(self, accounts, history, categories):
+        suffix = random.randrange(10 ** 6)
+        created = Account.objects.bulk_create([
+            Account(
+                name=f"Benchmark {suffix}-{n}", account_type='checking',
+                initial_balance=Decimal('1000.00'), institution="Benchmark",
+            )
+            for n in range(accounts)
+        ])
+        category_objects = TransactionCategory.objects.bulk_create([
+            TransactionCategory(name=f"Benchmark {suffix}-{n}", transaction_type='expense')
+            for n in range(categories)
+        ])
+        first = date.today().replace(day=1) - relativedelta(months=history)
+        months = [first + relativedelta(months=k) for k in range(history)]
+        MonthlyTransactionAggregation.objects.bulk_create([
+            MonthlyTransactionAggregation(
+                year=month.year, month=month.month, account=account, category=category,
+                transaction_type='expense', total_amount=Decimal(random.randrange(100, 100000)) / 100,
+                transaction_count=1,
+            )
+            for account in created for category in category_objects for month in months
+        ], batch_size=1000)
+        return [account.pk for account in created]
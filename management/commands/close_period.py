@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.services.archive import ArchiveError, close_period
+
+
+class Command(BaseCommand):
+    help = (
+        "Chiude le transazioni fino alla data indicata (inclusa): congela i saldi "
+        "dei conti e sposta le transazioni nell'archivio"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('end_date', type=date.fromisoformat, help="Ultimo giorno del periodo (AAAA-MM-GG)")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        kwargs = {'batch_size': options['batch_size']} if options['batch_size'] else {}
+        try:
+            period = close_period(options['end_date'], **kwargs)
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed up to {period.end_date}: {period.archived_count} transactions archived."
+        ))
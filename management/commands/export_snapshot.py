@@ -0,0 +1,192 @@
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from transactions.models.base import Transaction
+from transactions.models.archive import ArchivedTransaction
+from transactions.models.aggregated import (
+    DailyTransactionAggregation,
+    WeeklyTransactionAggregation,
+    MonthlyTransactionAggregation,
+    QuarterlyTransactionAggregation,
+    YearlyTransactionAggregation,
+)
+
+
+STATE_FILE = '_state.json'
+
+AGGREGATION_COLUMNS = [
+    ('id', 'int64'),
+    ('account_id', 'int64'),
+    ('category_id', 'int64'),
+    ('transaction_type', 'string'),
+    ('total_amount', 'decimal'),
+    ('transaction_count', 'int64'),
+    ('average_transaction_amount', 'decimal'),
+    ('updated_at', 'timestamp'),
+]
+
+TRANSACTION_COLUMNS = [
+    ('id', 'int64'),
+    ('date', 'date'),
+    ('amount', 'decimal'),
+    ('transaction_type', 'string'),
+    ('account_id', 'int64'),
+    ('category_id', 'int64'),
+    ('description', 'string'),
+    ('created_at', 'timestamp'),
+    ('modified_at', 'timestamp'),
+]
+
+# nome -> (modello, campo di modifica, campi di partizione, colonne)
+DATASETS = {
+    'transactions': (Transaction, 'modified_at', ('date__year', 'date__month'), TRANSACTION_COLUMNS),
+    # Le transazioni dei periodi chiusi, spostate fuori da Transaction
+    'archived_transactions': (ArchivedTransaction, 'archived_at', ('date__year', 'date__month'),
+                              [*TRANSACTION_COLUMNS, ('period_id', 'int64')]),
+    'daily_aggregations': (DailyTransactionAggregation, 'updated_at', ('date__year', 'date__month'),
+                           [('date', 'date'), *AGGREGATION_COLUMNS]),
+    'weekly_aggregations': (WeeklyTransactionAggregation, 'updated_at', ('year',),
+                            [('year', 'int32'), ('week', 'int32'), *AGGREGATION_COLUMNS]),
+    'monthly_aggregations': (MonthlyTransactionAggregation, 'updated_at', ('year',),
+                             [('year', 'int32'), ('month', 'int32'), *AGGREGATION_COLUMNS]),
+    'quarterly_aggregations': (QuarterlyTransactionAggregation, 'updated_at', ('year',),
+                               [('year', 'int32'), ('quarter', 'int32'), *AGGREGATION_COLUMNS]),
+    'yearly_aggregations': (YearlyTransactionAggregation, 'updated_at', ('year',),
+                            [('year', 'int32'), *AGGREGATION_COLUMNS]),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Esporta Transaction, l'archivio dei periodi chiusi e le tabelle di "
+        "aggregazione in file Parquet o Arrow partizionati per anno/mese. Le esecuzioni successive riscrivono solo le "
+        "partizioni cambiate dall'ultima esportazione e tolgono quelle rimaste vuote."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Directory di destinazione")
+        parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet',
+                            help="parquet (compresso) o arrow (IPC non compresso, leggibile con memory-map)")
+        parser.add_argument('--dataset', action='append', choices=sorted(DATASETS),
+                            help="Esporta solo i dataset indicati (ripetibile)")
+        parser.add_argument('--full', action='store_true',
+                            help="Ignora lo stato salvato e riesporta tutte le partizioni")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow
+        except ImportError:
+            raise CommandError("pyarrow is required for this command: pip install pyarrow")
+
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+        state_path = os.path.join(output, STATE_FILE)
+        state = {}
+        if os.path.exists(state_path) and not options['full']:
+            with open(state_path) as f:
+                state = json.load(f)
+            # Cambiando formato le partizioni esistenti non valgono più
+            if state.get('format') != options['format']:
+                state = {}
+        state['format'] = options['format']
+
+        for name in options['dataset'] or DATASETS:
+            model, modified_field, partition_fields, columns = DATASETS[name]
+            # Stati precedenti (watermark) non hanno le impronte: si riesporta tutto
+            previous = state.get(name) if isinstance(state.get(name), dict) else {}
+
+            # Impronta di ogni partizione (righe, ultima modifica, somma degli id)
+            # in una sola query: cambia per inserimenti e modifiche, ma anche per
+            # cancellazioni e righe spostate in un'altra partizione, che un
+            # watermark sulla data di modifica non vede
+            current = {}
+            for row in model.objects.order_by().values(*partition_fields).annotate(
+                rows=Count('pk'), last=Max(modified_field), pk_sum=Sum('pk'),
+            ):
+                partition = tuple(row[field] for field in partition_fields)
+                current[self.partition_path('', name, partition_fields, partition, options['format'])] = (
+                    partition, [row['rows'], row['last'].isoformat(), row['pk_sum']],
+                )
+
+            written = removed = 0
+            for key, (partition, fingerprint) in current.items():
+                if previous.get(key) == fingerprint:
+                    continue
+                rows = model.objects.filter(**dict(zip(partition_fields, partition)))
+                self.write_partition(
+                    pyarrow, rows, columns, os.path.join(output, key), options['format'], options['chunk_size'],
+                )
+                written += 1
+            # Partizioni ormai vuote, anche se lasciate da un'esportazione senza stato
+            for directory, _, files in os.walk(os.path.join(output, name)):
+                for filename in files:
+                    key = os.path.relpath(os.path.join(directory, filename), output)
+                    if filename == f"data.{options['format']}" and key not in current:
+                        os.remove(os.path.join(output, key))
+                        removed += 1
+
+            state[name] = {key: fingerprint for key, (_, fingerprint) in current.items()}
+            self.stdout.write(f"{name}: {written} partitions written, {removed} removed")
+
+        # Lo stato si salva solo a esportazione completata
+        tmp_path = f'{state_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+        self.stdout.write(self.style.SUCCESS(f"Snapshot exported to {output}"))
+
+    def partition_path(self, output, name, partition_fields, partition, file_format):
+        parts = [output, name]
+        for field, value in zip(partition_fields, partition):
+            key = field.split('__')[-1]
+            parts.append(f'{key}={value:02d}' if key == 'month' else f'{key}={value}')
+        return os.path.join(*parts, f'data.{file_format}')
+
+    def write_partition(self, pa, rows, columns, path, file_format, chunk_size):
+        types = {
+            'int32': pa.int32(),
+            'int64': pa.int64(),
+            'string': pa.string(),
+            'date': pa.date32(),
+            'decimal': pa.decimal128(12, 2),
+            'timestamp': pa.timestamp('us', tz='UTC'),
+        }
+        schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        names = [name for name, _ in columns]
+
+        batches = []
+        chunk = []
+        for row in rows.order_by('pk').values_list(*names).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                batches.append(self.record_batch(pa, schema, chunk))
+                chunk = []
+        if chunk or not batches:
+            batches.append(self.record_batch(pa, schema, chunk))
+        table = pa.Table.from_batches(batches, schema=schema)
+
+        # Scrittura atomica: i lettori non vedono mai un file parziale
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def record_batch(self, pa, schema, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in schema]
+        arrays = []
+        for field, values in zip(schema, columns):
+            if pa.types.is_timestamp(field.type):
+                values = [timezone.localtime(v, dt_timezone.utc) if timezone.is_aware(v) else v for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
@@ -0,0 +1,50 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.services.partitioning import (
+    GRANULARITIES,
+    GRANULARITY,
+    PartitioningError,
+    convert_table,
+    create_partitions,
+    horizon,
+    partition_bounds,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Partiziona per data la tabella delle transazioni (solo PostgreSQL). Con "
+        "--convert trasforma la tabella esistente copiando i dati; senza, crea in "
+        "anticipo le partizioni dei prossimi periodi (da eseguire periodicamente)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help="Converte la tabella esistente in una tabella partizionata")
+        parser.add_argument('--granularity', choices=GRANULARITIES, default=GRANULARITY)
+        parser.add_argument('--ahead', type=int, default=1,
+                            help="Numero di periodi futuri per cui creare le partizioni")
+        parser.add_argument('--drop-foreign-keys', action='store_true',
+                            help="Con --convert elimina le chiavi esterne di altre tabelle verso le transazioni")
+
+    def handle(self, *args, **options):
+        granularity, ahead = options['granularity'], options['ahead']
+        try:
+            if options['convert']:
+                partitions, foreign_keys = convert_table(granularity, ahead, options['drop_foreign_keys'])
+                for table, name in foreign_keys:
+                    self.stdout.write(f"Dropped foreign key {name} on {table}")
+                self.stdout.write(self.style.SUCCESS(
+                    f"Transaction table partitioned into {len(partitions)} partitions."
+                ))
+                return
+
+            today = date.today()
+            created = create_partitions(partition_bounds(today, horizon(today, ahead, granularity), granularity))
+        except PartitioningError as e:
+            raise CommandError(str(e))
+        for name in created:
+            self.stdout.write(f"Created partition {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from transactions.services.anomaly import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricalcola le statistiche per conto e categoria e le descrizioni note "
+        "usate per segnalare le transazioni insolite"
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Anomaly statistics rebuilt from {count} transactions."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from transactions.services.ledger import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricostruisce il registro dei movimenti dallo stato attuale delle "
+        "transazioni e dell'archivio (un movimento per transazione)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot-every', type=int, default=None,
+                            help="Movimenti tra due istantanee (default TRANSACTIONS_LEDGER_SNAPSHOT_EVERY)")
+
+    def handle(self, *args, **options):
+        count = rebuild(snapshot_every=options['snapshot_every'])
+        self.stdout.write(self.style.SUCCESS(f"Ledger rebuilt: {count} entries."))
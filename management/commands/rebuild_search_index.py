@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from transactions.services.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Ricostruisce l'indice di ricerca full-text delle transazioni"
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt with {type(backend).__name__}."))
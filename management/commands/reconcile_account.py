@@ -0,0 +1,55 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.models.base import Account
+from transactions.services.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Confronta i saldi di un conto con quelli di un estratto conto in CSV "
+        "(colonne data AAAA-MM-GG e saldo) e mostra la prima data divergente "
+        "con le transazioni candidate"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_id', type=int)
+        parser.add_argument('statement', help="File CSV con una riga data,saldo per controllo")
+        parser.add_argument('--tolerance', type=Decimal, default=Decimal('0.00'))
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options['account_id'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Account {options['account_id']} not found.")
+
+        checkpoints = []
+        with open(options['statement'], newline='') as statement:
+            for line, row in enumerate(csv.reader(statement), start=1):
+                if not row or row[0].strip().lower() == 'date':
+                    continue
+                try:
+                    checkpoints.append((date.fromisoformat(row[0].strip()), Decimal(row[1].strip())))
+                except (IndexError, ValueError, InvalidOperation):
+                    raise CommandError(f"Invalid statement row {line}: {row}")
+
+        result = reconcile(account, checkpoints, tolerance=options['tolerance'])
+        if result.first_divergence is None:
+            self.stdout.write(self.style.SUCCESS(f"{len(result.results)} checkpoints reconciled."))
+            return
+
+        divergence = result.first_divergence
+        since = f"after {result.last_match.date}" if result.last_match else "from the start"
+        self.stdout.write(self.style.WARNING(
+            f"First divergence on {divergence.date}: app {divergence.app_balance}, "
+            f"statement {divergence.statement_balance}, difference {divergence.difference}"
+        ))
+        self.stdout.write(f"Candidate transactions {since}:")
+        for transaction in result.candidates:
+            self.stdout.write(
+                f"  #{transaction.pk} {transaction.date} {transaction.transaction_type} "
+                f"{transaction.amount} {transaction.description}"
+            )
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+
+def _initialize_process():
+    # Con il metodo 'spawn' i processi figli partono senza Django configurato:
+    # per questo il modulo non importa i modelli al caricamento
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Esegue i lavori in background accodati nella tabella Job su un pool di "
+        "thread o di processi. Con --once esegue i lavori pronti e termina."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread',
+                            help="process per i lavori che occupano la CPU")
+        parser.add_argument('--once', action='store_true',
+                            help="Esegue i lavori pronti e termina")
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help="Secondi di attesa quando la coda è vuota")
+
+    def handle(self, *args, **options):
+        from transactions.services import jobs
+
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        workers = options['workers']
+        executor = self.executor(options['pool'], workers)
+
+        running = {}
+        try:
+            while True:
+                jobs.requeue_stale()
+                free = workers - len(running)
+                if free > 0:
+                    for job_id in jobs.claim(worker, limit=free):
+                        running[executor.submit(jobs.run, job_id)] = job_id
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        # Il lavoro non ha registrato l'esito: torna in coda o fallisce
+                        broken = broken or isinstance(e, BrokenExecutor)
+                        status = jobs.release(job_id, f"{type(e).__name__}: {e}")
+                    self.stdout.write(f"Job {job_id}: {status}")
+                if broken:
+                    # Un processo del pool è terminato: il pool non accetta altri lavori
+                    for future, job_id in running.items():
+                        self.stdout.write(f"Job {job_id}: {jobs.release(job_id, 'Worker pool terminated.')}")
+                    running.clear()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self.executor(options['pool'], workers)
+        except KeyboardInterrupt:
+            # I lavori prenotati e non conclusi tornano in coda con requeue_stale
+            self.stdout.write("Worker stopped.")
+        finally:
+            executor.shutdown(wait=True)
+
+    def executor(self, pool, workers):
+        if pool == 'process':
+            # 'spawn': i processi figli, creati solo al primo submit, non ereditano
+            # le connessioni al database aperte nel frattempo dal processo principale
+            return ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initialize_process,
+            )
+        return ThreadPoolExecutor(max_workers=workers)
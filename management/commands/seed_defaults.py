@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from transactions.services.seed import apply_seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea le categorie di sistema e il conto iniziale mancanti descritti in "
+        "seeds/defaults.json. Senza --force non fa nulla se la definizione è già applicata."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Controlla le righe anche se la definizione non è cambiata")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        created = apply_seed(using=options['database'], force=options['force'])
+        if created is None:
+            self.stdout.write("Seed already applied.")
+            return
+        for model, count in created.items():
+            self.stdout.write(f"{model.__name__}: {count} created")
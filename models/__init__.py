@@ -0,0 +1,16 @@
+from .base import Account, Transaction, TransactionCategory
+from .aggregated import (
+    DailyTransactionAggregation,
+    WeeklyTransactionAggregation,
+    MonthlyTransactionAggregation,
+    QuarterlyTransactionAggregation,
+    YearlyTransactionAggregation,
+)
+from .budget import Budget, BudgetPeriod
+from .currency import ExchangeRate
+from .rules import CategorizationRule
+from .archive import ClosedPeriod, AccountPeriodBalance, ArchivedTransaction
+from .jobs import Job
+from .ledger import LedgerEntry, LedgerHead, LedgerSnapshot
+from .seed import SeedVersion
+from .anomaly import CategoryStats, KnownDescription, TransactionAnomaly
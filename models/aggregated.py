@@ -1,7 +1,128 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Sum, Avg, Count, Q
+from django.db.models import Sum, Count, Q
 from decimal import Decimal
+from datetime import timedelta
+from .archive import ArchivedTransaction
+from .base import Account, Transaction, TransactionCategory
+from .fields import amount_field, average_amount
+
+
+class AggregationBase(models.Model):
+    """
+    Base astratta comune a tutte le aggregazioni
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Campi del periodo, in testa alla chiave univoca (periodo, conto, categoria, tipo)
+    PERIOD_FIELDS = ()
+    UPSERT_BATCH_SIZE = 1000
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def upsert(cls, aggregations):
+        """
+        Scrive i totali calcolati con un INSERT ... ON CONFLICT DO UPDATE per
+        lotto invece di una SELECT e una scrittura per riga
+        """
+        objects = [
+            cls(
+                **{field: agg[field] for field in cls.PERIOD_FIELDS},
+                account_id=agg['account'],
+                category_id=agg['category'],
+                transaction_type=agg['transaction_type'],
+                total_amount=agg['total_amount'] or Decimal('0'),
+                transaction_count=agg['transaction_count'],
+                average_transaction_amount=agg['average_transaction_amount'],
+            )
+            for agg in aggregations
+        ]
+        cls.objects.bulk_create(
+            objects,
+            batch_size=cls.UPSERT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=[*cls.PERIOD_FIELDS, 'account', 'category', 'transaction_type'],
+            update_fields=['total_amount', 'transaction_count', 'average_transaction_amount', 'updated_at'],
+        )
+
+    @classmethod
+    def combine(cls, grouped):
+        """
+        Unisce i totali per gruppo calcolati separatamente su più tabelle
+        (transazioni e archivio); la media viene ricalcolata sul totale
+        """
+        keys = (*cls.PERIOD_FIELDS, 'account', 'category', 'transaction_type')
+        combined = {}
+        for aggregations in grouped:
+            for agg in aggregations:
+                key = tuple(agg[field] for field in keys)
+                if key not in combined:
+                    combined[key] = dict(agg)
+                    continue
+                current = combined[key]
+                current['total_amount'] = (current['total_amount'] or Decimal('0')) + (agg['total_amount'] or Decimal('0'))
+                current['transaction_count'] += agg['transaction_count']
+                current['average_transaction_amount'] = (
+                    current['total_amount'] / current['transaction_count']
+                ).quantize(Decimal('0.01'))
+        return list(combined.values())
+
+
+class DailyAggregationBase(AggregationBase):
+    date = models.DateField(verbose_name=_("Data"))
+
+    PERIOD_FIELDS = ('date',)
+
+    class Meta(AggregationBase.Meta):
+        abstract = True
+        ordering = ['-date']
+
+
+class WeeklyAggregationBase(AggregationBase):
+    year = models.PositiveIntegerField(verbose_name=_("Anno"))
+    week = models.PositiveSmallIntegerField(verbose_name=_("Settimana"))
+
+    PERIOD_FIELDS = ('year', 'week')
+
+    class Meta(AggregationBase.Meta):
+        abstract = True
+        ordering = ['-year', '-week']
+
+
+class MonthlyAggregationBase(AggregationBase):
+    year = models.PositiveIntegerField(verbose_name=_("Anno"))
+    month = models.PositiveSmallIntegerField(verbose_name=_("Mese"))
+
+    PERIOD_FIELDS = ('year', 'month')
+
+    class Meta(AggregationBase.Meta):
+        abstract = True
+        ordering = ['-year', '-month']
+
+
+class QuarterlyAggregationBase(AggregationBase):
+    year = models.PositiveIntegerField(verbose_name=_("Anno"))
+    quarter = models.PositiveSmallIntegerField(verbose_name=_("Trimestre"))
+
+    PERIOD_FIELDS = ('year', 'quarter')
+
+    class Meta(AggregationBase.Meta):
+        abstract = True
+        ordering = ['-year', '-quarter']
+
+
+class YearlyAggregationBase(AggregationBase):
+    year = models.PositiveIntegerField(verbose_name=_("Anno"))
+
+    PERIOD_FIELDS = ('year',)
+
+    class Meta(AggregationBase.Meta):
+        abstract = True
+        ordering = ['-year']
+
 
 class DailyTransactionAggregation(DailyAggregationBase):
     """
@@ -10,7 +131,9 @@ class DailyTransactionAggregation(DailyAggregationBase):
     account = models.ForeignKey(
         Account, 
         on_delete=models.CASCADE, 
-        related_name='daily_aggregations'
+        related_name='daily_aggregations',
+        # coperto dall'indice (conto, periodo)
+        db_index=False
     )
     category = models.ForeignKey(
         TransactionCategory, 
@@ -24,7 +147,7 @@ class DailyTransactionAggregation(DailyAggregationBase):
         choices=Transaction.TRANSACTION_TYPES,
         verbose_name=_("Tipo di Transazione")
     )
-    total_amount = models.DecimalField(
+    total_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         default=0,
@@ -34,7 +157,7 @@ class DailyTransactionAggregation(DailyAggregationBase):
         default=0,
         verbose_name=_("Numero di Transazioni")
     )
-    average_transaction_amount = models.DecimalField(
+    average_transaction_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         null=True,
@@ -43,14 +166,10 @@ class DailyTransactionAggregation(DailyAggregationBase):
 
     class Meta(DailyAggregationBase.Meta):
         unique_together = ['date', 'account', 'category', 'transaction_type']
+        # La chiave univoca (periodo, conto, categoria, tipo) copre le letture per
+        # periodo e l'upsert; serve solo un indice per le letture per conto
         indexes = [
-            models.Index(fields=['date']),
-            models.Index(fields=['account']),
-            models.Index(fields=['category']),
-            models.Index(fields=['transaction_type']),
-            models.Index(fields=['date', 'account']),
-            models.Index(fields=['date', 'category']),
-            models.Index(fields=['date', 'transaction_type']),
+            models.Index(fields=['account', 'date']),
         ]
         verbose_name = _("Aggregazione Giornaliera Transazioni")
         verbose_name_plural = _("Aggregazioni Giornaliere Transazioni")
@@ -60,36 +179,28 @@ class DailyTransactionAggregation(DailyAggregationBase):
         """
         Metodo per aggregare le transazioni in modo automatico
         """
-        # Prepara il queryset base delle transazioni
-        transactions = Transaction.objects.all()
+        # Le transazioni dei periodi chiusi sono in archivio: senza di esse il
+        # ricalcolo di un periodo già chiuso ne sovrascriverebbe i totali
+        grouped = []
+        for model in (Transaction, ArchivedTransaction):
+            transactions = model.objects.all()
         
-        if start_date:
-            transactions = transactions.filter(date__gte=start_date)
-        if end_date:
-            transactions = transactions.filter(date__lte=end_date)
-
-        # Aggrega per data, account, categoria e tipo transazione
-        aggregations = transactions.values(
-            'date', 'account', 'category', 'transaction_type'
-        ).annotate(
-            total_amount=Sum('amount'),
-            transaction_count=Count('id'),
-            average_transaction_amount=Avg('amount')
-        )
+            if start_date:
+                transactions = transactions.filter(date__gte=start_date)
+            if end_date:
+                transactions = transactions.filter(date__lte=end_date)
 
-        # Crea o aggiorna gli oggetti di aggregazione
-        for agg in aggregations:
-            cls.objects.update_or_create(
-                date=agg['date'],
-                account_id=agg['account'],
-                category_id=agg['category'],
-                transaction_type=agg['transaction_type'],
-                defaults={
-                    'total_amount': agg['total_amount'] or Decimal('0'),
-                    'transaction_count': agg['transaction_count'],
-                    'average_transaction_amount': agg['average_transaction_amount']
-                }
-            )
+            # Aggrega per data, account, categoria e tipo transazione
+            grouped.append(transactions.values(
+                'date', 'account', 'category', 'transaction_type'
+            ).annotate(
+                total_amount=Sum('amount'),
+                transaction_count=Count('id'),
+                average_transaction_amount=average_amount('amount')
+            ))
+
+        # Crea o aggiorna gli oggetti di aggregazione in blocco
+        cls.upsert(cls.combine(grouped))
 
 
 class WeeklyTransactionAggregation(WeeklyAggregationBase):
@@ -99,7 +210,9 @@ class WeeklyTransactionAggregation(WeeklyAggregationBase):
     account = models.ForeignKey(
         Account, 
         on_delete=models.CASCADE, 
-        related_name='weekly_aggregations'
+        related_name='weekly_aggregations',
+        # coperto dall'indice (conto, periodo)
+        db_index=False
     )
     category = models.ForeignKey(
         TransactionCategory, 
@@ -113,7 +226,7 @@ class WeeklyTransactionAggregation(WeeklyAggregationBase):
         choices=Transaction.TRANSACTION_TYPES,
         verbose_name=_("Tipo di Transazione")
     )
-    total_amount = models.DecimalField(
+    total_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         default=0,
@@ -123,7 +236,7 @@ class WeeklyTransactionAggregation(WeeklyAggregationBase):
         default=0,
         verbose_name=_("Numero di Transazioni")
     )
-    average_transaction_amount = models.DecimalField(
+    average_transaction_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         null=True,
@@ -133,15 +246,7 @@ class WeeklyTransactionAggregation(WeeklyAggregationBase):
     class Meta(WeeklyAggregationBase.Meta):
         unique_together = ['year', 'week', 'account', 'category', 'transaction_type']
         indexes = [
-            models.Index(fields=['year']),
-            models.Index(fields=['week']),
-            models.Index(fields=['account']),
-            models.Index(fields=['category']),
-            models.Index(fields=['transaction_type']),
-            models.Index(fields=['year', 'week']),
-            models.Index(fields=['year', 'account']),
-            models.Index(fields=['year', 'category']),
-            models.Index(fields=['year', 'transaction_type']),
+            models.Index(fields=['account', 'year', 'week']),
         ]
         verbose_name = _("Aggregazione Settimanale Transazioni")
         verbose_name_plural = _("Aggregazioni Settimanali Transazioni")
@@ -155,43 +260,34 @@ class WeeklyTransactionAggregation(WeeklyAggregationBase):
         from datetime import date
         import calendar
 
-        # Prepara il queryset base delle transazioni
-        transactions = Transaction.objects.all()
+        # Le transazioni dei periodi chiusi sono in archivio: senza di esse il
+        # ricalcolo di un periodo già chiuso ne sovrascriverebbe i totali
+        grouped = []
+        for model in (Transaction, ArchivedTransaction):
+            transactions = model.objects.all()
         
-        if year:
-            transactions = transactions.filter(date__year=year)
-        if week:
-            # Calcola l'intervallo di date per la settimana specificata
-            start_date = date(year, 1, 1) + timedelta(weeks=week-1)
-            end_date = start_date + timedelta(days=6)
-            transactions = transactions.filter(date__range=[start_date, end_date])
-
-        # Aggrega per anno, settimana, account, categoria e tipo transazione
-        aggregations = transactions.annotate(
-            year=F('date__year'),
-            week=F('date__week')
-        ).values(
-            'year', 'week', 'account', 'category', 'transaction_type'
-        ).annotate(
-            total_amount=Sum('amount'),
-            transaction_count=Count('id'),
-            average_transaction_amount=Avg('amount')
-        )
+            if year:
+                transactions = transactions.filter(date__year=year)
+            if week:
+                # Calcola l'intervallo di date per la settimana specificata
+                start_date = date(year, 1, 1) + timedelta(weeks=week-1)
+                end_date = start_date + timedelta(days=6)
+                transactions = transactions.filter(date__range=[start_date, end_date])
 
-        # Crea o aggiorna gli oggetti di aggregazione
-        for agg in aggregations:
-            cls.objects.update_or_create(
-                year=agg['year'],
-                week=agg['week'],
-                account_id=agg['account'],
-                category_id=agg['category'],
-                transaction_type=agg['transaction_type'],
-                defaults={
-                    'total_amount': agg['total_amount'] or Decimal('0'),
-                    'transaction_count': agg['transaction_count'],
-                    'average_transaction_amount': agg['average_transaction_amount']
-                }
-            )
+            # Aggrega per anno, settimana, account, categoria e tipo transazione
+            grouped.append(transactions.annotate(
+                year=F('date__year'),
+                week=F('date__week')
+            ).values(
+                'year', 'week', 'account', 'category', 'transaction_type'
+            ).annotate(
+                total_amount=Sum('amount'),
+                transaction_count=Count('id'),
+                average_transaction_amount=average_amount('amount')
+            ))
+
+        # Crea o aggiorna gli oggetti di aggregazione in blocco
+        cls.upsert(cls.combine(grouped))
 
 
 class MonthlyTransactionAggregation(MonthlyAggregationBase):
@@ -201,7 +297,9 @@ class MonthlyTransactionAggregation(MonthlyAggregationBase):
     account = models.ForeignKey(
         Account, 
         on_delete=models.CASCADE, 
-        related_name='monthly_aggregations'
+        related_name='monthly_aggregations',
+        # coperto dall'indice (conto, periodo)
+        db_index=False
     )
     category = models.ForeignKey(
         TransactionCategory, 
@@ -215,7 +313,7 @@ class MonthlyTransactionAggregation(MonthlyAggregationBase):
         choices=Transaction.TRANSACTION_TYPES,
         verbose_name=_("Tipo di Transazione")
     )
-    total_amount = models.DecimalField(
+    total_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         default=0,
@@ -225,7 +323,7 @@ class MonthlyTransactionAggregation(MonthlyAggregationBase):
         default=0,
         verbose_name=_("Numero di Transazioni")
     )
-    average_transaction_amount = models.DecimalField(
+    average_transaction_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         null=True,
@@ -235,15 +333,7 @@ class MonthlyTransactionAggregation(MonthlyAggregationBase):
     class Meta(MonthlyAggregationBase.Meta):
         unique_together = ['year', 'month', 'account', 'category', 'transaction_type']
         indexes = [
-            models.Index(fields=['year']),
-            models.Index(fields=['month']),
-            models.Index(fields=['account']),
-            models.Index(fields=['category']),
-            models.Index(fields=['transaction_type']),
-            models.Index(fields=['year', 'month']),
-            models.Index(fields=['year', 'account']),
-            models.Index(fields=['year', 'category']),
-            models.Index(fields=['year', 'transaction_type']),
+            models.Index(fields=['account', 'year', 'month']),
         ]
         verbose_name = _("Aggregazione Mensile Transazioni")
         verbose_name_plural = _("Aggregazioni Mensili Transazioni")
@@ -255,40 +345,31 @@ class MonthlyTransactionAggregation(MonthlyAggregationBase):
         """
         from django.db.models import F
 
-        # Prepara il queryset base delle transazioni
-        transactions = Transaction.objects.all()
+        # Le transazioni dei periodi chiusi sono in archivio: senza di esse il
+        # ricalcolo di un periodo già chiuso ne sovrascriverebbe i totali
+        grouped = []
+        for model in (Transaction, ArchivedTransaction):
+            transactions = model.objects.all()
         
-        if year:
-            transactions = transactions.filter(date__year=year)
-        if month:
-            transactions = transactions.filter(date__month=month)
-
-        # Aggrega per anno, mese, account, categoria e tipo transazione
-        aggregations = transactions.annotate(
-            year=F('date__year'),
-            month=F('date__month')
-        ).values(
-            'year', 'month', 'account', 'category', 'transaction_type'
-        ).annotate(
-            total_amount=Sum('amount'),
-            transaction_count=Count('id'),
-            average_transaction_amount=Avg('amount')
-        )
+            if year:
+                transactions = transactions.filter(date__year=year)
+            if month:
+                transactions = transactions.filter(date__month=month)
 
-        # Crea o aggiorna gli oggetti di aggregazione
-        for agg in aggregations:
-            cls.objects.update_or_create(
-                year=agg['year'],
-                month=agg['month'],
-                account_id=agg['account'],
-                category_id=agg['category'],
-                transaction_type=agg['transaction_type'],
-                defaults={
-                    'total_amount': agg['total_amount'] or Decimal('0'),
-                    'transaction_count': agg['transaction_count'],
-                    'average_transaction_amount': agg['average_transaction_amount']
-                }
-            )
+            # Aggrega per anno, mese, account, categoria e tipo transazione
+            grouped.append(transactions.annotate(
+                year=F('date__year'),
+                month=F('date__month')
+            ).values(
+                'year', 'month', 'account', 'category', 'transaction_type'
+            ).annotate(
+                total_amount=Sum('amount'),
+                transaction_count=Count('id'),
+                average_transaction_amount=average_amount('amount')
+            ))
+
+        # Crea o aggiorna gli oggetti di aggregazione in blocco
+        cls.upsert(cls.combine(grouped))
 
 
 class QuarterlyTransactionAggregation(QuarterlyAggregationBase):
@@ -298,7 +379,9 @@ class QuarterlyTransactionAggregation(QuarterlyAggregationBase):
     account = models.ForeignKey(
         Account, 
         on_delete=models.CASCADE, 
-        related_name='quarterly_aggregations'
+        related_name='quarterly_aggregations',
+        # coperto dall'indice (conto, periodo)
+        db_index=False
     )
     category = models.ForeignKey(
         TransactionCategory, 
@@ -312,7 +395,7 @@ class QuarterlyTransactionAggregation(QuarterlyAggregationBase):
         choices=Transaction.TRANSACTION_TYPES,
         verbose_name=_("Tipo di Transazione")
     )
-    total_amount = models.DecimalField(
+    total_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         default=0,
@@ -322,7 +405,7 @@ class QuarterlyTransactionAggregation(QuarterlyAggregationBase):
         default=0,
         verbose_name=_("Numero di Transazioni")
     )
-    average_transaction_amount = models.DecimalField(
+    average_transaction_amount = amount_field(
         max_digits=10, 
         decimal_places=2, 
         null=True,
@@ -332,15 +415,7 @@ class QuarterlyTransactionAggregation(QuarterlyAggregationBase):
     class Meta(QuarterlyAggregationBase.Meta):
         unique_together = ['year', 'quarter', 'account', 'category', 'transaction_type']
         indexes = [
-            models.Index(fields=['year']),
-            models.Index(fields=['quarter']),
-            models.Index(fields=['account']),
-            models.Index(fields=['category']),
-            models.Index(fields=['transaction_type']),
-            models.Index(fields=['year', 'quarter']),
-            models.Index(fields=['year', 'account']),
-            models.Index(fields=['year', 'category']),
-            models.Index(fields=['year', 'transaction_type']),
+            models.Index(fields=['account', 'year', 'quarter']),
         ]
         verbose_name = _("Aggregazione Trimestrale Transazioni")
         verbose_name_plural = _("Aggregazioni Trimestrali Transazioni")
@@ -352,47 +427,38 @@ class QuarterlyTransactionAggregation(QuarterlyAggregationBase):
         """
         from django.db.models import F
 
-        # Prepara il queryset base delle transazioni
-        transactions = Transaction.objects.all()
+        # Le transazioni dei periodi chiusi sono in archivio: senza di esse il
+        # ricalcolo di un periodo già chiuso ne sovrascriverebbe i totali
+        grouped = []
+        for model in (Transaction, ArchivedTransaction):
+            transactions = model.objects.all()
         
-        if year:
-            transactions = transactions.filter(date__year=year)
-        if quarter:
-            # Calcola l'intervallo di mesi per il trimestre
-            quarter_months = {
-                1: [1, 2, 3],
-                2: [4, 5, 6],
-                3: [7, 8, 9],
-                4: [10, 11, 12]
-            }
-            transactions = transactions.filter(date__month__in=quarter_months.get(quarter, []))
-
-        # Aggrega per anno, trimestre, account, categoria e tipo transazione
-        aggregations = transactions.annotate(
-            year=F('date__year'),
-            quarter=F('date__quarter')
-        ).values(
-            'year', 'quarter', 'account', 'category', 'transaction_type'
-        ).annotate(
-            total_amount=Sum('amount'),
-            transaction_count=Count('id'),
-            average_transaction_amount=Avg('amount')
-        )
-
-        # Crea o aggiorna gli oggetti di aggregazione
-        for agg in aggregations:
-            cls.objects.update_or_create(
-                year=agg['year'],
-                quarter=agg['quarter'],
-                account_id=agg['account'],
-                category_id=agg['category'],
-                transaction_type=agg['transaction_type'],
-                defaults={
-                    'total_amount': agg['total_amount'] or Decimal('0'),
-                    'transaction_count': agg['transaction_count'],
-                    'average_transaction_amount': agg['average_transaction_amount']
+            if year:
+                transactions = transactions.filter(date__year=year)
+            if quarter:
+                # Calcola l'intervallo di mesi per il trimestre
+                quarter_months = {
+                    1: [1, 2, 3],
+                    2: [4, 5, 6],
+                    3: [7, 8, 9],
+                    4: [10, 11, 12]
                 }
-            )
+                transactions = transactions.filter(date__month__in=quarter_months.get(quarter, []))
+
+            # Aggrega per anno, trimestre, account, categoria e tipo transazione
+            grouped.append(transactions.annotate(
+                year=F('date__year'),
+                quarter=F('date__quarter')
+            ).values(
+                'year', 'quarter', 'account', 'category', 'transaction_type'
+            ).annotate(
+                total_amount=Sum('amount'),
+                transaction_count=Count('id'),
+                average_transaction_amount=average_amount('amount')
+            ))
+
+        # Crea o aggiorna gli oggetti di aggregazione in blocco
+        cls.upsert(cls.combine(grouped))
 
 
 class YearlyTransactionAggregation(YearlyAggregationBase):
@@ -402,7 +468,9 @@ class YearlyTransactionAggregation(YearlyAggregationBase):
     account = models.ForeignKey(
         Account, 
         on_delete=models.CASCADE, 
-        related_name='yearly_aggregations'
+        related_name='yearly_aggregations',
+        # coperto dall'indice (conto, periodo)
+        db_index=False
     )
     category = models.ForeignKey(
         TransactionCategory, 
@@ -411,6 +479,62 @@ class YearlyTransactionAggregation(YearlyAggregationBase):
         null=True,
         blank=True
     )
-    # transaction_type = models.CharField(
-    #     max_length=7, 
-    #     choices=Transaction.TRANSACTION_TYPES,
\ No newline at end of file
+    transaction_type = models.CharField(
+        max_length=7, 
+        choices=Transaction.TRANSACTION_TYPES,
+        verbose_name=_("Tipo di Transazione")
+    )
+    total_amount = amount_field(
+        max_digits=10, 
+        decimal_places=2, 
+        default=0,
+        verbose_name=_("Totale Importo")
+    )
+    transaction_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Numero di Transazioni")
+    )
+    average_transaction_amount = amount_field(
+        max_digits=10, 
+        decimal_places=2, 
+        null=True,
+        verbose_name=_("Media Importo Transazioni")
+    )
+
+    class Meta(YearlyAggregationBase.Meta):
+        unique_together = ['year', 'account', 'category', 'transaction_type']
+        indexes = [
+            models.Index(fields=['account', 'year']),
+        ]
+        verbose_name = _("Aggregazione Annuale Transazioni")
+        verbose_name_plural = _("Aggregazioni Annuali Transazioni")
+
+    @classmethod
+    def aggregate_transactions(cls, year=None):
+        """
+        Metodo per aggregare le transazioni annualmente
+        """
+        from django.db.models import F
+
+        # Le transazioni dei periodi chiusi sono in archivio: senza di esse il
+        # ricalcolo di un periodo già chiuso ne sovrascriverebbe i totali
+        grouped = []
+        for model in (Transaction, ArchivedTransaction):
+            transactions = model.objects.all()
+        
+            if year:
+                transactions = transactions.filter(date__year=year)
+
+            # Aggrega per anno, account, categoria e tipo transazione
+            grouped.append(transactions.annotate(
+                year=F('date__year')
+            ).values(
+                'year', 'account', 'category', 'transaction_type'
+            ).annotate(
+                total_amount=Sum('amount'),
+                transaction_count=Count('id'),
+                average_transaction_amount=average_amount('amount')
+            ))
+
+        # Crea o aggiorna gli oggetti di aggregazione in blocco
+        cls.upsert(cls.combine(grouped))
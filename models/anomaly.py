@@ -0,0 +1,77 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from .base import Account, Transaction, TransactionCategory
+
+
+class CategoryStats(models.Model):
+    """
+    Statistiche progressive degli importi di un conto per categoria (algoritmo
+    di Welford): numero, media e somma dei quadrati degli scarti, aggiornate a
+    ogni scrittura senza rileggere le transazioni
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='category_stats', db_index=False)
+    category = models.ForeignKey(TransactionCategory, on_delete=models.CASCADE, related_name='account_stats')
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'category'], name='category_stats_unique'),
+        ]
+        verbose_name = _("Statistica per Categoria")
+        verbose_name_plural = _("Statistiche per Categoria")
+
+    def __str__(self):
+        return f"{self.account_id}/{self.category_id}: n={self.count} media={self.mean:.2f}"
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class KnownDescription(models.Model):
+    """
+    Impronta di una descrizione normalizzata già vista per conto e categoria
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='known_descriptions', db_index=False)
+    category = models.ForeignKey(TransactionCategory, on_delete=models.CASCADE, related_name='known_descriptions', db_index=False)
+    digest = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'category', 'digest'], name='known_description_unique'),
+        ]
+
+
+class TransactionAnomaly(models.Model):
+    """
+    Segnalazione di una transazione insolita rispetto alla storia del conto
+    nella sua categoria
+    """
+    transaction = models.OneToOneField(
+        Transaction, on_delete=models.CASCADE, primary_key=True, related_name='anomaly',
+    )
+    # Scarto dalla media in deviazioni standard, se l'importo è anomalo
+    amount_score = models.FloatField(null=True, blank=True, verbose_name=_("Scarto dell'Importo"))
+    new_description = models.BooleanField(default=False, verbose_name=_("Descrizione Nuova"))
+    detected_at = models.DateTimeField(auto_now=True, verbose_name=_("Rilevata il"))
+
+    class Meta:
+        ordering = ['-detected_at']
+        verbose_name = _("Transazione Anomala")
+        verbose_name_plural = _("Transazioni Anomale")
+
+    def __str__(self):
+        return f"{self.transaction_id}: {self.reasons}"
+
+    @property
+    def reasons(self):
+        reasons = []
+        if self.amount_score is not None:
+            reasons.append(f"importo a {self.amount_score:+.1f}σ dalla media")
+        if self.new_description:
+            reasons.append("descrizione mai vista")
+        return ', '.join(reasons)
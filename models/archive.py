@@ -0,0 +1,75 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from .base import Account, Transaction, TransactionCategory
+from .currency import CURRENCY_CHOICES
+from .fields import amount_field
+
+
+class ClosedPeriod(models.Model):
+    """
+    Chiusura di tutte le transazioni fino a `end_date` inclusa: i saldi dei
+    conti a quella data vengono congelati e le transazioni spostate in archivio
+    """
+    end_date = models.DateField(unique=True, verbose_name=_("Chiuso fino al"))
+    closed_at = models.DateTimeField(auto_now_add=True)
+    archived_count = models.PositiveIntegerField(default=0, verbose_name=_("Transazioni Archiviate"))
+
+    class Meta:
+        ordering = ['-end_date']
+        verbose_name = _("Periodo Chiuso")
+        verbose_name_plural = _("Periodi Chiusi")
+
+    def __str__(self):
+        return f"Chiuso al {self.end_date}"
+
+
+class AccountPeriodBalance(models.Model):
+    """
+    Saldo di chiusura di un conto: è il saldo di apertura del periodo successivo
+    """
+    period = models.ForeignKey(ClosedPeriod, on_delete=models.CASCADE, related_name='balances')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='period_balances')
+    closing_balance = amount_field(max_digits=12, decimal_places=2, verbose_name=_("Saldo di Chiusura"))
+
+    class Meta:
+        unique_together = ['period', 'account']
+        verbose_name = _("Saldo di Chiusura")
+        verbose_name_plural = _("Saldi di Chiusura")
+
+    def __str__(self):
+        return f"{self.account.name} al {self.period.end_date}: {self.closing_balance} {self.account.currency_symbol}"
+
+
+class ArchivedTransaction(models.Model):
+    """
+    Transazione di un periodo chiuso, con lo stesso id che aveva in Transaction
+    """
+    id = models.BigIntegerField(primary_key=True)
+    period = models.ForeignKey(ClosedPeriod, on_delete=models.PROTECT, related_name='archived_transactions')
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='archived_transactions')
+    date = models.DateField()
+    amount = amount_field(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, blank=True)
+    transaction_type = models.CharField(max_length=7, choices=Transaction.TRANSACTION_TYPES)
+    category = models.ForeignKey(TransactionCategory, on_delete=models.PROTECT, related_name='archived_transactions')
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    modified_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Campi copiati così come sono da Transaction
+    COPIED_FIELDS = (
+        'id', 'account_id', 'date', 'amount', 'currency', 'transaction_type',
+        'category_id', 'description', 'created_at', 'modified_at',
+    )
+
+    class Meta:
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['account', 'date', 'transaction_type']),
+        ]
+        verbose_name = _("Transazione Archiviata")
+        verbose_name_plural = _("Transazioni Archiviate")
+
+    def __str__(self):
+        return f"{self.date} - {self.amount} - {self.category}"
@@ -1,9 +1,63 @@
 from django.db import models
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, F, Value, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 from datetime import date
 
+from .currency import CURRENCY_CHOICES, BASE_CURRENCY, currency_symbol
+from .fields import (
+    AMOUNTS_IN_CENTS, amount_field, amount_output_field, minor_units_sum, to_minor_units, from_minor_units,
+)
+
+class AccountQuerySet(models.QuerySet):
+    def with_balance(self, target_date=None):
+        """
+        Annota ogni conto con `balance`, il saldo alla data indicata, calcolato
+        con due subquery correlate invece di un aggregato per conto.
+        Il saldo parte dall'ultima chiusura di periodo entro la data, se presente.
+        """
+        from transactions.services.archive import balance_source
+        from .archive import AccountPeriodBalance
+
+        if target_date is None:
+            target_date = date.today()
+        start_date, source = balance_source(target_date)
+
+        def total(transaction_type):
+            rows = source.objects.filter(
+                account=OuterRef('pk'),
+                transaction_type=transaction_type,
+                date__lte=target_date,
+            )
+            if start_date is not None:
+                rows = rows.filter(date__gt=start_date)
+            return Coalesce(
+                Subquery(rows.order_by().values('account').annotate(total=Sum('amount')).values('total')),
+                Value(Decimal('0')),
+                output_field=amount_output_field(),
+            )
+
+        opening = F('initial_balance')
+        if start_date is not None:
+            opening = Coalesce(
+                Subquery(
+                    AccountPeriodBalance.objects.filter(
+                        account=OuterRef('pk'), period__end_date=start_date,
+                    ).values('closing_balance')
+                ),
+                F('initial_balance'),
+                output_field=amount_output_field(),
+            )
+
+        return self.annotate(
+            balance=models.ExpressionWrapper(
+                opening + total('income') - total('expense'),
+                output_field=amount_output_field(),
+            )
+        )
+
+
 class Account(models.Model):
     ACCOUNT_TYPES = (
         ('checking', 'Conto Corrente'),
@@ -15,9 +69,12 @@ class Account(models.Model):
     name = models.CharField(max_length=100)
     account_type = models.CharField(max_length=10, choices=ACCOUNT_TYPES)
     institution = models.CharField(max_length=100)
-    initial_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    initial_balance = amount_field(max_digits=10, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=BASE_CURRENCY)
     created_at = models.DateField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+
+    objects = AccountQuerySet.as_manager()
     
     class Meta:
         ordering = ['name']
@@ -28,16 +85,27 @@ class Account(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_account_type_display()})"
 
-    def get_balance_at_date(self, target_date=None):
+    @property
+    def currency_symbol(self):
+        return currency_symbol(self.currency)
+
+    def get_balance_at_date(self, target_date=None, currency=None):
+        """
+        Saldo alla data indicata nella valuta del conto, oppure convertito in
+        `currency` al tasso di quella data
+        """
         if target_date is None:
             target_date = date.today()
 
-        # Ottimizziamo la query usando annotate e aggregate
-        balance = self.initial_balance
+        # Partiamo dall'ultimo saldo di chiusura entro la data, se esiste
+        start_date, balance, source = self.opening_balance(target_date)
 
-        transactions_sum = self.account_transactions.filter(
-            date__lte=target_date
-        ).aggregate(
+        transactions = source.objects.filter(account=self, date__lte=target_date)
+        if start_date is not None:
+            transactions = transactions.filter(date__gt=start_date)
+
+        # Ottimizziamo la query usando annotate e aggregate
+        transactions_sum = transactions.aggregate(
             income_sum=Sum('amount', filter=models.Q(transaction_type='income')),
             expense_sum=Sum('amount', filter=models.Q(transaction_type='expense'))
         )
@@ -46,35 +114,67 @@ class Account(models.Model):
         income = transactions_sum['income_sum'] or Decimal('0')
         expenses = transactions_sum['expense_sum'] or Decimal('0')
         
-        return balance + income - expenses
+        balance = balance + income - expenses
+        if currency and currency != self.currency:
+            from transactions.services.fx import convert
+            balance = convert(balance, self.currency, currency, target_date).quantize(Decimal('0.01'))
+        return balance
 
     def current_balance(self):
         return self.get_balance_at_date()
 
-    # Metodo per calcolare il saldo giornaliero
-    def get_daily_balances(self):
-        # Iniziamo dal saldo iniziale
-        daily_balances = {}
+    def opening_balance(self, target_date=None):
+        """
+        (data dell'ultima chiusura entro target_date o None, saldo a quella data,
+        modello da cui leggere le transazioni successive)
+        """
+        from transactions.services.archive import balance_source
+        from .archive import AccountPeriodBalance
 
-        # Recuperiamo tutte le transazioni legate all'account, filtrate per data e tipo
-        transactions = Transaction.objects.filter(
-            account=self
-        ).values('date').annotate(
-            total_income=Sum('amount', filter=Q(transaction_type='income')),
-            total_expense=Sum('amount', filter=Q(transaction_type='expense'))
+        start_date, source = balance_source(target_date or date.today())
+        balance = None
+        if start_date is not None:
+            balance = AccountPeriodBalance.objects.filter(
+                account=self, period__end_date=start_date,
+            ).values_list('closing_balance', flat=True).first()
+        return start_date, self.initial_balance if balance is None else balance, source
+
+    @staticmethod
+    def daily_totals(account_id, since=None):
+        """
+        Entrate e uscite totali per giorno del conto, in ordine di data,
+        dopo la data `since` se indicata. In modalità centesimi i totali sono
+        interi in centesimi.
+        """
+        transactions = Transaction.objects.filter(account_id=account_id)
+        if since is not None:
+            transactions = transactions.filter(date__gt=since)
+        return transactions.values('date').annotate(
+            total_income=minor_units_sum('amount', filter=Q(transaction_type='income')),
+            total_expense=minor_units_sum('amount', filter=Q(transaction_type='expense'))
         ).order_by('date')
 
-        # Iniziamo a calcolare i bilanci giorno per giorno
-        balance = self.initial_balance  # Parte dal bilancio iniziale
-        for transaction in transactions:
+    @staticmethod
+    def accumulate_daily_balances(initial_balance, daily_totals):
+        daily_balances = {}
+
+        # In modalità centesimi la somma progressiva è su interi, convertiti
+        # in Decimal solo per il risultato
+        convert = from_minor_units if AMOUNTS_IN_CENTS else (lambda value: value)
+        balance = to_minor_units(initial_balance) if AMOUNTS_IN_CENTS else initial_balance  # Parte dal bilancio iniziale
+        for totals in daily_totals:
             # Calcoliamo il saldo del giorno in base al totale delle transazioni
-            daily_balance = balance + (transaction['total_income'] or 0) - (transaction['total_expense'] or 0)
-            daily_balances[transaction['date']] = daily_balance
-            # Aggiorniamo il bilancio accumulato
-            balance = daily_balance
+            balance = balance + (totals['total_income'] or 0) - (totals['total_expense'] or 0)
+            daily_balances[totals['date']] = convert(balance)
 
         return daily_balances
 
+    # Metodo per calcolare il saldo giornaliero
+    def get_daily_balances(self):
+        # Dall'ultima chiusura in poi: i giorni precedenti sono archiviati
+        start_date, balance, _ = self.opening_balance()
+        return self.accumulate_daily_balances(balance, self.daily_totals(self.pk, since=start_date))
+
 class TransactionCategory(models.Model):
     TRANSACTION_TYPES = (
         ('income', 'Entrata'),
@@ -132,7 +232,9 @@ class Transaction(models.Model):
         related_name='account_transactions'
     )
     date = models.DateField()
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = amount_field(max_digits=10, decimal_places=2)
+    # Sempre uguale alla valuta del conto; se vuota viene presa dal conto al salvataggio
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, blank=True)
     transaction_type = models.CharField(max_length=7, choices=TRANSACTION_TYPES)
     category = models.ForeignKey(
         TransactionCategory,
@@ -146,19 +248,53 @@ class Transaction(models.Model):
     class Meta:
         ordering = ['-date', '-created_at']
         indexes = [
-            models.Index(fields=['account', 'date', 'transaction_type']),
+            # Saldi: filtro per conto, tipo e data con la somma di amount letta
+            # dall'indice stesso (index-only scan)
+            models.Index(fields=['account', 'transaction_type', 'date', 'amount'], name='transaction_balance_idx'),
             models.Index(fields=['date']),
+            # Righe cambiate dopo un'aggregazione o un'esportazione (modified_since)
+            models.Index(fields=['modified_at']),
+            # Liste di entrate e uscite, nell'ordine di visualizzazione
+            models.Index(
+                fields=['-date', '-created_at'],
+                condition=Q(transaction_type='income'),
+                name='transaction_income_list_idx',
+            ),
+            models.Index(
+                fields=['-date', '-created_at'],
+                condition=Q(transaction_type='expense'),
+                name='transaction_expense_list_idx',
+            ),
         ]
 
     def __str__(self):
-        return f"{self.date} - {self.amount} € - {self.category}"
+        return f"{self.date} - {self.amount} {self.currency_symbol} - {self.category}"
+
+    @property
+    def currency_symbol(self):
+        return currency_symbol(self.currency or self.account.currency)
+
+    def save(self, *args, **kwargs):
+        # La valuta è sempre quella del conto
+        if self.account_id:
+            self.currency = self.account.currency
+        super().save(*args, **kwargs)
 
     def clean(self):
-        if self.category and self.category.transaction_type != self.transaction_type:
+        from transactions.services.archive import closed_until
+
+        closed = closed_until()
+        if closed is not None and self.date is not None and self.date <= closed:
+            raise ValidationError({
+                'date': f'Le transazioni fino al {closed} sono chiuse e archiviate'
+            })
+        if self.account_id:
+            self.currency = self.account.currency
+        if self.category_id and self.category.transaction_type != self.transaction_type:
             raise ValidationError({
                 'category': 'La categoria deve essere dello stesso tipo della transazione'
             })
-        if self.amount <= 0:
+        if self.amount is not None and self.amount <= 0:
             raise ValidationError({
                 'amount': 'L\'importo deve essere maggiore di zero'
             })
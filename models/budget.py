@@ -0,0 +1,87 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from .base import Account, TransactionCategory
+
+
+class Budget(models.Model):
+    """
+    Budget mensile di spesa per categoria (sottocategorie incluse), per conto
+    o per categoria all'interno di un conto
+    """
+    name = models.CharField(max_length=100, verbose_name=_("Nome"))
+    category = models.ForeignKey(
+        TransactionCategory,
+        on_delete=models.CASCADE,
+        related_name='budgets',
+        null=True,
+        blank=True
+    )
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name='budgets',
+        null=True,
+        blank=True
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Importo Mensile"))
+    alert_threshold = models.PositiveSmallIntegerField(
+        default=80,
+        verbose_name=_("Soglia di Avviso (%)")
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_active']),
+        ]
+        verbose_name = _("Budget")
+        verbose_name_plural = _("Budget")
+
+    def __str__(self):
+        return f"{self.name} ({self.amount} €/mese)"
+
+    def clean(self):
+        if not self.category_id and not self.account_id:
+            raise ValidationError('Il budget deve riferirsi a una categoria, a un conto o a entrambi')
+        if self.category_id and self.category.transaction_type != 'expense':
+            raise ValidationError({
+                'category': 'Il budget può riferirsi solo a categorie di spesa'
+            })
+
+    def remaining(self, year, month):
+        """
+        Budget residuo per il mese: una lettura del contatore per chiave univoca
+        """
+        from transactions.services.budgets import get_period
+        return self.amount - get_period(self, year, month).spent
+
+
+class BudgetPeriod(models.Model):
+    """
+    Contatore della spesa di un budget in un mese, aggiornato incrementalmente
+    a ogni scrittura sulle transazioni
+    """
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='periods')
+    year = models.PositiveIntegerField(verbose_name=_("Anno"))
+    month = models.PositiveSmallIntegerField(verbose_name=_("Mese"))
+    spent = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    # Ultimo livello di avviso emesso: 0 nessuno, 1 soglia superata, 2 budget superato
+    alert_level = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['budget', 'year', 'month']
+        ordering = ['-year', '-month']
+        verbose_name = _("Periodo di Budget")
+        verbose_name_plural = _("Periodi di Budget")
+
+    def __str__(self):
+        return f"{self.budget.name} {self.month:02d}/{self.year}: {self.spent} €"
+
+    @property
+    def remaining(self):
+        return self.budget.amount - self.spent
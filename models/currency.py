@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+CURRENCY_CHOICES = (
+    ('EUR', 'Euro'),
+    ('USD', 'Dollaro USA'),
+    ('GBP', 'Sterlina'),
+    ('CHF', 'Franco Svizzero'),
+    ('JPY', 'Yen'),
+)
+
+CURRENCY_SYMBOLS = {
+    'EUR': '€',
+    'USD': '$',
+    'GBP': '£',
+    'CHF': 'CHF',
+    'JPY': '¥',
+}
+
+# Valuta in cui sono espressi i tassi di cambio e valuta di default dei conti
+BASE_CURRENCY = getattr(settings, 'TRANSACTIONS_BASE_CURRENCY', 'EUR')
+# Valuta in cui vengono mostrati i totali che sommano conti diversi
+REPORTING_CURRENCY = getattr(settings, 'TRANSACTIONS_REPORTING_CURRENCY', BASE_CURRENCY)
+
+
+def currency_symbol(currency):
+    return CURRENCY_SYMBOLS.get(currency, currency)
+
+
+class ExchangeRate(models.Model):
+    """
+    Tasso di cambio giornaliero: `rate` è il valore di un'unità di `currency`
+    espresso nella valuta base. Per una data senza tasso vale l'ultimo precedente.
+    """
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, verbose_name=_("Valuta"))
+    date = models.DateField(verbose_name=_("Data"))
+    rate = models.DecimalField(max_digits=18, decimal_places=8, verbose_name=_("Tasso"))
+
+    class Meta:
+        unique_together = ['currency', 'date']
+        ordering = ['currency', '-date']
+        verbose_name = _("Tasso di Cambio")
+        verbose_name_plural = _("Tassi di Cambio")
+
+    def __str__(self):
+        return f"{self.date} 1 {self.currency} = {self.rate} {BASE_CURRENCY}"
@@ -0,0 +1,119 @@
+"""
+Campi per gli importi.
+
+Con TRANSACTIONS_AMOUNTS_IN_CENTS = True importi e saldi sono memorizzati come
+interi in centesimi (CentsField): somme e medie vengono calcolate dal database
+su interi e tornano Decimal solo alla lettura, mentre i modelli, i form e il
+resto del codice continuano a vedere Decimal con due decimali. Cambiare
+l'impostazione su un database esistente richiede una migrazione dei dati.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.conf import settings
+from django.core import exceptions
+from django.db import models
+from django.db.models import Avg, Sum
+
+
+AMOUNTS_IN_CENTS = getattr(settings, 'TRANSACTIONS_AMOUNTS_IN_CENTS', False)
+
+
+class CentsField(models.BigIntegerField):
+    """
+    Importo memorizzato come intero in unità minori ed esposto come Decimal
+    """
+    description = "Importo in centesimi"
+
+    def __init__(self, *args, max_digits=None, decimal_places=2, **kwargs):
+        self.max_digits = max_digits
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs['max_digits'] = self.max_digits
+        if self.decimal_places != 2:
+            kwargs['decimal_places'] = self.decimal_places
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        # Le medie arrivano come float o numeric: si arrotonda all'unità minore
+        return Decimal(round(value)).scaleb(-self.decimal_places)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value},
+            )
+
+    def to_minor_units(self, value):
+        return int(self.to_python(value).scaleb(self.decimal_places).to_integral_value())
+
+    def get_prep_value(self, value):
+        if hasattr(value, 'resolve_expression') or value is None:
+            return value
+        return self.to_minor_units(value)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return super(models.IntegerField, self).formfield(**{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': self.decimal_places,
+            **kwargs,
+        })
+
+
+def amount_field(*args, **kwargs):
+    """
+    Campo per un importo: CentsField in modalità centesimi, DecimalField altrimenti
+    """
+    if AMOUNTS_IN_CENTS:
+        return CentsField(*args, **kwargs)
+    return models.DecimalField(*args, **kwargs)
+
+
+def amount_output_field():
+    """
+    output_field per le espressioni sugli importi (somme e saldi)
+    """
+    return amount_field(max_digits=12, decimal_places=2)
+
+
+def average_amount(expression):
+    """
+    Media di un importo: in modalità centesimi la calcola il database sugli
+    interi e viene arrotondata al centesimo alla lettura
+    """
+    if AMOUNTS_IN_CENTS:
+        return Avg(expression, output_field=CentsField(decimal_places=2))
+    return Avg(expression)
+
+
+def minor_units_sum(expression, **kwargs):
+    """
+    Somma da usare nei cicli sui totali: in modalità centesimi restituisce
+    l'intero grezzo, senza conversione in Decimal
+    """
+    if AMOUNTS_IN_CENTS:
+        return Sum(expression, output_field=models.BigIntegerField(), **kwargs)
+    return Sum(expression, **kwargs)
+
+
+def to_minor_units(value):
+    return int(Decimal(value).scaleb(2).to_integral_value())
+
+
+def from_minor_units(value):
+    return Decimal(int(value)).scaleb(-2)
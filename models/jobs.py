@@ -0,0 +1,59 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class Job(models.Model):
+    """
+    Lavoro da eseguire in background dal comando run_jobs
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'In coda'),
+        (RUNNING, 'In esecuzione'),
+        (SUCCEEDED, 'Completato'),
+        (FAILED, 'Fallito'),
+    )
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    name = models.CharField(max_length=100, verbose_name=_("Tipo di Lavoro"))
+    # Due lavori attivi con la stessa chiave non possono coesistere
+    key = models.CharField(max_length=200, null=True, blank=True, verbose_name=_("Chiave"))
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=9, choices=STATUSES, default=QUEUED, verbose_name=_("Stato"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Tentativi"))
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name=_("Tentativi Massimi"))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_("Da Eseguire Dopo"))
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Ricerca dei lavori pronti da parte dei worker
+            models.Index(fields=['run_after'], condition=Q(status='queued'), name='job_ready_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=Q(status__in=('queued', 'running')),
+                name='job_active_key_unique',
+            ),
+        ]
+        verbose_name = _("Lavoro")
+        verbose_name_plural = _("Lavori")
+
+    def __str__(self):
+        return f"{self.key or self.name} ({self.get_status_display()})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
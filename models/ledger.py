@@ -0,0 +1,76 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .base import Account
+
+
+class LedgerEntry(models.Model):
+    """
+    Movimento in sola aggiunta del registro di un conto. Ogni scrittura su
+    una transazione aggiunge righe senza modificare le precedenti: la
+    creazione un movimento positivo, la cancellazione lo storno, la modifica
+    lo storno del vecchio stato seguito dal nuovo.
+    """
+    CREATED = 'created'
+    REVERSED = 'reversed'
+    KINDS = (
+        (CREATED, 'Registrazione'),
+        (REVERSED, 'Storno'),
+    )
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ledger_entries', db_index=False)
+    # Progressivo per conto, senza buchi
+    sequence = models.PositiveBigIntegerField()
+    # Nessuna ForeignKey: la transazione può essere cancellata o archiviata
+    transaction_id = models.BigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=8, choices=KINDS)
+    date = models.DateField(verbose_name=_("Data Valuta"))
+    # Effetto sul saldo: positivo per le entrate, negativo per le spese
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    recorded_at = models.DateTimeField(default=timezone.now, verbose_name=_("Registrato il"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'sequence'], name='ledger_entry_sequence_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['account', 'recorded_at']),
+            models.Index(fields=['transaction_id']),
+        ]
+        ordering = ['account', 'sequence']
+        verbose_name = _("Movimento di Registro")
+        verbose_name_plural = _("Movimenti di Registro")
+
+    def __str__(self):
+        return f"{self.account_id}#{self.sequence} {self.amount}"
+
+
+class LedgerHead(models.Model):
+    """
+    Ultimo progressivo e saldo progressivo del registro di un conto; la riga
+    viene bloccata durante l'aggiunta dei movimenti
+    """
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, primary_key=True, related_name='ledger_head')
+    sequence = models.PositiveBigIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class LedgerSnapshot(models.Model):
+    """
+    Somma dei movimenti di un conto fino al progressivo `sequence` incluso
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ledger_snapshots', db_index=False)
+    sequence = models.PositiveBigIntegerField()
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'sequence'], name='ledger_snapshot_sequence_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['account', 'recorded_at']),
+        ]
+        verbose_name = _("Istantanea del Registro")
+        verbose_name_plural = _("Istantanee del Registro")
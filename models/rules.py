@@ -0,0 +1,86 @@
+import re
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from .base import Account, TransactionCategory
+
+
+def regex_lookahead(name, pattern):
+    """
+    Lookahead opzionale con un gruppo nominato: la forma in cui ogni
+    espressione regolare entra nell'espressione combinata del matcher
+    """
+    return rf'(?:(?=[\s\S]*?(?P<{name}>{pattern})))?'
+
+
+class CategorizationRule(models.Model):
+    """
+    Regola che assegna una categoria alle transazioni importate senza categoria.
+    Tutti i criteri indicati devono essere soddisfatti; tra più regole valide
+    vince quella con priorità più bassa.
+    """
+    MATCH_TYPES = (
+        ('keywords', 'Parole chiave'),
+        ('regex', 'Espressione regolare'),
+    )
+    TRANSACTION_TYPES = TransactionCategory.TRANSACTION_TYPES
+
+    name = models.CharField(max_length=100, verbose_name=_("Nome"))
+    priority = models.PositiveIntegerField(default=100, verbose_name=_("Priorità"))
+    match_type = models.CharField(max_length=8, choices=MATCH_TYPES, default='keywords', verbose_name=_("Tipo di Confronto"))
+    # Parole chiave (parole intere) separate da virgola oppure espressione regolare,
+    # senza distinzione tra maiuscole e minuscole
+    pattern = models.CharField(max_length=500, blank=True, verbose_name=_("Descrizione"))
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name=_("Importo Minimo"))
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name=_("Importo Massimo"))
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name='categorization_rules',
+        null=True,
+        blank=True
+    )
+    transaction_type = models.CharField(max_length=7, choices=TRANSACTION_TYPES)
+    category = models.ForeignKey(
+        TransactionCategory,
+        on_delete=models.CASCADE,
+        related_name='categorization_rules'
+    )
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['priority', 'id']
+        verbose_name = _("Regola di Categorizzazione")
+        verbose_name_plural = _("Regole di Categorizzazione")
+
+    def __str__(self):
+        return f"{self.name} → {self.category}"
+
+    @property
+    def keywords(self):
+        return [keyword.strip() for keyword in self.pattern.split(',') if keyword.strip()]
+
+    def clean(self):
+        if self.category_id and self.category.transaction_type != self.transaction_type:
+            raise ValidationError({
+                'category': 'La categoria deve essere dello stesso tipo della regola'
+            })
+        if not (self.pattern or self.account_id or self.min_amount is not None or self.max_amount is not None):
+            raise ValidationError('La regola deve avere almeno un criterio oltre al tipo di transazione')
+        if self.min_amount is not None and self.max_amount is not None and self.min_amount > self.max_amount:
+            raise ValidationError({
+                'max_amount': 'L\'importo massimo deve essere maggiore del minimo'
+            })
+        if self.match_type == 'regex' and self.pattern:
+            # Si valida la forma usata nell'espressione combinata: per esempio
+            # i flag globali come (?i) sono ammessi solo in testa all'espressione
+            try:
+                compiled = re.compile('^' + regex_lookahead('r0', self.pattern), re.IGNORECASE)
+            except re.error as e:
+                raise ValidationError({'pattern': f'Espressione regolare non valida: {e}'})
+            # Le regole vengono unite in un'unica espressione: i gruppi devono restare anonimi
+            if compiled.groups > 1:
+                raise ValidationError({
+                    'pattern': 'Usare gruppi non catturanti (?:...) nelle espressioni regolari'
+                })
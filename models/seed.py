@@ -0,0 +1,18 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class SeedVersion(models.Model):
+    """
+    Impronta dell'ultima definizione dei dati predefiniti applicata
+    """
+    name = models.CharField(max_length=100, unique=True)
+    digest = models.CharField(max_length=64)
+    applied_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Versione Dati Predefiniti")
+        verbose_name_plural = _("Versioni Dati Predefiniti")
+
+    def __str__(self):
+        return f"{self.name} ({self.digest[:12]})"
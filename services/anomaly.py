@@ -0,0 +1,179 @@
+"""
+Rilevamento delle transazioni insolite al momento della scrittura.
+
+Per ogni (conto, categoria) CategoryStats tiene numero, media e somma dei
+quadrati degli scarti degli importi, aggiornati con l'algoritmo di Welford da
+transactions_changed (una modifica toglie il vecchio importo e aggiunge il
+nuovo). Ogni nuova transazione viene confrontata con le statistiche prima di
+esservi aggiunta, senza rileggere la storia:
+
+- importo anomalo se dista dalla media almeno TRANSACTIONS_ANOMALY_THRESHOLD
+  deviazioni standard;
+- descrizione nuova se la sua forma normalizzata (minuscole, senza cifre e
+  punteggiatura) non è mai comparsa per quel conto e quella categoria.
+
+Entrambi i controlli partono solo dopo TRANSACTIONS_ANOMALY_MIN_HISTORY
+transazioni; le segnalazioni sono salvate in TransactionAnomaly.
+"""
+import hashlib
+import math
+import re
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from transactions.models.base import Transaction
+from transactions.models.anomaly import CategoryStats, KnownDescription, TransactionAnomaly
+
+
+ANOMALY_THRESHOLD = getattr(settings, 'TRANSACTIONS_ANOMALY_THRESHOLD', 3.0)
+MIN_HISTORY = getattr(settings, 'TRANSACTIONS_ANOMALY_MIN_HISTORY', 5)
+REBUILD_BATCH_SIZE = 5000
+
+_NOISE = re.compile(r'[\d\W_]+')
+
+
+def description_digest(description):
+    normalized = ' '.join(_NOISE.sub(' ', (description or '').lower()).split())
+    if not normalized:
+        return None
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+
+def add(stats, value):
+    stats.count += 1
+    delta = value - stats.mean
+    stats.mean += delta / stats.count
+    stats.m2 += delta * (value - stats.mean)
+
+
+def remove(stats, value):
+    """
+    Toglie un valore aggiunto in precedenza (Welford all'indietro)
+    """
+    if stats.count <= 1:
+        stats.count, stats.mean, stats.m2 = 0, 0.0, 0.0
+        return
+    mean = (stats.count * stats.mean - value) / (stats.count - 1)
+    stats.m2 = max(stats.m2 - (value - stats.mean) * (value - mean), 0.0)
+    stats.mean = mean
+    stats.count -= 1
+
+
+def score(stats, value):
+    """
+    Scarto di value dalla media in deviazioni standard, None con poca storia.
+    Una deviazione nulla (importi tutti uguali) vale l'1% della media.
+    """
+    if stats.count < MIN_HISTORY:
+        return None
+    deviation = max(math.sqrt(stats.variance), abs(stats.mean) / 100, 0.01)
+    return (value - stats.mean) / deviation
+
+
+def _effect(state):
+    return (state.account_id, state.category_id, state.amount, description_digest(state.description))
+
+
+def on_transactions_changed(sender, changes, **kwargs):
+    changes = [
+        (before, after) for before, after in changes
+        if before is None or after is None or _effect(before) != _effect(after)
+    ]
+    if not changes:
+        return
+    states = [state for pair in changes for state in pair if state is not None]
+    keys = sorted({(state.account_id, state.category_id) for state in states})
+    account_ids = {account_id for account_id, _ in keys}
+    category_ids = {category_id for _, category_id in keys}
+
+    with db_transaction.atomic():
+        CategoryStats.objects.bulk_create(
+            [CategoryStats(account_id=account_id, category_id=category_id) for account_id, category_id in keys],
+            ignore_conflicts=True,
+        )
+        stats = {
+            (row.account_id, row.category_id): row
+            for row in CategoryStats.objects.select_for_update().filter(
+                account_id__in=account_ids, category_id__in=category_ids,
+            ).order_by('pk')
+        }
+        digests = {description_digest(state.description) for state in states} - {None}
+        known = set(KnownDescription.objects.filter(
+            account_id__in=account_ids, category_id__in=category_ids, digest__in=digests,
+        ).values_list('account_id', 'category_id', 'digest'))
+
+        flagged, cleared, seen = [], [], set()
+        for before, after in changes:
+            if before is not None:
+                remove(stats[(before.account_id, before.category_id)], float(before.amount))
+            if after is None:
+                continue
+            key = (after.account_id, after.category_id)
+            value = float(after.amount)
+            amount_score = score(stats[key], value)
+            if amount_score is not None and abs(amount_score) < ANOMALY_THRESHOLD:
+                amount_score = None
+            digest = description_digest(after.description)
+            new_description = (
+                digest is not None and stats[key].count >= MIN_HISTORY and (*key, digest) not in known
+            )
+            add(stats[key], value)
+            if digest is not None and (*key, digest) not in known:
+                known.add((*key, digest))
+                seen.add((*key, digest))
+
+            if amount_score is not None or new_description:
+                flagged.append(TransactionAnomaly(
+                    transaction_id=after.id, amount_score=amount_score,
+                    new_description=new_description, detected_at=timezone.now(),
+                ))
+            elif before is not None:
+                cleared.append(after.id)
+
+        now = timezone.now()
+        for row in stats.values():
+            row.updated_at = now
+        CategoryStats.objects.bulk_update(stats.values(), fields=['count', 'mean', 'm2', 'updated_at'])
+        KnownDescription.objects.bulk_create(
+            [KnownDescription(account_id=a, category_id=c, digest=d) for a, c, d in seen], ignore_conflicts=True,
+        )
+        if cleared:
+            TransactionAnomaly.objects.filter(transaction_id__in=cleared).delete()
+        TransactionAnomaly.objects.bulk_create(
+            flagged, update_conflicts=True, unique_fields=['transaction'],
+            update_fields=['amount_score', 'new_description', 'detected_at'],
+        )
+
+
+def rebuild():
+    """
+    Ricalcola statistiche e descrizioni note dalle transazioni correnti, in
+    ordine di data; le segnalazioni esistenti restano. Restituisce il numero
+    di transazioni lette.
+    """
+    stats, known = {}, set()
+    rows = Transaction.objects.order_by('date', 'pk').values_list(
+        'account_id', 'category_id', 'amount', 'description',
+    )
+    count = 0
+    for account_id, category_id, amount, description in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        key = (account_id, category_id)
+        if key not in stats:
+            stats[key] = CategoryStats(account_id=account_id, category_id=category_id)
+        add(stats[key], float(amount))
+        digest = description_digest(description)
+        if digest is not None:
+            known.add((*key, digest))
+        count += 1
+
+    with db_transaction.atomic():
+        CategoryStats.objects.all().delete()
+        KnownDescription.objects.all().delete()
+        CategoryStats.objects.bulk_create(stats.values(), batch_size=REBUILD_BATCH_SIZE)
+        KnownDescription.objects.bulk_create(
+            [KnownDescription(account_id=a, category_id=c, digest=d) for a, c, d in known],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+    return count
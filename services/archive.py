@@ -0,0 +1,124 @@
+"""
+Chiusura dei periodi e archiviazione delle transazioni.
+
+`close_period(end_date)` congela il saldo di ogni conto a end_date
+(AccountPeriodBalance) e sposta le transazioni fino a quella data in
+ArchivedTransaction. I saldi partono poi dall'ultima chiusura: per una data
+successiva all'ultima chiusura si leggono solo le transazioni correnti, per
+una data all'interno dei periodi chiusi solo quelle archiviate dopo la
+chiusura precedente.
+
+Lo spostamento non emette transactions_changed: i contatori dei budget e le
+aggregazioni dei mesi chiusi restano invariati; le righe vengono solo tolte
+dall'indice di ricerca e perdono le segnalazioni di anomalia. I report e le
+esportazioni leggono anche le transazioni archiviate.
+"""
+import bisect
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction as db_transaction
+
+from transactions.models.base import Account, Transaction
+from transactions.models.archive import ClosedPeriod, AccountPeriodBalance, ArchivedTransaction
+from transactions.models.anomaly import TransactionAnomaly
+from transactions.services.search import get_backend
+
+
+ARCHIVE_BATCH_SIZE = getattr(settings, 'TRANSACTIONS_ARCHIVE_BATCH_SIZE', 1000)
+CLOSED_DATES_KEY = 'transactions:closed_dates'
+CLOSED_DATES_TIMEOUT = 300
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def closed_dates():
+    """
+    Date di chiusura in ordine crescente, lette dalla cache per non
+    interrogare il database a ogni validazione e a ogni calcolo di saldo
+    """
+    value = cache.get(CLOSED_DATES_KEY)
+    if value is None:
+        # '' distingue "nessuna chiusura" da una chiave assente
+        value = ','.join(day.isoformat() for day in ClosedPeriod.objects.order_by('end_date').values_list('end_date', flat=True))
+        cache.set(CLOSED_DATES_KEY, value, CLOSED_DATES_TIMEOUT)
+    return [date.fromisoformat(day) for day in value.split(',')] if value else []
+
+
+def closed_until():
+    """
+    Ultima data chiusa
+    """
+    dates = closed_dates()
+    return dates[-1] if dates else None
+
+
+def clear_closed_until(sender, **kwargs):
+    cache.delete(CLOSED_DATES_KEY)
+
+
+def balance_source(target_date):
+    """
+    (data dell'ultima chiusura entro target_date o None, modello da cui leggere
+    le transazioni successive fino a target_date)
+    """
+    dates = closed_dates()
+    position = bisect.bisect_right(dates, target_date)
+    start = dates[position - 1] if position else None
+    if position < len(dates):
+        return start, ArchivedTransaction
+    return start, Transaction
+
+
+def close_period(end_date, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Chiude tutte le transazioni fino a end_date inclusa e restituisce il
+    ClosedPeriod creato
+    """
+    if end_date >= date.today():
+        raise ArchiveError("Only past periods can be closed.")
+    latest = closed_until()
+    if latest is not None and end_date <= latest:
+        raise ArchiveError(f"Transactions up to {latest} are already closed.")
+
+    with db_transaction.atomic():
+        # I saldi vanno calcolati prima di registrare la chiusura, che cambia la base di with_balance
+        balances = {
+            account.pk: account.balance
+            for account in Account.objects.select_for_update().with_balance(end_date)
+        }
+        period = ClosedPeriod.objects.create(end_date=end_date)
+        AccountPeriodBalance.objects.bulk_create([
+            AccountPeriodBalance(period=period, account_id=account_id, closing_balance=balance)
+            for account_id, balance in balances.items()
+        ])
+
+        ids = list(Transaction.objects.filter(date__lte=end_date).order_by('pk').values_list('pk', flat=True))
+        backend = get_backend()
+        backend.ensure_setup()
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            rows = Transaction.objects.filter(pk__in=chunk).values(*ArchivedTransaction.COPIED_FIELDS)
+            ArchivedTransaction.objects.bulk_create([
+                ArchivedTransaction(period=period, **row) for row in rows
+            ])
+            # Le righe non spariscono, cambiano tabella: QuerySet.delete() emetterebbe
+            # post_delete (e quindi transactions_changed) per ognuna, e budget,
+            # registro e statistiche tratterebbero lo spostamento come una
+            # cancellazione. Si usa una DELETE SQL, dopo aver tolto le sole righe
+            # che riferiscono Transaction con una chiave esterna.
+            TransactionAnomaly.objects.filter(transaction_id__in=chunk).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {connection.ops.quote_name(Transaction._meta.db_table)} "
+                    f"WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk,
+                )
+            backend.remove(chunk)
+
+        period.archived_count = len(ids)
+        period.save(update_fields=['archived_count'])
+    return period
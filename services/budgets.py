@@ -0,0 +1,246 @@
+import logging
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Q, Sum
+
+from transactions.models.base import Transaction, TransactionCategory
+from transactions.models.aggregated import MonthlyTransactionAggregation
+from transactions.models.archive import ArchivedTransaction
+from transactions.models.budget import Budget, BudgetPeriod
+from transactions.signals import budget_threshold_crossed
+from transactions.versioning import get_version, bump_version
+
+
+logger = logging.getLogger(__name__)
+
+ALERT_NONE, ALERT_THRESHOLD, ALERT_EXCEEDED = 0, 1, 2
+
+# Versione della mappa dei parent, cambiata a ogni scrittura su una categoria
+PARENTS_VERSION_KEY = 'category_parents'
+
+_parents_lock = threading.Lock()
+_parents_cached = (None, None)
+
+
+def category_parents():
+    """
+    Mappa id -> id del parent di tutte le categorie, letta con una query e
+    tenuta in memoria finché la versione 'category_parents' non cambia. La
+    mappa è condivisa: non va modificata.
+    """
+    global _parents_cached
+    version = get_version(PARENTS_VERSION_KEY)
+    cached_version, parents = _parents_cached
+    if cached_version != version:
+        with _parents_lock:
+            parents = dict(TransactionCategory.objects.values_list('id', 'parent_id'))
+            _parents_cached = (version, parents)
+    return parents
+
+
+def invalidate_parents(sender=None, **kwargs):
+    bump_version(PARENTS_VERSION_KEY)
+
+
+def ancestors(category_id, parents):
+    seen = []
+    while category_id is not None and category_id not in seen:
+        seen.append(category_id)
+        category_id = parents.get(category_id)
+    return seen
+
+
+def descendants(category_id, parents):
+    children = defaultdict(list)
+    for child, parent in parents.items():
+        if parent is not None:
+            children[parent].append(child)
+    found, stack = [], [category_id]
+    while stack:
+        current = stack.pop()
+        if current not in found:
+            found.append(current)
+            stack.extend(children[current])
+    return found
+
+
+def compute_spent(budget, year, month, parents=None, source='raw'):
+    """
+    Spesa del budget nel mese calcolata da zero, dalle transazioni correnti e
+    archiviate ('raw') o dall'aggregazione mensile ('aggregation')
+    """
+    if source == 'aggregation':
+        querysets = [(MonthlyTransactionAggregation.objects.filter(year=year, month=month), 'total_amount')]
+    else:
+        querysets = [
+            (model.objects.filter(date__year=year, date__month=month), 'amount')
+            for model in (Transaction, ArchivedTransaction)
+        ]
+
+    if budget.category_id and parents is None:
+        parents = category_parents()
+    spent = Decimal('0')
+    for queryset, field in querysets:
+        queryset = queryset.filter(transaction_type='expense')
+        if budget.account_id:
+            queryset = queryset.filter(account_id=budget.account_id)
+        if budget.category_id:
+            queryset = queryset.filter(category_id__in=descendants(budget.category_id, parents))
+        spent += queryset.aggregate(total=Sum(field))['total'] or Decimal('0')
+    return spent
+
+
+def get_period(budget, year, month):
+    """
+    Contatore del budget per il mese; viene inizializzato dalle transazioni
+    solo la prima volta che il mese viene letto o movimentato
+    """
+    period = BudgetPeriod.objects.filter(budget=budget, year=year, month=month).first()
+    if period is None:
+        period, _ = BudgetPeriod.objects.get_or_create(
+            budget=budget, year=year, month=month,
+            defaults={'spent': compute_spent(budget, year, month)},
+        )
+    return period
+
+
+def alert_level(budget, spent):
+    if spent >= budget.amount:
+        return ALERT_EXCEEDED
+    if spent >= budget.amount * budget.alert_threshold / 100:
+        return ALERT_THRESHOLD
+    return ALERT_NONE
+
+
+def apply_delta(budget, year, month, delta, parents=None):
+    period = BudgetPeriod.objects.select_for_update().filter(budget=budget, year=year, month=month).first()
+    if period is None:
+        # Primo movimento del mese: il totale letto dal database include già
+        # la scrittura che ha generato il delta
+        period, created = BudgetPeriod.objects.get_or_create(
+            budget=budget, year=year, month=month,
+            defaults={'spent': compute_spent(budget, year, month, parents)},
+        )
+        if not created:
+            period.spent += delta
+    else:
+        period.spent += delta
+
+    level = alert_level(budget, period.spent)
+    if level > period.alert_level:
+        logger.warning(
+            "Budget '%s' %s for %02d/%d: spent %s of %s",
+            budget.name, 'exceeded' if level == ALERT_EXCEEDED else 'over threshold',
+            month, year, period.spent, budget.amount,
+        )
+        budget_threshold_crossed.send(sender=Budget, budget=budget, period=period, level=level)
+    period.alert_level = level
+    period.save()
+    return period
+
+
+def on_transactions_changed(sender, changes, **kwargs):
+    """
+    Aggiorna i contatori dei budget toccati dalle transazioni modificate,
+    applicando una sola variazione per budget e mese. I budget inattivi non
+    vengono seguiti: i loro contatori si ricalcolano alla riattivazione. Vengono
+    letti solo i budget dei conti e delle categorie (con i loro antenati)
+    toccati dalle transazioni.
+    """
+    states = [
+        state for change in changes for state in change
+        if state is not None and state.transaction_type == 'expense'
+    ]
+    if not states:
+        return
+    parents = category_parents()
+    categories = {ancestor for state in states for ancestor in ancestors(state.category_id, parents)}
+    budgets = list(Budget.objects.filter(
+        Q(account__isnull=True) | Q(account_id__in={state.account_id for state in states}),
+        Q(category__isnull=True) | Q(category_id__in=categories),
+        is_active=True,
+    ))
+    if not budgets:
+        return
+
+    deltas = defaultdict(Decimal)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None or state.transaction_type != 'expense':
+                continue
+            category_ancestors = ancestors(state.category_id, parents)
+            for budget in budgets:
+                if budget.account_id and budget.account_id != state.account_id:
+                    continue
+                if budget.category_id and budget.category_id not in category_ancestors:
+                    continue
+                deltas[(budget.pk, state.date.year, state.date.month)] += sign * state.amount
+
+    budgets_by_id = {budget.pk: budget for budget in budgets}
+    with db_transaction.atomic():
+        for (budget_id, year, month), delta in deltas.items():
+            if delta:
+                apply_delta(budgets_by_id[budget_id], year, month, delta, parents)
+
+
+def rebuild_periods(year, month, source='aggregation'):
+    """
+    Ricalcola i contatori di tutti i budget attivi per il mese, per default
+    dall'aggregazione mensile (da aggiornare prima con aggregate_transactions)
+    """
+    parents = category_parents()
+    for budget in Budget.objects.filter(is_active=True):
+        spent = compute_spent(budget, year, month, parents, source=source)
+        BudgetPeriod.objects.update_or_create(
+            budget=budget, year=year, month=month,
+            defaults={'spent': spent, 'alert_level': alert_level(budget, spent)},
+        )
+
+
+# Campi che decidono quali transazioni ricadono in un budget
+BUDGET_SCOPE_FIELDS = ('category_id', 'account_id', 'is_active')
+
+
+def _scope(sender, instance):
+    fields = BUDGET_SCOPE_FIELDS if sender is Budget else ('parent_id',)
+    return tuple(getattr(instance, field) for field in fields), fields
+
+
+def capture_previous_scope(sender, instance, raw=False, **kwargs):
+    instance._previous_scope = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        _, fields = _scope(sender, instance)
+        instance._previous_scope = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+def on_scope_changed(sender, instance, created, raw=False, **kwargs):
+    """
+    Ricalcola i contatori esistenti di un budget riattivato o con categoria o
+    conto diversi, e di tutti i budget per categoria quando una categoria
+    cambia parent
+    """
+    previous = getattr(instance, '_previous_scope', None)
+    if raw or created or previous is None or previous == _scope(sender, instance)[0]:
+        return
+    if sender is Budget:
+        budgets = [instance] if instance.is_active else []
+    else:
+        budgets = Budget.objects.filter(is_active=True, category__isnull=False)
+    refresh_periods(budgets)
+
+
+def refresh_periods(budgets):
+    """
+    Ricalcola dalle transazioni i contatori già creati dei budget indicati,
+    senza emettere avvisi
+    """
+    parents = category_parents()
+    with db_transaction.atomic():
+        for budget in budgets:
+            for period in BudgetPeriod.objects.select_for_update().filter(budget=budget):
+                period.spent = compute_spent(budget, period.year, period.month, parents)
+                period.alert_level = alert_level(budget, period.spent)
+                period.save(update_fields=['spent', 'alert_level', 'updated_at'])
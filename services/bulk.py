@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from transactions.models.base import Account, Transaction, TransactionCategory
+from transactions.services.categorization import categorize
+from transactions.signals import transactions_changed, snapshot
+
+
+BULK_BATCH_SIZE = getattr(settings, 'TRANSACTIONS_BULK_BATCH_SIZE', 500)
+
+# Campi scrivibili tramite l'API massiva (account e categoria sono passati per id)
+WRITABLE_FIELDS = ('date', 'amount', 'description', 'transaction_type')
+RELATED_FIELDS = ('account', 'category')
+
+
+class BulkItemError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _operation(item):
+    op = item.get('op')
+    if op is None:
+        op = 'update' if item.get('id') is not None else 'create'
+    if op not in ('create', 'update', 'delete'):
+        raise BulkItemError({'op': [f"Operazione non valida: {op}"]})
+    if op in ('update', 'delete') and item.get('id') is None:
+        raise BulkItemError({'id': ["L'id è obbligatorio per aggiornamenti e cancellazioni."]})
+    return op, (_parse_id(item, 'id') if op != 'create' else None)
+
+
+def _parse_id(item, name):
+    value = item.get(name, item.get(f'{name}_id'))
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BulkItemError({name: [f"Id non valido: {value}"]})
+
+
+def apply_bulk(items, all_or_none=False):
+    """
+    Crea, aggiorna e cancella in blocco una lista di transazioni.
+
+    Ogni elemento è un dizionario con `op` ('create', 'update' o 'delete', dedotto
+    dalla presenza di `id` se assente), l'`id` per aggiornamenti e cancellazioni e i
+    campi della transazione (`account` e `category` come id). Gli oggetti collegati
+    vengono caricati con una query per modello e le regole di `Transaction.clean`
+    sono applicate in memoria; le scritture avvengono in un'unica transazione con
+    `bulk_create`/`bulk_update`. Se `all_or_none` è vero, un solo errore annulla
+    l'intero lotto. Le creazioni senza `category` vengono categorizzate con le
+    regole di CategorizationRule in un solo passaggio.
+
+    Un id ripetuto nello stesso lotto è un errore dell'elemento che lo ripete.
+
+    Restituisce una lista di risultati, uno per elemento e nello stesso ordine.
+    """
+    results = [None] * len(items)
+    parsed = []
+
+    # 1. Analisi della struttura degli elementi
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise BulkItemError({'__all__': ["Ogni elemento deve essere un oggetto."]})
+            op, pk = _operation(item)
+            # Una transazione compare una sola volta: lo stato "prima" inviato
+            # con transactions_changed deve essere quello del database
+            if pk is not None:
+                if pk in seen:
+                    raise BulkItemError({'id': [f"Transazione {pk} ripetuta nel lotto."]})
+                seen.add(pk)
+            parsed.append((index, op, pk, item, _parse_id(item, 'account'), _parse_id(item, 'category')))
+        except BulkItemError as e:
+            results[index] = {'index': index, 'status': 'error', 'errors': e.errors}
+
+    # Le nuove transazioni senza categoria la ricevono dalle regole di categorizzazione
+    uncategorized = [position for position, entry in enumerate(parsed) if entry[1] == 'create' and entry[5] is None]
+    if uncategorized:
+        suggested = categorize(
+            {**parsed[position][3], 'account': parsed[position][4]} for position in uncategorized
+        )
+        for position, category_id in zip(uncategorized, suggested):
+            if category_id is not None:
+                parsed[position] = (*parsed[position][:5], category_id)
+
+    # 2. Caricamento in blocco degli oggetti esistenti e collegati
+    existing = Transaction.objects.select_related('account', 'category').in_bulk(
+        {pk for _, _, pk, _, _, _ in parsed if pk is not None}
+    )
+    accounts = Account.objects.in_bulk(
+        {account_id for _, _, _, _, account_id, _ in parsed if account_id is not None}
+    )
+    categories = TransactionCategory.objects.in_bulk(
+        {category_id for _, _, _, _, _, category_id in parsed if category_id is not None}
+    )
+
+    # 3. Validazione in memoria, senza query per elemento
+    to_create, to_update, to_delete = [], [], []
+    previous = {}
+    for index, op, pk, item, account_id, category_id in parsed:
+        try:
+            obj = None
+            if op != 'create':
+                obj = existing.get(pk)
+                if obj is None:
+                    raise BulkItemError({'id': [f"Transazione {pk} non trovata."]})
+            if op == 'delete':
+                to_delete.append((index, obj))
+                continue
+
+            if op == 'update':
+                previous[obj.pk] = snapshot(obj)
+            else:
+                obj = Transaction()
+
+            for name in WRITABLE_FIELDS:
+                if name in item:
+                    setattr(obj, name, item[name])
+            if account_id is not None:
+                if account_id not in accounts:
+                    raise BulkItemError({'account': [f"Conto {account_id} inesistente."]})
+                obj.account = accounts[account_id]
+                # La valuta segue il conto: clean() la ricava da quello nuovo
+            if category_id is not None:
+                if category_id not in categories:
+                    raise BulkItemError({'category': [f"Categoria {category_id} inesistente."]})
+                obj.category = categories[category_id]
+
+            errors = {}
+            if obj.account_id is None:
+                errors['account'] = ["Il conto è obbligatorio."]
+            if obj.category_id is None:
+                errors['category'] = ["La categoria è obbligatoria."]
+            try:
+                obj.clean_fields(exclude=RELATED_FIELDS)
+            except ValidationError as e:
+                errors.update(e.message_dict)
+            if not errors:
+                try:
+                    obj.clean()
+                except ValidationError as e:
+                    errors.update(e.message_dict)
+            if errors:
+                raise BulkItemError(errors)
+
+            (to_create if op == 'create' else to_update).append((index, obj))
+        except BulkItemError as e:
+            results[index] = {'index': index, 'status': 'error', 'errors': e.errors}
+
+    has_errors = any(result is not None for result in results)
+    if all_or_none and has_errors:
+        for index, _ in to_create + to_update + to_delete:
+            results[index] = {'index': index, 'status': 'skipped'}
+        return results
+
+    # 4. Scrittura in un'unica transazione
+    with db_transaction.atomic():
+        if to_create:
+            Transaction.objects.bulk_create([obj for _, obj in to_create], batch_size=BULK_BATCH_SIZE)
+        if to_update:
+            # bulk_update non applica auto_now
+            now = timezone.now()
+            for _, obj in to_update:
+                obj.modified_at = now
+            Transaction.objects.bulk_update(
+                [obj for _, obj in to_update],
+                fields=[*WRITABLE_FIELDS, *RELATED_FIELDS, 'currency', 'modified_at'],
+                batch_size=BULK_BATCH_SIZE,
+            )
+        if to_delete:
+            # QuerySet.delete emette già post_delete per ogni riga
+            Transaction.objects.filter(pk__in=[obj.pk for _, obj in to_delete]).delete()
+
+        changes = (
+            [(None, snapshot(obj)) for _, obj in to_create]
+            + [(previous[obj.pk], snapshot(obj)) for _, obj in to_update]
+        )
+        if changes:
+            transactions_changed.send(sender=Transaction, changes=changes)
+
+    for status, entries in (('created', to_create), ('updated', to_update), ('deleted', to_delete)):
+        for index, obj in entries:
+            results[index] = {'index': index, 'status': status, 'id': obj.pk}
+    return results
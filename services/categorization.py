@@ -0,0 +1,156 @@
+"""
+Categorizzazione automatica delle transazioni tramite CategorizationRule.
+
+Le regole attive vengono compilate una sola volta in un matcher. Le parole
+chiave di tutte le regole finiscono in un unico dizionario indicizzato per
+sequenze di parole, consultato con una sola scansione della descrizione; le
+espressioni regolari formano un'unica espressione di lookahead opzionali con
+un gruppo nominato per regola, così che una chiamata a `match` restituisca
+tutte quelle corrispondenti. Importo, conto e tipo vengono poi verificati solo
+per le regole candidate, in ordine di priorità.
+
+Il matcher resta in memoria finché la versione 'categorization_rules' (vedi
+transactions.versioning) non cambia, cioè finché una regola non viene
+salvata o cancellata.
+"""
+import logging
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+
+from transactions.models.rules import CategorizationRule, regex_lookahead
+from transactions.versioning import get_version, bump_version
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'categorization_rules'
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+class Matcher:
+    def __init__(self, rules):
+        # Le regole arrivano già ordinate per priorità
+        self.rules = [
+            (rule.pk, rule.transaction_type, rule.account_id, rule.min_amount, rule.max_amount, rule.category_id)
+            for rule in rules
+        ]
+        self.text_rules = set()
+        skipped = set()
+        # sequenza di parole -> regole; le parole chiave vengono cercate per dizionario
+        self.keywords = {}
+        lookaheads = []
+        for rule in rules:
+            if rule.match_type == 'keywords':
+                for keyword in rule.keywords:
+                    words = tuple(tokenize(keyword))
+                    if words:
+                        self.keywords.setdefault(words, set()).add(rule.pk)
+                        self.text_rules.add(rule.pk)
+            elif rule.pattern:
+                # Regole salvate senza clean() (ORM, import) possono avere espressioni
+                # non valide: vengono scartate invece di bloccare tutte le altre
+                lookahead = regex_lookahead(f'r{rule.pk}', rule.pattern)
+                try:
+                    # Gruppi nominati propri potrebbero scontrarsi con quelli delle altre regole
+                    if len(re.compile('^' + lookahead, re.IGNORECASE).groupindex) > 1:
+                        raise re.error("named groups are not allowed")
+                except re.error as e:
+                    logger.warning("Skipping categorization rule %s: invalid pattern (%s)", rule.pk, e)
+                    skipped.add(rule.pk)
+                    continue
+                self.text_rules.add(rule.pk)
+                lookaheads.append(lookahead)
+        self.max_words = max(map(len, self.keywords), default=0)
+        # Le regole scartate non devono valere come regole senza criterio testuale
+        self.rules = [rule for rule in self.rules if rule[0] not in skipped]
+        self.position = {rule[0]: index for index, rule in enumerate(self.rules)}
+        self.untextual = [index for index, rule in enumerate(self.rules) if rule[0] not in self.text_rules]
+        self.regex = re.compile('^' + ''.join(lookaheads), re.IGNORECASE) if lookaheads else None
+
+    def matching_text_rules(self, description):
+        """
+        Regole il cui criterio sulla descrizione è soddisfatto: le parole chiave
+        con una scansione delle parole, le espressioni regolari con una sola
+        chiamata all'espressione combinata
+        """
+        matches = set()
+        if not description:
+            return matches
+        if self.keywords:
+            words = tokenize(description)
+            for start in range(len(words)):
+                for length in range(1, min(self.max_words, len(words) - start) + 1):
+                    rules = self.keywords.get(tuple(words[start:start + length]))
+                    if rules:
+                        matches |= rules
+        if self.regex is not None:
+            groups = self.regex.match(description).groupdict()
+            matches.update(int(name[1:]) for name, value in groups.items() if value is not None)
+        return matches
+
+    def categorize(self, description, amount=None, account_id=None, transaction_type=None):
+        """
+        Id della categoria della prima regola soddisfatta, o None
+        """
+        # Solo le regole senza criterio testuale e quelle corrispondenti alla descrizione
+        candidates = sorted([*self.untextual, *(self.position[pk] for pk in self.matching_text_rules(description))])
+        for index in candidates:
+            pk, rule_type, rule_account, min_amount, max_amount, category_id = self.rules[index]
+            if transaction_type is not None and rule_type != transaction_type:
+                continue
+            if rule_account is not None and rule_account != account_id:
+                continue
+            if min_amount is not None and (amount is None or amount < min_amount):
+                continue
+            if max_amount is not None and (amount is None or amount > max_amount):
+                continue
+            return category_id
+        return None
+
+
+_lock = threading.Lock()
+_cached = (None, None)
+
+
+def get_matcher():
+    global _cached
+    version = get_version(VERSION_KEY)
+    cached_version, matcher = _cached
+    if cached_version != version:
+        with _lock:
+            matcher = Matcher(list(CategorizationRule.objects.filter(is_active=True)))
+            _cached = (version, matcher)
+    return matcher
+
+
+def invalidate_rules(sender, **kwargs):
+    bump_version(VERSION_KEY)
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def categorize(items):
+    """
+    Categorie suggerite per una sequenza di dizionari con `description`,
+    `amount`, `account` (id) e `transaction_type`; None dove nessuna regola vale.
+    Il matcher viene risolto una volta per tutto il lotto.
+    """
+    matcher = get_matcher()
+    return [
+        matcher.categorize(
+            item.get('description') or '',
+            amount=_amount(item.get('amount')),
+            account_id=item.get('account'),
+            transaction_type=item.get('transaction_type'),
+        )
+        for item in items
+    ]
@@ -0,0 +1,92 @@
+"""
+Opzioni dei menu a tendina di conti e categorie nei form.
+
+Le etichette delle categorie includono la catena dei parent ("Casa > Affitto"):
+calcolarle con __str__ costa una query per livello e per opzione. Qui tutte
+le categorie vengono lette con una sola query e le etichette costruite in
+memoria; gli elenchi di (id, etichetta) restano in memoria finché la versione
+'form_choices' (vedi transactions.versioning) non cambia, cioè finché un
+conto o una categoria non viene salvato o cancellato. Il rendering di un form
+non esegue quindi query, qualunque sia il numero di categorie.
+
+Con una cache locale al processo (LocMemCache) gli altri processi non vedono
+il cambio di versione: per questo gli elenchi vengono comunque ricostruiti
+dopo TRANSACTIONS_CHOICES_TTL secondi. Le scritture in blocco che non passano
+da save() (queryset.update) devono chiamare invalidate_choices.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from transactions.models.base import Account, TransactionCategory
+from transactions.versioning import get_version, bump_version
+
+
+VERSION_KEY = 'form_choices'
+CHOICES_TTL = getattr(settings, 'TRANSACTIONS_CHOICES_TTL', 60)
+
+_lock = threading.Lock()
+# (versione, istante di costruzione, elenchi)
+_cached = (None, 0.0, {})
+
+
+def _build_categories():
+    rows = list(TransactionCategory.objects.values_list('pk', 'name', 'parent_id', 'transaction_type'))
+    parents = {pk: (name, parent_id) for pk, name, parent_id, _ in rows}
+    labels = {}
+
+    def label(pk):
+        if pk not in labels:
+            name, parent_id = parents[pk]
+            labels[pk] = f"{label(parent_id)} > {name}" if parent_id in parents else name
+        return labels[pk]
+
+    choices = {None: []}
+    for pk, _, _, transaction_type in rows:
+        choices[None].append((pk, label(pk)))
+        choices.setdefault(transaction_type, []).append((pk, label(pk)))
+    return choices
+
+
+def _build_accounts():
+    accounts = list(Account.objects.all())
+    return {
+        False: [(account.pk, str(account)) for account in accounts],
+        True: [(account.pk, str(account)) for account in accounts if account.is_active],
+    }
+
+
+BUILDERS = {
+    'categories': _build_categories,
+    'accounts': _build_accounts,
+}
+
+
+def _get(name):
+    global _cached
+    version = get_version(VERSION_KEY)
+    now = time.monotonic()
+    cached_version, built_at, lists = _cached
+    if cached_version != version or now - built_at > CHOICES_TTL:
+        lists, built_at = {}, now
+    if name not in lists:
+        with _lock:
+            lists = {**lists, name: BUILDERS[name]()}
+            _cached = (version, built_at, lists)
+    return lists[name]
+
+
+def category_choices(transaction_type=None):
+    """
+    [(id, etichetta)] delle categorie, tutte o di un solo tipo
+    """
+    return _get('categories').get(transaction_type, [])
+
+
+def account_choices(active_only=True):
+    return _get('accounts')[active_only]
+
+
+def invalidate_choices(sender, **kwargs):
+    bump_version(VERSION_KEY)
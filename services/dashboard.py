@@ -0,0 +1,295 @@
+"""
+Indicatori di riepilogo per la navigazione e le pagine dei conti.
+
+Entrate e uscite del mese corrente si leggono dall'aggregazione mensile. Ogni
+riga (conto, categoria, tipo) è esatta al proprio updated_at: i gruppi con
+transazioni modificate o create dopo vengono ricalcolati dalle transazioni,
+gli altri corretti togliendo le transazioni con data successiva a oggi. Con le
+aggregazioni ricalcolate periodicamente (job 'aggregations.rebuild') si
+rileggono poche righe, qualunque sia la lunghezza della storia. Cancellazioni
+e spostamenti non lasciano traccia nel gruppo di partenza: per questo
+on_transactions_changed ne ricalcola subito la riga (vedi refresh_groups).
+
+Il patrimonio è la somma dei saldi dei conti attivi, calcolati allo stesso
+modo: saldo dell'ultima chiusura di periodo, più i mesi successivi
+dall'aggregazione mensile, più il mese corrente (vedi balances_at). I
+risultati restano in cache per TRANSACTIONS_DASHBOARD_TIMEOUT secondi.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from transactions.models.base import Account, Transaction, TransactionCategory
+from transactions.models.aggregated import MonthlyTransactionAggregation
+from transactions.models.archive import AccountPeriodBalance
+from transactions.models.currency import REPORTING_CURRENCY
+from transactions.models.fields import average_amount
+from transactions.services.archive import balance_source
+from transactions.services.fx import sum_in_currency
+
+
+DASHBOARD_TIMEOUT = getattr(settings, 'TRANSACTIONS_DASHBOARD_TIMEOUT', 60)
+TOP_CATEGORIES = 5
+
+
+def _month_end(day):
+    next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return next_month - timedelta(days=1)
+
+
+def _cache_key(account_id, today):
+    return f"transactions:dashboard:{account_id or 'all'}:{today.isoformat()}"
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def _months_filter(months):
+    # Transazioni dei mesi (anno, mese) indicati, come intervalli di date
+    return reduce(or_, (
+        Q(date__gte=date(year, month, 1), date__lte=_month_end(date(year, month, 1))) for year, month in months
+    ))
+
+
+def period_totals(start, end, account_id=None):
+    """
+    ({(anno, mese, conto, categoria, tipo): totale} dal primo del mese di start
+    a end incluso, istante dell'ultimo aggiornamento delle aggregazioni lette o
+    None). I mesi senza aggregazione vengono letti dalle transazioni.
+    """
+    aggregations = MonthlyTransactionAggregation.objects.annotate(
+        period=F('year') * 12 + F('month') - 1,
+    ).filter(period__gte=_month_index(start), period__lte=_month_index(end))
+    transactions = Transaction.objects.filter(date__gte=start.replace(day=1), date__lte=_month_end(end))
+    if account_id is not None:
+        aggregations = aggregations.filter(account_id=account_id)
+        transactions = transactions.filter(account_id=account_id)
+
+    aggregated = {}
+    rows = aggregations.values_list(
+        'year', 'month', 'account_id', 'category_id', 'transaction_type', 'total_amount', 'updated_at',
+    )
+    for year, month, account, category, transaction_type, total, updated_at in rows:
+        aggregated[(year, month, account, category, transaction_type)] = (total, updated_at)
+    aggregated_months = {group[:2] for group in aggregated}
+
+    totals = defaultdict(Decimal)
+
+    def add(queryset, sign, groups=None):
+        delta = queryset.annotate(year=F('date__year'), month=F('date__month')).values(
+            'year', 'month', 'account_id', 'category_id', 'transaction_type',
+        ).annotate(total=Sum('amount')).order_by()
+        for row in delta:
+            group = (row['year'], row['month'], row['account_id'], row['category_id'], row['transaction_type'])
+            if groups is None or group in groups:
+                totals[group] += sign * row['total']
+
+    months = {
+        (index // 12, index % 12 + 1) for index in range(_month_index(start), _month_index(end) + 1)
+    }
+    if months - aggregated_months:
+        add(transactions.filter(_months_filter(months - aggregated_months), date__lte=end), 1)
+    if not aggregated:
+        return totals, None
+
+    # Gruppi con transazioni scritte dopo l'aggiornamento della propria riga
+    oldest = min(updated_at for _, updated_at in aggregated.values())
+    dirty = set()
+    changed = transactions.filter(modified_at__gt=oldest).values_list(
+        'date', 'account_id', 'category_id', 'transaction_type', 'modified_at',
+    )
+    for day, account, category, transaction_type, modified_at in changed:
+        group = (day.year, day.month, account, category, transaction_type)
+        if group[:2] not in aggregated_months:
+            continue
+        if group not in aggregated or modified_at > aggregated[group][1]:
+            dirty.add(group)
+
+    clean = aggregated.keys() - dirty
+    for group in clean:
+        totals[group] += aggregated[group][0]
+    # Contate dall'aggregazione ma con data successiva a end (es. ricorrenti)
+    add(transactions.filter(date__gt=end), -1, clean)
+    if dirty:
+        add(transactions.filter(
+            _months_filter({group[:2] for group in dirty}),
+            date__lte=end,
+            account_id__in={group[2] for group in dirty},
+            transaction_type__in={group[4] for group in dirty},
+        ), 1, dirty)
+    return totals, max(updated_at for _, updated_at in aggregated.values())
+
+
+def month_to_date(today, account_id=None):
+    """
+    ({(conto, categoria, tipo): totale} dal primo del mese a today incluso,
+    istante dell'ultimo aggiornamento dell'aggregazione mensile o None)
+    """
+    totals, refreshed_at = period_totals(today.replace(day=1), today, account_id)
+    return {group[2:]: total for group, total in totals.items()}, refreshed_at
+
+
+def balances_at(today, accounts, current, account_id=None):
+    """
+    {conto: saldo a today} dei conti indicati ({id: saldo iniziale}): il saldo
+    di chiusura dell'ultimo periodo chiuso, più i mesi interi successivi
+    dall'aggregazione mensile, più i totali del mese corrente già calcolati
+    da month_to_date (current). Le transazioni lette una per una sono solo
+    quelle del mese della chiusura e dei gruppi cambiati dopo l'aggregazione.
+    """
+    balances = dict(accounts)
+    start_date, _ = balance_source(today)
+    if start_date is not None:
+        balances.update(AccountPeriodBalance.objects.filter(
+            period__end_date=start_date, account_id__in=balances,
+        ).values_list('account_id', 'closing_balance'))
+
+    def apply(account, transaction_type, amount):
+        if account in balances:
+            balances[account] += amount if transaction_type == 'income' else -amount
+
+    def apply_live(queryset):
+        rows = queryset.values('account_id', 'transaction_type').annotate(total=Sum('amount')).order_by()
+        for row in rows:
+            apply(row['account_id'], row['transaction_type'], row['total'])
+
+    hot = Transaction.objects.all() if account_id is None else Transaction.objects.filter(account_id=account_id)
+    month_start = today.replace(day=1)
+    if start_date is not None and start_date >= month_start:
+        # Chiusura nel mese corrente: le aggregazioni del mese contano anche l'archivio
+        apply_live(hot.filter(date__gt=start_date, date__lte=today))
+        return balances
+
+    if start_date is not None:
+        first = start_date + timedelta(days=1)
+        if first.day != 1:
+            # Resto del mese della chiusura
+            apply_live(hot.filter(date__gte=first, date__lte=_month_end(first)))
+            first = _month_end(first) + timedelta(days=1)
+    else:
+        first = hot.order_by('date').values_list('date', flat=True).first()
+    if first is not None and first < month_start:
+        totals, _ = period_totals(first.replace(day=1), month_start - timedelta(days=1), account_id)
+        for (_, _, account, _, transaction_type), amount in totals.items():
+            apply(account, transaction_type, amount)
+
+    for (account, _, transaction_type), amount in current.items():
+        apply(account, transaction_type, amount)
+    return balances
+
+
+def refresh_groups(groups):
+    """
+    Ricalcola dalle transazioni le righe esistenti dell'aggregazione mensile
+    dei gruppi (anno, mese, conto, categoria, tipo); i gruppi mai aggregati
+    restano senza riga
+    """
+    for year, month, account_id, category_id, transaction_type in groups:
+        rows = MonthlyTransactionAggregation.objects.filter(
+            year=year, month=month, account_id=account_id,
+            category_id=category_id, transaction_type=transaction_type,
+        )
+        if not rows.exists():
+            continue
+        live = Transaction.objects.filter(
+            date__year=year, date__month=month, account_id=account_id,
+            category_id=category_id, transaction_type=transaction_type,
+        ).aggregate(total=Sum('amount'), count=Count('id'), average=average_amount('amount'))
+        rows.update(
+            total_amount=live['total'] or Decimal('0'),
+            transaction_count=live['count'],
+            average_transaction_amount=live['average'],
+            updated_at=timezone.now(),
+        )
+
+
+def on_transactions_changed(sender, changes, **kwargs):
+    """
+    Ricevitore di transactions_changed: aggiorna i gruppi da cui una
+    transazione è stata tolta (cancellazioni e modifiche); quelli in cui è
+    arrivata li rileva month_to_date da modified_at
+    """
+    refresh_groups({
+        (before.date.year, before.date.month, before.account_id, before.category_id, before.transaction_type)
+        for before, _ in changes if before is not None
+    })
+
+
+def compute_summary(today, account=None):
+    """
+    Indicatori del mese di today (nella valuta del conto, oppure in quella di
+    report per tutti i conti): entrate, uscite, saldo netto, categorie di spesa
+    principali e patrimonio
+    """
+    account_id = account.pk if account is not None else None
+    totals, refreshed_at = month_to_date(today, account_id)
+
+    accounts = Account.objects.all()
+    if account is not None:
+        accounts = accounts.filter(pk=account.pk)
+    else:
+        accounts = accounts.filter(is_active=True)
+    accounts = list(accounts.values_list('pk', 'currency', 'initial_balance'))
+    currencies = dict((pk, currency) for pk, currency, _ in accounts)
+    balances = balances_at(today, {pk: initial for pk, _, initial in accounts}, totals, account_id)
+    currency = account.currency if account is not None else REPORTING_CURRENCY
+    missing = {account_id for account_id, _, _ in totals} - currencies.keys()
+    if missing:
+        currencies.update(Account.objects.filter(pk__in=missing).values_list('pk', 'currency'))
+
+    def total(items):
+        return sum_in_currency(((amount, currencies[account_id], today) for account_id, amount in items), currency)
+
+    by_type = defaultdict(list)
+    by_category = defaultdict(list)
+    for (account_id, category_id, transaction_type), amount in totals.items():
+        by_type[transaction_type].append((account_id, amount))
+        if transaction_type == 'expense':
+            by_category[category_id].append((account_id, amount))
+
+    income = total(by_type['income'])
+    expense = total(by_type['expense'])
+    spending = sorted(
+        ((category_id, total(items)) for category_id, items in by_category.items()),
+        key=lambda item: item[1], reverse=True,
+    )
+    spending = [(category_id, amount) for category_id, amount in spending[:TOP_CATEGORIES] if amount > 0]
+    names = dict(TransactionCategory.objects.filter(
+        pk__in=[category_id for category_id, _ in spending],
+    ).values_list('pk', 'name'))
+
+    return {
+        'date': today,
+        'currency': currency,
+        'month_income': income,
+        'month_expense': expense,
+        'month_net': income - expense,
+        'top_categories': [
+            {'id': category_id, 'name': names.get(category_id, ''), 'total': amount}
+            for category_id, amount in spending
+        ],
+        'net_worth': total(balances.items()),
+        'aggregated_at': refreshed_at,
+    }
+
+
+def summary(account=None, today=None):
+    """
+    Come compute_summary, letto dalla cache se calcolato negli ultimi
+    DASHBOARD_TIMEOUT secondi
+    """
+    today = today or date.today()
+    key = _cache_key(account.pk if account is not None else None, today)
+    data = cache.get(key)
+    if data is None:
+        data = compute_summary(today, account)
+        cache.set(key, data, DASHBOARD_TIMEOUT)
+    return data
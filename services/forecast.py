@@ -0,0 +1,282 @@
+"""
+Previsione dei saldi dei conti per i prossimi mesi (richiede numpy).
+
+Per ogni conto e mese futuro la variazione di saldo parte dalla media
+stagionale dello stesso mese dell'anno, calcolata dalle aggregazioni mensili.
+Per ogni coppia (conto, categoria) la sua parte di media viene poi sostituita:
+- dalle transazioni già registrate con data futura (le serie ricorrenti create
+  da IncomeView/ExpenseView sono salvate per intero in anticipo) e dalle regole
+  ricorrenti ipotetiche passate dal chiamante, nei mesi in cui ce ne sono;
+- altrimenti dalla serie ricorrente riconosciuta nello storico, se la
+  categoria si ripete con una delle cadenze di
+  RecurringTransactionForm.FREQUENCY_CHOICES (vedi detect_recurring).
+
+Il calcolo usa tre query (saldi, transazioni future, storico aggregato),
+indipendentemente dal numero di conti e di mesi. Le variazioni sono matrici
+numpy (coppie o conti) x mesi in centesimi, sommate per conto con np.add.at e
+accumulate con np.cumsum.
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from transactions.models.base import Account, Transaction
+from transactions.models.aggregated import MonthlyTransactionAggregation
+from transactions.models.fields import AMOUNTS_IN_CENTS
+from transactions.services.analytics import to_decimal
+from transactions.services.recurring import occurrences
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dipendenza facoltativa
+    np = None
+
+
+# Cadenze riconosciute: 'daily', 'weekly', 'monthly', 'semi-annual' e 'annual'
+# di RecurringTransactionForm.FREQUENCY_CHOICES
+NOT_RECURRING, DAILY, WEEKLY, MONTHLY, SEMI_ANNUAL, ANNUAL = -1, 0, 1, 2, 3, 4
+# 'semi-annual' e 'annual' sono passi in mesi nello storico mensile
+MONTH_STEPS = {SEMI_ANNUAL: 6, ANNUAL: 12}
+# Mesi recenti in cui una serie giornaliera, settimanale o mensile deve ripetersi
+RECENT_MONTHS = 3
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for transactions.services.forecast: pip install numpy")
+
+
+def _signed(transaction_type, amount):
+    return amount if transaction_type == 'income' else -amount
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def _cents(amount):
+    return float(amount) * 100
+
+
+def detect_recurring(totals, counts, month_days):
+    """
+    Serie ricorrenti nello storico mensile di ogni coppia (conto, categoria).
+
+    `totals` e `counts` sono matrici coppie x mesi (importo con segno in
+    centesimi e numero di transazioni), `month_days` i giorni di ciascun mese.
+    Una coppia è ricorrente se ogni transazione ha lo stesso importo e:
+    - 'daily', 'weekly', 'monthly': negli ultimi RECENT_MONTHS mesi ci sono una
+      transazione al giorno, 4 o 5 alla settimana o una al mese;
+    - 'semi-annual', 'annual': c'è una sola transazione ogni 6 o 12 mesi,
+      almeno due volte, l'ultima entro un passo dalla fine dello storico.
+
+    Restituisce (cadenza, importo di una occorrenza, indice del mese
+    dell'ultima occorrenza) per coppia; la cadenza è NOT_RECURRING se nessuna
+    corrisponde.
+    """
+    groups, months = counts.shape
+    cadence = np.full(groups, NOT_RECURRING, dtype=np.int8)
+    amount = np.zeros(groups)
+    last = np.full(groups, -1, dtype=np.int64)
+    if not groups or not months:
+        return cadence, amount, last
+
+    occurring = counts > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = np.where(occurring, totals / np.maximum(counts, 1), np.nan)
+    first_average = average[np.arange(groups), occurring.argmax(axis=1)]
+    # Stesso importo in ogni mese con movimenti
+    constant = np.all(~occurring | np.isclose(average, first_average[:, None]), axis=1) & occurring.any(axis=1)
+    last = np.where(occurring.any(axis=1), months - 1 - occurring[:, ::-1].argmax(axis=1), -1)
+
+    if months >= RECENT_MONTHS:
+        recent = counts[:, -RECENT_MONTHS:]
+        days = np.asarray(month_days[-RECENT_MONTHS:])
+        for code, matches in (
+            (DAILY, recent == days),
+            (WEEKLY, (recent == 4) | (recent == 5)),
+            (MONTHLY, recent == 1),
+        ):
+            found = constant & (cadence == NOT_RECURRING) & matches.all(axis=1)
+            cadence[found] = code
+
+    # Serie semestrali e annuali: solo le coppie con poche transazioni isolate
+    sparse = constant & (cadence == NOT_RECURRING) & (counts.max(axis=1) == 1)
+    for group in np.flatnonzero(sparse):
+        positions = np.flatnonzero(occurring[group])
+        if len(positions) < 2:
+            continue
+        gaps = set(np.diff(positions).tolist())
+        for code, step in MONTH_STEPS.items():
+            if gaps == {step} and months - 1 - positions[-1] < step:
+                cadence[group] = code
+                break
+
+    return cadence, np.nan_to_num(first_average), last
+
+
+def project_recurring(cadence, amount, last, history_start_index, period_indices, period_days):
+    """
+    Matrice coppie x mesi futuri delle serie ricorrenti riconosciute da
+    detect_recurring (zero per le coppie non ricorrenti)
+    """
+    period_indices = np.asarray(period_indices)
+    period_days = np.asarray(period_days, dtype=float)
+    per_period = np.zeros((len(cadence), len(period_indices)))
+    per_period[cadence == DAILY] = period_days
+    per_period[cadence == WEEKLY] = period_days / 7
+    per_period[cadence == MONTHLY] = 1
+    for code, step in MONTH_STEPS.items():
+        rows = cadence == code
+        anchors = history_start_index + last[rows]
+        per_period[rows] = (period_indices[None, :] - anchors[:, None]) % step == 0
+    return per_period * amount[:, None]
+
+
+def forecast_balances(months=12, accounts=None, as_of=None, history_months=24, rules=()):
+    """
+    Proietta il saldo di fine mese dei conti per i `months` mesi successivi al
+    mese di `as_of` (oggi per default).
+
+    `accounts` è un queryset o una lista di id (per default i conti attivi);
+    `history_months` è la finestra di mesi completi usata per le medie stagionali
+    e per riconoscere le serie ricorrenti; `rules` è una sequenza di dizionari
+    con account, amount, transaction_type, frequency, start_date, end_date
+    facoltativo e category facoltativa, per simulare serie ricorrenti non
+    ancora registrate.
+
+    Restituisce {'periods': [fine mese, ...], 'balances': {account_id: [saldo, ...]}}.
+    """
+    _require_numpy()
+    as_of = as_of or date.today()
+    first_period = _month_start(as_of) + relativedelta(months=1)
+    horizon_end = first_period + relativedelta(months=months) - timedelta(days=1)
+    period_starts = [first_period + relativedelta(months=k) for k in range(months)]
+    period_index = {(start.year, start.month): k for k, start in enumerate(period_starts)}
+
+    queryset = Account.objects.filter(is_active=True)
+    if accounts is not None:
+        queryset = Account.objects.filter(pk__in=[getattr(a, 'pk', a) for a in accounts])
+    # 1. Saldi iniziali di tutti i conti in una query
+    account_ids, base = [], []
+    for pk, balance in queryset.with_balance(as_of).values_list('pk', 'balance'):
+        account_ids.append(pk)
+        base.append(_cents(balance))
+    account_position = {pk: position for position, pk in enumerate(account_ids)}
+
+    # 2. Storico aggregato per coppia (conto, categoria) e mese. Importi con
+    # segno in centesimi e indice del mese vengono calcolati dal database come
+    # numeri, senza convertire ogni riga in Decimal.
+    history_end = _month_start(as_of) - timedelta(days=1)
+    history_start = _month_start(as_of) - relativedelta(months=history_months)
+    history_start_index = _month_index(history_start)
+    cents = F('total_amount') if AMOUNTS_IN_CENTS else F('total_amount') * 100
+    history = MonthlyTransactionAggregation.objects.filter(
+        Q(year__gt=history_start.year) | Q(year=history_start.year, month__gte=history_start.month),
+        Q(year__lt=history_end.year) | Q(year=history_end.year, month__lte=history_end.month),
+        account_id__in=account_ids,
+    ).annotate(
+        group_category=Coalesce('category_id', Value(0)),
+        period=F('year') * 12 + F('month') - 1 - history_start_index,
+        signed_cents=Cast(
+            Case(When(transaction_type='income', then=cents), default=-cents), output_field=FloatField(),
+        ),
+    ).values_list('account_id', 'group_category', 'period', 'signed_cents', 'transaction_count')
+    history_rows = np.array(list(history), dtype=float).reshape(-1, 5)
+    keys, history_groups = np.unique(history_rows[:, :2].astype(np.int64), axis=0, return_inverse=True)
+
+    # Indice delle coppie viste nello storico o programmate
+    groups = {(int(account_id), int(category_id)): index for index, (account_id, category_id) in enumerate(keys)}
+
+    def group(account_id, category_id):
+        return groups.setdefault((account_id, category_id or 0), len(groups))
+
+    # 3. Transazioni future già registrate e regole ipotetiche
+    carry = np.zeros(len(account_ids))
+    scheduled_rows = []
+    future = Transaction.objects.filter(
+        account_id__in=account_ids, date__gt=as_of, date__lte=horizon_end,
+    ).values_list('account_id', 'category_id', 'transaction_type', 'date', 'amount')
+    planned = [
+        (account_id, category_id, day, _signed(transaction_type, amount))
+        for account_id, category_id, transaction_type, day, amount in future
+    ]
+    for rule in rules:
+        account_id = getattr(rule['account'], 'pk', rule['account'])
+        if account_id not in account_position:
+            continue
+        category_id = getattr(rule.get('category'), 'pk', rule.get('category'))
+        end_date = min(rule.get('end_date') or horizon_end, horizon_end)
+        delta = _signed(rule['transaction_type'], Decimal(rule['amount']))
+        planned.extend(
+            (account_id, category_id, day, delta)
+            for day in occurrences(rule['start_date'], end_date, rule['frequency']) if day > as_of
+        )
+    for account_id, category_id, day, delta in planned:
+        period = period_index.get((day.year, day.month))
+        if period is None:
+            # Dal giorno dopo as_of alla fine del mese corrente
+            carry[account_position[account_id]] += _cents(delta)
+        else:
+            scheduled_rows.append((group(account_id, category_id), period, _cents(delta)))
+
+    # 4. Matrici coppie x mesi
+    group_account = np.array([account_position[account_id] for account_id, _ in groups], dtype=np.int64)
+    totals = np.zeros((len(groups), history_months))
+    counts = np.zeros((len(groups), history_months), dtype=np.int64)
+    columns = history_rows[:, 2].astype(np.int64)
+    np.add.at(totals, (history_groups.ravel(), columns), history_rows[:, 3])
+    np.add.at(counts, (history_groups.ravel(), columns), history_rows[:, 4].astype(np.int64))
+    scheduled = np.zeros((len(groups), months))
+    if scheduled_rows:
+        rows, columns, values = (np.array(column) for column in zip(*scheduled_rows))
+        np.add.at(scheduled, (rows, columns), values)
+    has_scheduled = np.zeros((len(groups), months), dtype=bool)
+    for row, column, _ in scheduled_rows:
+        has_scheduled[row, column] = True
+
+    # Medie stagionali per coppia e mese dell'anno (0-11)
+    history_month_of_year = (history_start_index + np.arange(history_months)) % 12
+    occurrences_per_month = np.bincount(history_month_of_year, minlength=12)
+    seasonal = np.zeros((len(groups), 12))
+    np.add.at(seasonal.T, history_month_of_year, totals.T)
+    seasonal /= np.maximum(occurrences_per_month, 1)
+
+    period_month_of_year = np.array([start.month - 1 for start in period_starts], dtype=np.int64)
+    period_days = [calendar.monthrange(start.year, start.month)[1] for start in period_starts]
+    history_days = [
+        calendar.monthrange(index // 12, index % 12 + 1)[1]
+        for index in range(history_start_index, history_start_index + history_months)
+    ]
+    cadence, amount, last = detect_recurring(totals, counts, history_days)
+    recurring = project_recurring(
+        cadence, amount, last, history_start_index,
+        [_month_index(start) for start in period_starts], period_days,
+    )
+
+    # 5. Media stagionale del conto, con la parte di ogni coppia sostituita dai
+    # movimenti programmati o dalla serie ricorrente
+    group_seasonal = seasonal[:, period_month_of_year]
+    adjustment = np.where(
+        has_scheduled, scheduled - group_seasonal,
+        np.where((cadence != NOT_RECURRING)[:, None], recurring - group_seasonal, 0),
+    )
+    deltas = np.zeros((len(account_ids), months))
+    np.add.at(deltas, group_account, group_seasonal + adjustment)
+    balances = np.rint(np.asarray(base)[:, None] + carry[:, None] + np.cumsum(deltas, axis=1)).astype(np.int64)
+
+    return {
+        'periods': [start + relativedelta(months=1) - timedelta(days=1) for start in period_starts],
+        'balances': {
+            account_id: [to_decimal(cents) for cents in balances[position]]
+            for account_id, position in account_position.items()
+        },
+    }
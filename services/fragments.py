@@ -0,0 +1,38 @@
+"""
+Versioni dei frammenti di template in cache ({% cache %}).
+
+I frammenti stabili delle pagine (form non compilati con gli elenchi di conti
+e categorie, tabella dei saldi giornalieri) vengono messi in cache con la
+versione dei dati da cui dipendono tra le chiavi: cambiando versione le
+vecchie voci non vengono più lette e scadono da sole.
+
+- 'form_choices' cambia quando un conto o una categoria viene salvato o
+  cancellato (vedi services.choices);
+- 'balances' cambia a ogni transactions_changed, a ogni modifica di un conto
+  e a ogni chiusura di periodo.
+"""
+from django.conf import settings
+
+from transactions.services import choices
+from transactions.versioning import get_version, bump_version
+
+
+FRAGMENT_TIMEOUT = getattr(settings, 'TRANSACTIONS_FRAGMENT_TIMEOUT', 3600)
+BALANCES_VERSION_KEY = 'balances'
+
+
+def fragment_context():
+    """
+    Variabili usate nelle chiavi dei frammenti in cache
+    """
+    return {
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+        # I form con gli elenchi di scelte non sopravvivono agli elenchi stessi
+        'choices_timeout': min(FRAGMENT_TIMEOUT, choices.CHOICES_TTL),
+        'choices_version': get_version(choices.VERSION_KEY),
+        'balances_version': get_version(BALANCES_VERSION_KEY),
+    }
+
+
+def invalidate_balances(sender, **kwargs):
+    bump_version(BALANCES_VERSION_KEY)
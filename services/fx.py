@@ -0,0 +1,188 @@
+"""
+Conversioni di valuta con una cache LRU in-process dei tassi per (valuta, data).
+
+La cache resta valida finché la versione 'exchange_rates' (vedi
+transactions.versioning) non cambia, cioè finché un ExchangeRate non viene
+salvato o cancellato; il numero di voci è limitato da
+TRANSACTIONS_FX_CACHE_SIZE. La versione viene letta una volta per
+conversione o per lotto di conversioni.
+"""
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+
+from transactions.models.currency import ExchangeRate, BASE_CURRENCY, REPORTING_CURRENCY
+from transactions.versioning import get_version, bump_version
+
+
+VERSION_KEY = 'exchange_rates'
+
+
+class ExchangeRateMissing(LookupError):
+    pass
+
+
+class RateCache:
+    """
+    Cache LRU thread-safe; a differenza di functools.lru_cache può essere
+    riempita in blocco dalle conversioni batch
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+    def sync(self, version):
+        """
+        Svuota la cache se i tassi sono cambiati dall'ultima lettura
+        """
+        with self._lock:
+            if self._version != version:
+                self._data.clear()
+                self._version = version
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+rate_cache = RateCache(getattr(settings, 'TRANSACTIONS_FX_CACHE_SIZE', 4096))
+
+
+def clear_rate_cache(**kwargs):
+    rate_cache.clear()
+    bump_version(VERSION_KEY)
+
+
+def capture_previous_currency(sender, instance, raw=False, **kwargs):
+    instance._previous_currency = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._previous_currency = sender.objects.filter(pk=instance.pk).values_list('currency', flat=True).first()
+
+
+def on_account_currency_changed(sender, instance, created, raw=False, **kwargs):
+    """
+    Riporta la nuova valuta del conto sulle sue transazioni, correnti e
+    archiviate, che ne conservano una copia
+    """
+    from transactions.models.base import Transaction
+    from transactions.models.archive import ArchivedTransaction
+
+    if raw or created or getattr(instance, '_previous_currency', None) in (None, instance.currency):
+        return
+    for model in (Transaction, ArchivedTransaction):
+        model.objects.filter(account=instance).exclude(currency=instance.currency).update(currency=instance.currency)
+
+
+def get_rate(currency, on_date=None):
+    """
+    Valore di un'unità di `currency` nella valuta base alla data indicata
+    """
+    rate_cache.sync(get_version(VERSION_KEY))
+    return _rate(currency, on_date)
+
+
+def _rate(currency, on_date=None):
+    on_date = on_date or date.today()
+    if currency == BASE_CURRENCY:
+        return Decimal('1')
+    rate = rate_cache.get((currency, on_date))
+    if rate is None:
+        rate = ExchangeRate.objects.filter(
+            currency=currency, date__lte=on_date,
+        ).order_by('-date').values_list('rate', flat=True).first()
+        if rate is None:
+            raise ExchangeRateMissing(f"No {currency} exchange rate on or before {on_date}")
+        rate_cache.set((currency, on_date), rate)
+    return rate
+
+
+def convert(amount, from_currency, to_currency, on_date=None):
+    if from_currency == to_currency:
+        return amount
+    rate_cache.sync(get_version(VERSION_KEY))
+    return _convert(amount, from_currency, to_currency, on_date)
+
+
+def _convert(amount, from_currency, to_currency, on_date=None):
+    if from_currency == to_currency:
+        return amount
+    return amount * _rate(from_currency, on_date) / _rate(to_currency, on_date)
+
+
+def load_rates(pairs):
+    """
+    Carica nella cache i tassi per un insieme di coppie (valuta, data) con una
+    sola query, risolvendo in memoria l'ultimo tasso disponibile per ogni data
+    """
+    rate_cache.sync(get_version(VERSION_KEY))
+    missing = defaultdict(set)
+    for currency, on_date in pairs:
+        if currency != BASE_CURRENCY and rate_cache.get((currency, on_date)) is None:
+            missing[currency].add(on_date)
+    if not missing:
+        return
+
+    history = defaultdict(lambda: ([], []))
+    rows = ExchangeRate.objects.filter(
+        currency__in=list(missing),
+        date__lte=max(day for days in missing.values() for day in days),
+    ).order_by('currency', 'date').values_list('currency', 'date', 'rate')
+    for currency, day, rate in rows:
+        history[currency][0].append(day)
+        history[currency][1].append(rate)
+
+    for currency, days in missing.items():
+        known_days, rates = history[currency]
+        for on_date in days:
+            position = bisect.bisect_right(known_days, on_date)
+            if position:
+                rate_cache.set((currency, on_date), rates[position - 1])
+
+
+def convert_many(items, to_currency):
+    """
+    Converte una sequenza di (importo, valuta, data) in `to_currency`, con al
+    più una query per i tassi non ancora in cache
+    """
+    items = list(items)
+    load_rates(
+        {(currency, on_date) for _, currency, on_date in items}
+        | {(to_currency, on_date) for _, _, on_date in items}
+    )
+    return [_convert(amount, currency, to_currency, on_date) for amount, currency, on_date in items]
+
+
+def sum_in_currency(items, to_currency):
+    return sum(convert_many(items, to_currency), Decimal('0')).quantize(Decimal('0.01'))
+
+
+def total_balance(account_balances, currency=REPORTING_CURRENCY, on_date=None):
+    """
+    Somma dei saldi {conto: saldo} convertiti in `currency` alla data indicata
+    """
+    on_date = on_date or date.today()
+    return sum_in_currency(
+        ((balance, account.currency, on_date) for account, balance in account_balances.items()),
+        currency,
+    )
@@ -0,0 +1,120 @@
+"""
+Verifica degli indici sulle query effettivamente eseguite dall'applicazione.
+
+Ogni percorso critico (HOT_PATHS) viene eseguito catturando le query SQL
+generate; ogni SELECT distinta viene poi passata a EXPLAIN sul database
+configurato e il piano viene classificato: lettura completa della tabella,
+uso di un indice, index-only scan.
+"""
+from datetime import date
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from transactions.models.base import Account, Transaction
+
+
+SEQUENTIAL = 'sequential scan'
+INDEX = 'index'
+INDEX_ONLY = 'index-only'
+
+
+def _list(transaction_type):
+    def prepare():
+        return lambda: list(
+            Transaction.objects.filter(transaction_type=transaction_type).order_by('-date', '-created_at')[:100]
+        )
+    return prepare
+
+
+def _balances():
+    return lambda: list(Account.objects.with_balance())
+
+
+def _account_balance():
+    account = Account.objects.order_by('pk').first()
+    return lambda: account and account.get_balance_at_date()
+
+
+def _daily_totals():
+    account_id = Account.objects.order_by('pk').values_list('pk', flat=True).first()
+    return lambda: list(Account.daily_totals(account_id))
+
+
+def _month_report():
+    from transactions.services.reporting import report
+    today = date.today()
+    return lambda: report(date(today.year, today.month, 1), today, edge_source='raw')
+
+
+def _api_page():
+    return lambda: list(Transaction.objects.order_by('-date', '-id').values('id', 'date', 'amount')[:101])
+
+
+# nome -> funzione che prepara gli argomenti e restituisce il percorso da eseguire;
+# le query della preparazione non vengono verificate
+HOT_PATHS = {
+    'income_list': _list('income'),
+    'expense_list': _list('expense'),
+    'account_balances': _balances,
+    'account_balance': _account_balance,
+    'daily_totals': _daily_totals,
+    'month_report': _month_report,
+    'api_transactions': _api_page,
+}
+
+
+def capture(path):
+    """
+    SELECT distinte eseguite dal percorso, nell'ordine di esecuzione
+    """
+    run = path()
+    with CaptureQueriesContext(connection) as context:
+        run()
+    statements = []
+    for query in context.captured_queries:
+        sql = query['sql']
+        if sql.lstrip().upper().startswith('SELECT') and sql not in statements:
+            statements.append(sql)
+    return statements
+
+
+def explain(sql):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [' '.join(str(value) for value in row) for row in rows]
+
+
+def classify(plan):
+    """
+    Accessi alle tabelle trovati nel piano, come coppie (tipo, riga del piano)
+    """
+    findings = []
+    for line in plan:
+        text = line.strip()
+        upper = text.upper()
+        if 'COVERING INDEX' in upper or 'INDEX ONLY SCAN' in upper:
+            findings.append((INDEX_ONLY, text))
+        elif 'USING INDEX' in upper or 'INDEX SCAN' in upper or 'USING INTEGER PRIMARY KEY' in upper:
+            findings.append((INDEX, text))
+        elif upper.startswith('SCAN ') or 'SEQ SCAN' in upper:
+            findings.append((SEQUENTIAL, text))
+    return findings
+
+
+def audit(paths=None):
+    """
+    {percorso: [(sql, piano, accessi)]} per i percorsi richiesti (tutti se None)
+    """
+    results = {}
+    for name in paths or HOT_PATHS:
+        results[name] = []
+        for sql in capture(HOT_PATHS[name]):
+            plan = explain(sql)
+            results[name].append((sql, plan, classify(plan)))
+    return results
@@ -0,0 +1,207 @@
+"""
+Coda di lavori in background salvata nella tabella Job.
+
+Le viste accodano un lavoro con `enqueue(nome, payload, key=...)` e
+rispondono subito; il comando `run_jobs` preleva i lavori pronti e li esegue
+su un pool di thread o di processi. Un lavoro attivo (in coda o in
+esecuzione) è unico per chiave: accodarne un altro con la stessa chiave
+restituisce quello esistente. Un lavoro fallito torna in coda con attesa
+esponenziale fino a max_attempts tentativi.
+
+I tipi di lavoro sono funzioni registrate con `@task(nome)` che ricevono il
+payload come argomenti con nome e restituiscono un risultato serializzabile
+in JSON.
+"""
+import logging
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from transactions.models.jobs import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Attesa prima del secondo tentativo, raddoppiata a ogni fallimento
+JOB_BACKOFF = getattr(settings, 'TRANSACTIONS_JOB_BACKOFF', 30)
+JOB_BACKOFF_MAX = getattr(settings, 'TRANSACTIONS_JOB_BACKOFF_MAX', 3600)
+# Un lavoro in esecuzione da più di tanti secondi è di un worker terminato
+JOB_STALE_AFTER = getattr(settings, 'TRANSACTIONS_JOB_STALE_AFTER', 3600)
+
+TASKS = {}
+
+
+class JobError(Exception):
+    pass
+
+
+def task(name):
+    """
+    Registra la funzione decorata come tipo di lavoro `name`
+    """
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(name, payload=None, key=None, run_after=None, max_attempts=3):
+    """
+    Accoda un lavoro e lo restituisce; se un lavoro attivo con la stessa
+    chiave esiste già, restituisce quello
+    """
+    if name not in TASKS:
+        raise JobError(f"Unknown job type: {name}")
+    if key:
+        existing = Job.objects.filter(key=key, status__in=Job.ACTIVE_STATUSES).first()
+        if existing is not None:
+            return existing
+    try:
+        with db_transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                key=key,
+                payload=payload or {},
+                run_after=run_after or timezone.now(),
+                max_attempts=max_attempts,
+            )
+    except IntegrityError:
+        # Un'altra richiesta ha accodato la stessa chiave nel frattempo
+        if not key:
+            raise
+        return Job.objects.get(key=key, status__in=Job.ACTIVE_STATUSES)
+
+
+def backoff(attempts):
+    """
+    Secondi di attesa dopo il fallimento del tentativo numero `attempts`
+    """
+    return min(JOB_BACKOFF * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+
+
+def requeue_stale():
+    """
+    Rimette in coda i lavori rimasti in esecuzione oltre JOB_STALE_AFTER; quelli
+    che hanno esaurito i tentativi (per esempio perché terminano ogni volta il
+    worker) vengono segnati come falliti
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=JOB_STALE_AFTER))
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by='', locked_at=None, finished_at=now,
+        last_error='Worker terminated while running the job.',
+    )
+    return stale.update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def _record_failure(job, error):
+    job.last_error = error
+    if job.attempts >= job.max_attempts:
+        job.status = Job.FAILED
+        job.finished_at = timezone.now()
+    else:
+        job.status = Job.QUEUED
+        job.run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    job.locked_by = ''
+    job.locked_at = None
+
+
+def release(job_id, error):
+    """
+    Registra il fallimento di un lavoro prenotato il cui esecutore è terminato
+    senza esito (per esempio un processo del pool ucciso) e ne restituisce lo
+    stato, o None se il lavoro non è più in esecuzione
+    """
+    job = Job.objects.filter(pk=job_id, status=Job.RUNNING).first()
+    if job is None:
+        return None
+    _record_failure(job, error)
+    job.save(update_fields=['status', 'last_error', 'run_after', 'finished_at', 'locked_by', 'locked_at'])
+    return job.status
+
+
+def claim(worker, limit=1):
+    """
+    Prenota fino a `limit` lavori pronti per il worker e ne restituisce gli id
+    """
+    now = timezone.now()
+    with db_transaction.atomic():
+        queryset = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Più worker possono prenotare in parallelo senza attendersi
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list('pk', flat=True)[:limit])
+        Job.objects.filter(pk__in=ids).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+    return ids
+
+
+def run(job_id):
+    """
+    Esegue un lavoro prenotato e ne registra l'esito. Eseguita nei thread o
+    nei processi del worker, restituisce lo stato finale.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        try:
+            function = TASKS.get(job.name)
+            if function is None:
+                raise JobError(f"Unknown job type: {job.name}")
+            result = function(**job.payload)
+        except Exception:
+            logger.exception("Job %s (%s) failed", job.pk, job.name)
+            _record_failure(job, traceback.format_exc())
+        else:
+            job.status = Job.SUCCEEDED
+            job.result = result
+            job.finished_at = timezone.now()
+            job.locked_by = ''
+            job.locked_at = None
+        job.save(update_fields=['status', 'result', 'last_error', 'run_after', 'finished_at', 'locked_by', 'locked_at'])
+        return job.status
+    finally:
+        close_old_connections()
+
+
+# Lavori predefiniti
+
+@task('aggregations.rebuild')
+def rebuild_aggregations(period, **arguments):
+    """
+    Ricalcola le aggregazioni di un periodo ('daily', 'weekly', 'monthly',
+    'quarterly', 'yearly'); gli argomenti sono quelli di aggregate_transactions,
+    con le date in formato ISO
+    """
+    from transactions.models.aggregated import (
+        DailyTransactionAggregation,
+        WeeklyTransactionAggregation,
+        MonthlyTransactionAggregation,
+        QuarterlyTransactionAggregation,
+        YearlyTransactionAggregation,
+    )
+    models = {
+        'daily': DailyTransactionAggregation,
+        'weekly': WeeklyTransactionAggregation,
+        'monthly': MonthlyTransactionAggregation,
+        'quarterly': QuarterlyTransactionAggregation,
+        'yearly': YearlyTransactionAggregation,
+    }
+    if period not in models:
+        raise JobError(f"Unknown aggregation period: {period}")
+    for name in ('start_date', 'end_date'):
+        if arguments.get(name):
+            arguments[name] = date.fromisoformat(arguments[name])
+    models[period].aggregate_transactions(**arguments)
+    return {'period': period, **{name: str(value) for name, value in arguments.items()}}
+
+
+@task('recurring.expand')
+def expand_recurring(**payload):
+    from transactions.services.recurring import create_recurring
+    return {'created': create_recurring(**payload)}
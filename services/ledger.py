@@ -0,0 +1,174 @@
+"""
+Registro in sola aggiunta dei movimenti di ogni conto (LedgerEntry).
+
+Il registro viene alimentato da transactions_changed: una creazione aggiunge
+il movimento della transazione, una cancellazione il suo storno, una modifica
+che tocca conto, tipo, data o importo lo storno del vecchio stato seguito dal
+nuovo. Le righe non vengono mai aggiornate, così che il saldo "come noto" a
+un certo istante si ottenga sommando i movimenti registrati fino ad allora.
+
+Ogni SNAPSHOT_EVERY movimenti di un conto viene salvata un'istantanea della
+somma progressiva (LedgerSnapshot): il saldo noto a un istante parte
+dall'ultima istantanea precedente e somma solo i movimenti successivi.
+
+L'archiviazione dei periodi chiusi non emette transactions_changed e non
+tocca il registro: le transazioni cambiano tabella, non saldo. Il saldo
+iniziale del conto è quello attuale e non fa parte del registro.
+"""
+import heapq
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from transactions.models.base import Transaction
+from transactions.models.archive import ArchivedTransaction
+from transactions.models.ledger import LedgerEntry, LedgerHead, LedgerSnapshot
+
+
+SNAPSHOT_EVERY = getattr(settings, 'TRANSACTIONS_LEDGER_SNAPSHOT_EVERY', 1000)
+REBUILD_BATCH_SIZE = 5000
+
+Movement = namedtuple('Movement', ['account_id', 'transaction_id', 'kind', 'date', 'amount', 'recorded_at'])
+
+
+def signed_amount(state):
+    return state.amount if state.transaction_type == 'income' else -state.amount
+
+
+def _effect(state):
+    return (state.account_id, state.transaction_type, state.date, state.amount)
+
+
+def movements(changes):
+    """
+    Movimenti da registrare per una lista di coppie (before, after) di
+    TransactionState; le modifiche alla sola descrizione non producono movimenti
+    """
+    for before, after in changes:
+        if before is not None and after is not None and _effect(before) == _effect(after):
+            continue
+        if before is not None:
+            yield Movement(before.account_id, before.id, LedgerEntry.REVERSED, before.date, -signed_amount(before), None)
+        if after is not None:
+            yield Movement(after.account_id, after.id, LedgerEntry.CREATED, after.date, signed_amount(after), None)
+
+
+def append(rows, snapshot_every=None):
+    """
+    Aggiunge i movimenti al registro, nell'ordine dato, e restituisce le
+    LedgerEntry create. I registri dei conti coinvolti restano bloccati fino
+    alla fine della transazione, così che i progressivi non abbiano buchi.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    snapshot_every = snapshot_every or SNAPSHOT_EVERY
+    account_ids = sorted({row.account_id for row in rows})
+
+    with db_transaction.atomic():
+        LedgerHead.objects.bulk_create(
+            [LedgerHead(account_id=account_id) for account_id in account_ids], ignore_conflicts=True,
+        )
+        heads = LedgerHead.objects.select_for_update().filter(account_id__in=account_ids).order_by('account_id').in_bulk()
+        # Letto dopo aver ottenuto i blocchi: recorded_at cresce con il progressivo
+        now = timezone.now()
+
+        entries, snapshots = [], []
+        for row in rows:
+            head = heads[row.account_id]
+            head.sequence += 1
+            head.total += row.amount
+            recorded_at = row.recorded_at or now
+            entries.append(LedgerEntry(
+                account_id=row.account_id, sequence=head.sequence, transaction_id=row.transaction_id,
+                kind=row.kind, date=row.date, amount=row.amount, recorded_at=recorded_at,
+            ))
+            if head.sequence % snapshot_every == 0:
+                snapshots.append(LedgerSnapshot(
+                    account_id=row.account_id, sequence=head.sequence, total=head.total, recorded_at=recorded_at,
+                ))
+
+        LedgerEntry.objects.bulk_create(entries)
+        LedgerSnapshot.objects.bulk_create(snapshots)
+        LedgerHead.objects.bulk_update(heads.values(), fields=['sequence', 'total'])
+    return entries
+
+
+def on_transactions_changed(sender, changes, **kwargs):
+    append(movements(changes))
+
+
+def balance_known_at(account, moment=None, on_date=None):
+    """
+    Saldo del conto come risultava all'istante `moment` (adesso se None).
+
+    Senza on_date è il saldo di tutti i movimenti registrati fino a moment e
+    costa solo i movimenti successivi all'ultima istantanea. Con on_date si
+    considerano i soli movimenti con data valuta fino a on_date ("saldo al
+    giorno X come noto il giorno Y"): le istantanee non distinguono le date
+    valuta, quindi vengono sommati tutti i movimenti registrati fino a moment.
+    """
+    if moment is None:
+        moment = timezone.now()
+    entries = LedgerEntry.objects.filter(account=account, recorded_at__lte=moment)
+    total = Decimal('0')
+    if on_date is None:
+        snapshot = (
+            LedgerSnapshot.objects.filter(account=account, recorded_at__lte=moment)
+            .order_by('-sequence').values_list('sequence', 'total').first()
+        )
+        if snapshot is not None:
+            sequence, total = snapshot
+            entries = entries.filter(sequence__gt=sequence)
+    else:
+        entries = entries.filter(date__lte=on_date)
+    total += entries.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    return account.initial_balance + total
+
+
+def history(account, since=None, until=None):
+    """
+    Movimenti del conto registrati nell'intervallo, in ordine di progressivo
+    """
+    entries = LedgerEntry.objects.filter(account=account)
+    if since is not None:
+        entries = entries.filter(recorded_at__gte=since)
+    if until is not None:
+        entries = entries.filter(recorded_at__lte=until)
+    return entries.order_by('sequence')
+
+
+def rebuild(snapshot_every=None):
+    """
+    Ricostruisce il registro dallo stato attuale di transazioni e archivio:
+    un movimento per transazione, registrato alla sua data di creazione.
+    La storia delle modifiche precedenti non è ricostruibile.
+    """
+    fields = ('pk', 'account_id', 'transaction_type', 'date', 'amount', 'created_at')
+    with db_transaction.atomic():
+        LedgerEntry.objects.all().delete()
+        LedgerSnapshot.objects.all().delete()
+        LedgerHead.objects.all().delete()
+
+        # Transazioni correnti e archiviate in un'unica sequenza per data di creazione
+        rows = heapq.merge(*(
+            model.objects.order_by('created_at', 'pk').values_list(*fields).iterator(chunk_size=REBUILD_BATCH_SIZE)
+            for model in (ArchivedTransaction, Transaction)
+        ), key=lambda row: (row[-1], row[0]))
+
+        count = 0
+        batch = []
+        for pk, account_id, transaction_type, day, amount, created_at in rows:
+            batch.append(Movement(
+                account_id, pk, LedgerEntry.CREATED, day,
+                amount if transaction_type == 'income' else -amount, created_at,
+            ))
+            if len(batch) == REBUILD_BATCH_SIZE:
+                count += len(append(batch, snapshot_every))
+                batch = []
+        count += len(append(batch, snapshot_every))
+    return count
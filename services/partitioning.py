@@ -0,0 +1,228 @@
+"""
+Partizionamento dichiarativo per intervalli di `date` della tabella di
+Transaction su PostgreSQL.
+
+La conversione (`convert_table`) sostituisce la tabella con una tabella
+partizionata con le stesse colonne: la chiave primaria diventa (id, date),
+perché PostgreSQL richiede che i vincoli di unicità includano la chiave di
+partizione, e una partizione DEFAULT raccoglie le date non coperte. Gli
+indici del modello vengono ricreati sulla tabella padre e quindi su ogni
+partizione. Le query con condizioni su `date` leggono solo le partizioni
+interessate (partition pruning).
+
+Le chiavi esterne di altre tabelle verso Transaction (TransactionAnomaly,
+l'indice di ricerca) non possono sopravvivere: con la chiave primaria
+composta `id` da solo non è più referenziabile. La conversione si rifiuta di
+procedere finché esistono, a meno di chiederne esplicitamente la rimozione
+(`drop_foreign_keys`); le cancellazioni a cascata dei modelli Django restano,
+perché l'ORM le esegue da sé, e l'indice di ricerca viene ripulito da
+transactions_changed.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+
+from transactions.models.base import Account, Transaction, TransactionCategory
+
+
+GRANULARITIES = ('yearly', 'monthly')
+GRANULARITY = getattr(settings, 'TRANSACTIONS_PARTITION_GRANULARITY', 'yearly')
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def table_name():
+    return Transaction._meta.db_table
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_bounds(start_date, end_date, granularity=GRANULARITY):
+    """
+    Partizioni (nome, inizio incluso, fine esclusa) che coprono le date tra
+    start_date ed end_date
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    bounds = []
+    if granularity == 'yearly':
+        for year in range(start_date.year, end_date.year + 1):
+            bounds.append((f'{table_name()}_y{year}', date(year, 1, 1), date(year + 1, 1, 1)))
+    else:
+        cursor = date(start_date.year, start_date.month, 1)
+        while cursor <= end_date:
+            following = _next_month(cursor)
+            bounds.append((f'{table_name()}_y{cursor.year}m{cursor.month:02d}', cursor, following))
+            cursor = following
+    return bounds
+
+
+def _check_vendor():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError("Table partitioning is only supported on PostgreSQL.")
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table_name()])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def existing_partitions(cursor):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s)",
+        [table_name()],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_partitions(bounds):
+    """
+    Crea le partizioni mancanti. Le righe già finite nella partizione DEFAULT
+    per quell'intervallo vengono spostate nella nuova partizione.
+    Restituisce i nomi delle partizioni create.
+    """
+    _check_vendor()
+    table = table_name()
+    default = f'{table}_default'
+    created = []
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            raise PartitioningError(f"{table} is not partitioned yet: run with --convert first.")
+        existing = existing_partitions(cursor)
+        for name, start, end in bounds:
+            if name in existing:
+                continue
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE date >= %s AND date < %s)', [start, end]
+            )
+            if cursor.fetchone()[0]:
+                # La partizione DEFAULT non può contenere righe del nuovo intervallo
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', [start, end]
+                )
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM "{default}" WHERE date >= %s AND date < %s RETURNING *) '
+                    f'INSERT INTO "{table}" SELECT * FROM moved',
+                    [start, end],
+                )
+                cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+            else:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', [start, end]
+                )
+            created.append(name)
+    return created
+
+
+def referencing_foreign_keys(cursor):
+    """
+    (tabella, vincolo) delle chiavi esterne di altre tabelle verso Transaction
+    """
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = to_regclass(%s) AND conrelid <> confrelid "
+        "ORDER BY 1, 2",
+        [table_name()],
+    )
+    return cursor.fetchall()
+
+
+def convert_table(granularity=GRANULARITY, ahead=1, drop_foreign_keys=False):
+    """
+    Converte la tabella di Transaction in una tabella partizionata, copiando i
+    dati partizione per partizione in un'unica transazione. Le chiavi esterne
+    verso Transaction vengono eliminate solo con drop_foreign_keys; restituisce
+    (partizioni create, chiavi esterne eliminate).
+    """
+    _check_vendor()
+    table = table_name()
+    legacy = f'{table}_unpartitioned'
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            raise PartitioningError(f"{table} is already partitioned.")
+
+        # Gli ALTER TABLE falliscono con controlli differiti ancora in sospeso
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+        foreign_keys = referencing_foreign_keys(cursor)
+        if foreign_keys and not drop_foreign_keys:
+            raise PartitioningError(
+                "Foreign keys reference the transaction table and cannot be kept after partitioning: "
+                + ', '.join(f'{referencing}.{name}' for referencing, name in foreign_keys)
+                + ". Run again with --drop-foreign-keys to drop them."
+            )
+        for referencing, name in foreign_keys:
+            # regclass::text è già quotato se necessario
+            cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT "{name}"')
+        cursor.execute(f'SELECT min(date), max(date), max(id) FROM "{table}"')
+        first_date, last_date, last_id = cursor.fetchone()
+        today = date.today()
+        bounds = partition_bounds(
+            min(first_date or today, today), max(last_date or today, horizon(today, ahead, granularity)), granularity,
+        )
+
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE, '
+            f'CONSTRAINT "{table}_id_date_pk" PRIMARY KEY (id, date)) PARTITION BY RANGE (date)'
+        )
+        for name, start, end in bounds:
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', [start, end]
+            )
+        cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+        for name, start, end in bounds:
+            cursor.execute(
+                f'INSERT INTO "{table}" SELECT * FROM "{legacy}" WHERE date >= %s AND date < %s', [start, end]
+            )
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'", [legacy]
+        )
+        if cursor.fetchone()[0]:
+            # Colonna IDENTITY: la nuova tabella ha una sua sequenza da far ripartire
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, true)", [table, last_id or 1])
+        else:
+            # Colonna serial: la sequenza esistente passa alla nuova tabella
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [legacy])
+            cursor.execute(f'ALTER SEQUENCE {cursor.fetchone()[0]} OWNED BY "{table}".id')
+
+        # Senza CASCADE: qualsiasi altra dipendenza rimasta fa fallire la conversione
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+        _create_constraints_and_indexes(cursor, table)
+    return [name for name, _, _ in bounds], foreign_keys
+
+
+def horizon(today, ahead, granularity=GRANULARITY):
+    """
+    Ultimo giorno da coprire creando `ahead` partizioni oltre quella corrente
+    """
+    if granularity == 'yearly':
+        return date(today.year + ahead, 12, 31)
+    day = date(today.year, today.month, 1)
+    for _ in range(ahead):
+        day = _next_month(day)
+    return day
+
+
+def _create_constraints_and_indexes(cursor, table):
+    for field, model in (('account_id', Account), ('category_id', TransactionCategory)):
+        cursor.execute(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{field}_fk" FOREIGN KEY ("{field}") '
+            f'REFERENCES "{model._meta.db_table}" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX "{table}_{field}_idx" ON "{table}" ("{field}")')
+
+    # Gli indici dichiarati nel modello, creati sulla tabella padre
+    with connection.schema_editor(atomic=False) as schema_editor:
+        for index in Transaction._meta.indexes:
+            schema_editor.add_index(Transaction, index)
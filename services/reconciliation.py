@@ -0,0 +1,106 @@
+"""
+Riconciliazione di un conto con i saldi dell'estratto conto.
+
+I saldi dell'applicazione per tutte le date dell'estratto vengono calcolati
+con un solo passaggio sulla serie dei saldi giornalieri: due query (archivio
+e transazioni correnti) a partire dall'ultima chiusura precedente al primo
+controllo, poi ogni data viene collocata nella serie con una ricerca binaria.
+La prima data divergente delimita, con l'ultima data concorde, la finestra
+in cui cercare l'errore: le transazioni di quella finestra sono le candidate,
+con in testa quelle il cui importo coincide con la differenza.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from transactions.models.base import Transaction
+from transactions.models.archive import ArchivedTransaction
+
+
+Checkpoint = namedtuple('Checkpoint', ['date', 'statement_balance'])
+CheckpointResult = namedtuple('CheckpointResult', ['date', 'statement_balance', 'app_balance', 'difference'])
+Reconciliation = namedtuple('Reconciliation', ['results', 'first_divergence', 'last_match', 'candidates'])
+
+
+def balance_series(account, since, until):
+    """
+    (saldo di partenza, date, saldi a fine giornata) per i giorni con
+    movimenti fino a until, a partire dall'ultima chiusura entro since
+    """
+    start_date, opening, _ = account.opening_balance(since)
+
+    dates, balances = [], []
+    balance = opening
+    # Le date archiviate precedono sempre quelle correnti
+    for model in (ArchivedTransaction, Transaction):
+        rows = model.objects.filter(account=account, date__lte=until)
+        if start_date is not None:
+            rows = rows.filter(date__gt=start_date)
+        rows = rows.values('date').annotate(
+            income=Sum('amount', filter=Q(transaction_type='income')),
+            expense=Sum('amount', filter=Q(transaction_type='expense')),
+        ).order_by('date')
+        for row in rows:
+            balance = balance + (row['income'] or 0) - (row['expense'] or 0)
+            dates.append(row['date'])
+            balances.append(balance)
+    return opening, dates, balances
+
+
+def balances_at(account, dates_to_check):
+    """
+    {data: saldo a fine giornata} per tutte le date richieste, in due query
+    """
+    dates_to_check = sorted(set(dates_to_check))
+    if not dates_to_check:
+        return {}
+    opening, dates, balances = balance_series(account, dates_to_check[0], dates_to_check[-1])
+    result = {}
+    for day in dates_to_check:
+        index = bisect_right(dates, day)
+        result[day] = balances[index - 1] if index else opening
+    return result
+
+
+def reconcile(account, checkpoints, tolerance=Decimal('0.00')):
+    """
+    Confronta il conto con una sequenza di (data, saldo dell'estratto).
+    Restituisce i risultati per data, il primo risultato divergente (None se
+    tutto concorda), l'ultimo concorde che lo precede e le transazioni
+    candidate della finestra tra i due.
+    """
+    checkpoints = sorted(Checkpoint(day, Decimal(str(balance))) for day, balance in checkpoints)
+    app_balances = balances_at(account, [checkpoint.date for checkpoint in checkpoints])
+
+    results = []
+    for checkpoint in checkpoints:
+        app_balance = app_balances[checkpoint.date]
+        results.append(CheckpointResult(
+            checkpoint.date, checkpoint.statement_balance, app_balance, app_balance - checkpoint.statement_balance,
+        ))
+
+    first_divergence = next((result for result in results if abs(result.difference) > tolerance), None)
+    if first_divergence is None:
+        return Reconciliation(results, None, results[-1] if results else None, [])
+
+    index = results.index(first_divergence)
+    last_match = results[index - 1] if index else None
+    return Reconciliation(results, first_divergence, last_match, candidates(account, last_match, first_divergence))
+
+
+def candidates(account, last_match, divergence):
+    """
+    Transazioni, correnti o archiviate, tra l'ultima data concorde (esclusa)
+    e la prima divergente (inclusa); prima quelle con importo pari alla
+    differenza introdotta nella finestra
+    """
+    found = []
+    for model in (ArchivedTransaction, Transaction):
+        transactions = model.objects.filter(account=account, date__lte=divergence.date)
+        if last_match is not None:
+            transactions = transactions.filter(date__gt=last_match.date)
+        found.extend(transactions.select_related('category').order_by('date', 'pk'))
+    delta = abs(divergence.difference - (last_match.difference if last_match else 0))
+    return sorted(found, key=lambda transaction: transaction.amount != delta)
@@ -0,0 +1,92 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+
+from transactions.services.bulk import BulkItemError, apply_bulk
+
+
+# Passo di ciascuna frequenza di RecurringTransactionForm.FREQUENCY_CHOICES
+FREQUENCY_STEPS = {
+    'daily': relativedelta(days=1),
+    'weekly': relativedelta(weeks=1),
+    'monthly': relativedelta(months=1),
+    'semi-annual': relativedelta(months=6),
+    'annual': relativedelta(years=1),
+}
+
+
+def occurrences(start_date, end_date, frequency):
+    """
+    Date di una serie ricorrente da start_date a end_date inclusi.
+    Ogni data è calcolata dall'inizio della serie (start + k * passo), così che
+    le serie mensili partite il 31 non scivolino al 28 dopo febbraio.
+    """
+    step = FREQUENCY_STEPS[frequency]
+    dates = []
+    k = 0
+    current = start_date
+    while current <= end_date:
+        dates.append(current)
+        k += 1
+        current = start_date + step * k
+    return dates
+
+
+# Oltre questo numero di occorrenze la serie viene creata da un lavoro in background
+RECURRING_INLINE_LIMIT = getattr(settings, 'TRANSACTIONS_RECURRING_INLINE_LIMIT', 100)
+
+
+def create_recurring(account, category, transaction_type, amount, start_date, frequency,
+                     end_date=None, description=''):
+    """
+    Crea in blocco le transazioni di una serie ricorrente e ne restituisce il
+    numero. Gli argomenti sono serializzabili in JSON (id, date ISO, importo
+    come stringa) per poter essere il payload di un lavoro; senza end_date
+    viene creata solo la prima occorrenza.
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date) if end_date else start
+    results = apply_bulk([
+        {
+            'account': account,
+            'category': category,
+            'transaction_type': transaction_type,
+            'amount': amount,
+            'description': description,
+            'date': day.isoformat(),
+        }
+        for day in occurrences(start, end, frequency)
+    ], all_or_none=True)
+    errors = next((result['errors'] for result in results if result['status'] == 'error'), None)
+    if errors is not None:
+        raise BulkItemError(errors)
+    return len(results)
+
+
+def schedule_recurring(cleaned_data, transaction_type):
+    """
+    Crea la serie descritta da RecurringTransactionForm, subito se è breve o
+    accodando un lavoro 'recurring.expand'. Restituisce il lavoro accodato,
+    None se le transazioni sono già state create.
+    """
+    from transactions.services import jobs
+
+    end_date = cleaned_data.get('end_date')
+    payload = {
+        'account': cleaned_data['account'].pk,
+        'category': cleaned_data['category'].pk,
+        'transaction_type': transaction_type,
+        'amount': str(cleaned_data['amount']),
+        'description': cleaned_data.get('description') or '',
+        'start_date': cleaned_data['start_date'].isoformat(),
+        'end_date': end_date.isoformat() if end_date else None,
+        'frequency': cleaned_data['frequency'],
+    }
+    count = len(occurrences(cleaned_data['start_date'], end_date or cleaned_data['start_date'], payload['frequency']))
+    if count <= RECURRING_INLINE_LIMIT:
+        create_recurring(**payload)
+        return None
+    # La chiave evita di accodare due volte la stessa serie (doppio invio del form)
+    key = 'recurring {transaction_type} {account} {category} {amount} {frequency} {start_date} {end_date}'.format(**payload)
+    return jobs.enqueue('recurring.expand', payload, key=key)
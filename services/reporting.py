@@ -0,0 +1,221 @@
+"""
+Report su intervalli di date letti dalle tabelle di aggregazione.
+
+L'intervallo viene scomposto nei bucket più grossi che vi cadono interamente
+(anni, poi trimestri, poi mesi); i bordi irregolari sono coperti dalle
+aggregazioni giornaliere o dalle transazioni grezze. Le aggregazioni settimanali
+non sono usate perché le settimane ISO attraversano i confini dei mesi.
+
+Le tabelle devono essere aggiornate (vedi `aggregate_transactions`) per il
+periodo richiesto; in caso contrario usare `edge_source='raw'` e intervalli che
+non contengono bucket interi, oppure rigenerare le aggregazioni. La chiusura
+dei periodi non tocca le aggregazioni, e le letture grezze includono le
+transazioni archiviate.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q, Sum, Count
+
+from transactions.models.base import Account, Transaction
+from transactions.models.archive import ArchivedTransaction
+from transactions.services.fx import convert_many
+from transactions.models.aggregated import (
+    DailyTransactionAggregation,
+    MonthlyTransactionAggregation,
+    QuarterlyTransactionAggregation,
+    YearlyTransactionAggregation,
+)
+
+
+GROUP_FIELDS = {
+    'account': 'account_id',
+    'category': 'category_id',
+    'transaction_type': 'transaction_type',
+}
+
+
+def _month_end(day):
+    next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return next_month - timedelta(days=1)
+
+
+def _quarter_end(day):
+    last_month = ((day.month - 1) // 3) * 3 + 3
+    return _month_end(date(day.year, last_month, 1))
+
+
+def plan_segments(start_date, end_date):
+    """
+    Scompone [start_date, end_date] in segmenti (livello, inizio, fine) usando
+    sempre il bucket più grosso che inizia al cursore e termina entro l'intervallo.
+    I giorni consecutivi vengono uniti in un unico segmento 'daily'.
+    """
+    segments = []
+    cursor = start_date
+    while cursor <= end_date:
+        if cursor.month == 1 and cursor.day == 1 and date(cursor.year, 12, 31) <= end_date:
+            segment = ('yearly', cursor, date(cursor.year, 12, 31))
+        elif cursor.day == 1 and cursor.month % 3 == 1 and _quarter_end(cursor) <= end_date:
+            segment = ('quarterly', cursor, _quarter_end(cursor))
+        elif cursor.day == 1 and _month_end(cursor) <= end_date:
+            segment = ('monthly', cursor, _month_end(cursor))
+        else:
+            segment = ('daily', cursor, cursor)
+
+        # Unisce segmenti contigui dello stesso livello
+        if segments and segments[-1][0] == segment[0] and segments[-1][2] + timedelta(days=1) == segment[1]:
+            segments[-1] = (segment[0], segments[-1][1], segment[2])
+        else:
+            segments.append(segment)
+        cursor = segment[2] + timedelta(days=1)
+    return segments
+
+
+def _period_filter(tier, start, end):
+    if tier == 'yearly':
+        return Q(year__gte=start.year, year__lte=end.year)
+    if tier == 'quarterly':
+        return reduce(or_, (
+            Q(year=year, quarter=quarter)
+            for year, quarter in _periods(start, end, 3)
+        ))
+    if tier == 'monthly':
+        return reduce(or_, (
+            Q(year=year, month=month)
+            for year, month in _periods(start, end, 1)
+        ))
+    return Q(date__gte=start, date__lte=end)
+
+
+def _periods(start, end, months):
+    """
+    Coppie (anno, indice del periodo) di ampiezza `months` mesi tra start ed end
+    """
+    periods = []
+    year, month = start.year, start.month
+    while date(year, month, 1) <= end:
+        periods.append((year, (month - 1) // months + 1))
+        month += months
+        if month > 12:
+            year, month = year + 1, month - 12
+    return periods
+
+
+TIER_MODELS = {
+    'yearly': YearlyTransactionAggregation,
+    'quarterly': QuarterlyTransactionAggregation,
+    'monthly': MonthlyTransactionAggregation,
+    'daily': DailyTransactionAggregation,
+}
+
+
+def report(start_date, end_date, group_by=('account',), edge_source='daily',
+           account=None, category=None, transaction_type=None, currency=None):
+    """
+    Totali e conteggi delle transazioni tra start_date ed end_date (inclusi),
+    raggruppati per uno o più tra 'account', 'category' e 'transaction_type'.
+
+    Esegue al più una query per livello di aggregazione, indipendentemente
+    dalla lunghezza dell'intervallo. `edge_source` sceglie se i giorni sciolti
+    vengono letti dalle aggregazioni giornaliere ('daily') o dalle transazioni
+    ('raw', correnti e archiviate).
+    Restituisce una lista di dizionari con le chiavi di raggruppamento,
+    `total_amount` e `transaction_count`. Senza 'transaction_type' tra i
+    raggruppamenti `total_amount` è il netto: entrate meno uscite.
+
+    Con `currency` i totali vengono convertiti in quella valuta al tasso di
+    end_date: si raggruppa internamente anche per conto e si convertono tutti
+    i gruppi in blocco, con una sola query per i tassi.
+    """
+    unknown = set(group_by) - set(GROUP_FIELDS)
+    if unknown:
+        raise ValueError(f"Unsupported group_by fields: {', '.join(sorted(unknown))}")
+    if edge_source not in ('daily', 'raw'):
+        raise ValueError("edge_source must be 'daily' or 'raw'")
+
+    filters = Q()
+    if account is not None:
+        filters &= Q(account=account)
+    if category is not None:
+        filters &= Q(category=category)
+    if transaction_type is not None:
+        filters &= Q(transaction_type=transaction_type)
+
+    # Un'unica condizione OR per livello
+    conditions = {}
+    for tier, start, end in plan_segments(start_date, end_date):
+        if tier == 'daily' and edge_source == 'raw':
+            tier = 'raw'
+        condition = _period_filter(tier, start, end)
+        conditions[tier] = conditions[tier] | condition if tier in conditions else condition
+
+    # Il tipo serve sempre per il segno; il conto per la conversione
+    group_fields = [GROUP_FIELDS[name] for name in group_by]
+    signed = 'transaction_type' not in group_fields
+    for extra in ('transaction_type', 'account_id'):
+        if extra not in group_fields and (extra == 'transaction_type' or currency is not None):
+            group_fields.append(extra)
+    type_position = group_fields.index('transaction_type')
+
+    totals = {}
+    for tier, condition in conditions.items():
+        if tier == 'raw':
+            querysets = [
+                Transaction.objects.filter(condition, filters),
+                ArchivedTransaction.objects.filter(condition, filters),
+            ]
+            aggregates = {'total': Sum('amount'), 'count': Count('id')}
+        else:
+            querysets = [TIER_MODELS[tier].objects.filter(condition, filters)]
+            aggregates = {'total': Sum('total_amount'), 'count': Sum('transaction_count')}
+
+        for queryset in querysets:
+            for row in queryset.values(*group_fields).annotate(**aggregates).order_by():
+                key = tuple(row[field] for field in group_fields)
+                amount = row['total'] or Decimal('0')
+                if signed and key[type_position] == 'expense':
+                    amount = -amount
+                total, count = totals.get(key, (Decimal('0'), 0))
+                totals[key] = (total + amount, count + (row['count'] or 0))
+
+    if currency is not None:
+        totals = _convert_totals(totals, group_fields.index('account_id'), currency, end_date)
+
+    # Riunisce i gruppi togliendo i campi aggiunti internamente
+    merged = {}
+    for key, (amount, count) in totals.items():
+        short_key = key[:len(group_by)]
+        total, previous = merged.get(short_key, (Decimal('0'), 0))
+        merged[short_key] = (total + amount, previous + count)
+
+    return [
+        {
+            **dict(zip(group_by, key)),
+            'total_amount': total,
+            'transaction_count': count,
+        }
+        for key, (total, count) in merged.items()
+    ]
+
+
+def _convert_totals(totals, account_position, currency, on_date):
+    """
+    Converte i totali per gruppo (che includono il conto) nella valuta indicata
+    """
+    account_currencies = dict(
+        Account.objects.filter(
+            pk__in={key[account_position] for key in totals}
+        ).values_list('pk', 'currency')
+    )
+    keys = list(totals)
+    converted = convert_many(
+        ((totals[key][0], account_currencies[key[account_position]], on_date) for key in keys),
+        currency,
+    )
+    return {
+        key: (amount.quantize(Decimal('0.01')), totals[key][1])
+        for key, amount in zip(keys, converted)
+    }
@@ -0,0 +1,308 @@
+"""
+Ricerca full-text su descrizione, categoria e conto delle transazioni.
+
+L'indice è una tabella laterale gestita dal backend scelto in base al database:
+una tabella virtuale FTS5 su SQLite, una tabella con colonna tsvector e indice
+GIN su PostgreSQL. Per gli altri database si ricade su una ricerca icontains.
+Il backend può essere forzato con TRANSACTIONS_SEARCH_BACKEND (percorso
+puntato della classe).
+
+L'indice viene aggiornato dal segnale transactions_changed (scritture singole
+e massive) e dal rinomino di conti e categorie; `rebuild_search_index`
+lo ricostruisce da zero.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from transactions.models.base import Account, Transaction, TransactionCategory
+
+
+SEARCH_TABLE = 'transactions_search'
+# Numero massimo di risultati ordinati per rilevanza
+SEARCH_LIMIT = getattr(settings, 'TRANSACTIONS_SEARCH_LIMIT', 500)
+# Configurazione testuale di PostgreSQL; 'simple' non applica stemming
+SEARCH_CONFIG = getattr(settings, 'TRANSACTIONS_SEARCH_CONFIG', 'simple')
+INDEX_BATCH_SIZE = 2000
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def documents(transaction_ids):
+    """
+    Righe (id, descrizione, categoria, conto) da indicizzare, con una query
+    """
+    return Transaction.objects.filter(pk__in=transaction_ids).values_list(
+        'pk', 'description', 'category__name', 'account__name',
+    ).order_by()
+
+
+class SearchBackend:
+    # Tabella dell'indice già creata in questo processo
+    ready = False
+
+    def setup(self):
+        """
+        Crea la tabella dell'indice se non esiste
+        """
+
+    def ensure_setup(self):
+        """
+        Crea la tabella al primo uso nel processo, se post_migrate non è stato
+        eseguito (database creato senza migrate o tabella rimossa)
+        """
+        if not self.ready:
+            self.setup()
+            self.ready = True
+
+    def index(self, transaction_ids):
+        raise NotImplementedError
+
+    def remove(self, transaction_ids):
+        raise NotImplementedError
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Id delle transazioni che contengono tutti i termini (anche come
+        prefissi), dalla più rilevante
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def rebuild(self):
+        self.setup()
+        self.clear()
+        ids = Transaction.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=INDEX_BATCH_SIZE)
+        batch = []
+        for pk in ids:
+            batch.append(pk)
+            if len(batch) == INDEX_BATCH_SIZE:
+                self.index(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"USING fts5(description, category, account, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def index(self, transaction_ids):
+        rows = list(documents(transaction_ids))
+        with connection.cursor() as cursor:
+            # Le tabelle FTS5 non supportano l'upsert: si cancella e si reinserisce
+            self._delete(cursor, transaction_ids)
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, description, category, account) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, transaction_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, transaction_ids)
+
+    def _delete(self, cursor, transaction_ids):
+        ids = list(transaction_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+
+class PostgresBackend(SearchBackend):
+    # Descrizione con peso maggiore di categoria e conto
+    DOCUMENT = (
+        "setweight(to_tsvector(%(config)s, coalesce(t.description, '')), 'A') || "
+        "setweight(to_tsvector(%(config)s, coalesce(c.name, '')), 'B') || "
+        "setweight(to_tsvector(%(config)s, coalesce(a.name, '')), 'C')"
+    )
+
+    def setup(self):
+        transaction_table = Transaction._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"transaction_id bigint PRIMARY KEY REFERENCES {transaction_table} (id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin ON {SEARCH_TABLE} USING GIN (document)"
+            )
+
+    def index(self, transaction_ids):
+        # Il documento viene costruito nel database con un solo INSERT ... SELECT
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (transaction_id, document) "
+                f"SELECT t.id, {self.DOCUMENT} "
+                f"FROM {Transaction._meta.db_table} t "
+                f"JOIN {TransactionCategory._meta.db_table} c ON c.id = t.category_id "
+                f"JOIN {Account._meta.db_table} a ON a.id = t.account_id "
+                f"WHERE t.id = ANY(%(ids)s) "
+                f"ON CONFLICT (transaction_id) DO UPDATE SET document = EXCLUDED.document",
+                {'config': SEARCH_CONFIG, 'ids': list(transaction_ids)},
+            )
+
+    def remove(self, transaction_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE transaction_id = ANY(%s)",
+                [list(transaction_ids)],
+            )
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT transaction_id FROM {SEARCH_TABLE}, to_tsquery(%s, %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s",
+                [SEARCH_CONFIG, ' & '.join(f'{token}:*' for token in tokens), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {SEARCH_TABLE}")
+
+
+class BasicBackend(SearchBackend):
+    """
+    Ripiego senza indice per i database privi di ricerca full-text
+    """
+
+    def index(self, transaction_ids):
+        pass
+
+    def remove(self, transaction_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        condition = Q()
+        for token in tokens:
+            condition &= reduce(or_, (
+                Q(**{f'{field}__icontains': token})
+                for field in ('description', 'category__name', 'account__name')
+            ))
+        return list(Transaction.objects.filter(condition).values_list('pk', flat=True)[:limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'TRANSACTIONS_SEARCH_BACKEND', None)
+        backend_class = import_string(path) if path else BACKENDS.get(connection.vendor, BasicBackend)
+        _backend = backend_class()
+    return _backend
+
+
+def search_ids(queryset, query, limit=SEARCH_LIMIT):
+    """
+    Id delle transazioni del queryset che corrispondono alla ricerca, dalla
+    più rilevante. L'indice non conosce i filtri del queryset (per esempio il
+    tipo): si chiedono all'indice sempre più risultati finché `limit` di essi
+    non superano i filtri o l'indice non ne ha altri.
+    """
+    backend = get_backend()
+    backend.ensure_setup()
+    fetch = limit
+    while True:
+        ids = backend.search(query, fetch)
+        matching = set(queryset.filter(pk__in=ids).values_list('pk', flat=True))
+        if len(matching) >= limit or len(ids) < fetch:
+            return [pk for pk in ids if pk in matching][:limit]
+        fetch *= 4
+
+
+def search_transactions(queryset, query, limit=SEARCH_LIMIT):
+    """
+    Transazioni del queryset che corrispondono alla ricerca, ordinate per
+    rilevanza
+    """
+    ids = search_ids(queryset, query, limit)
+    position = {pk: i for i, pk in enumerate(ids)}
+    return sorted(queryset.filter(pk__in=ids), key=lambda transaction: position[transaction.pk])
+
+
+def setup_search_index(sender, **kwargs):
+    get_backend().ensure_setup()
+
+
+def on_transactions_changed(sender, changes, **kwargs):
+    saved = [after.id for before, after in changes if after is not None]
+    deleted = [before.id for before, after in changes if after is None]
+    backend = get_backend()
+    backend.ensure_setup()
+    if saved:
+        backend.index(saved)
+    if deleted:
+        backend.remove(deleted)
+
+
+def capture_previous_name(sender, instance, raw=False, **kwargs):
+    instance._previous_name = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._previous_name = sender.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+def on_name_changed(sender, instance, created, raw=False, **kwargs):
+    """
+    Reindicizza le transazioni di un conto o di una categoria rinominati
+    """
+    if raw or created or getattr(instance, '_previous_name', None) in (None, instance.name):
+        return
+    field = 'account' if sender is Account else 'category'
+    ids = list(Transaction.objects.filter(**{field: instance}).values_list('pk', flat=True))
+    backend = get_backend()
+    backend.ensure_setup()
+    for start in range(0, len(ids), INDEX_BATCH_SIZE):
+        backend.index(ids[start:start + INDEX_BATCH_SIZE])
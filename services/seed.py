@@ -0,0 +1,110 @@
+"""
+Dati predefiniti (categorie di sistema e conto iniziale) descritti in
+seeds/defaults.json.
+
+`apply_seed` controlla con una query per modello quali righe mancano e le
+crea con bulk_create; l'impronta SHA-256 della definizione viene salvata in
+SeedVersion, così che dopo ogni migrate successivo basti una query per
+verificare che non ci sia nulla da fare. La definizione viene riapplicata
+solo quando il file cambia (o con force=True).
+
+Con TRANSACTIONS_SEED_ON_MIGRATE = False il post_migrate non fa nulla: utile
+nelle suite di test che non usano i dati predefiniti.
+"""
+import hashlib
+import json
+import logging
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction as db_transaction
+from django.db.models import Q
+
+from transactions.models.base import Account, TransactionCategory
+from transactions.models.seed import SeedVersion
+from transactions.services.budgets import invalidate_parents
+from transactions.services.choices import invalidate_choices
+
+
+logger = logging.getLogger(__name__)
+
+SEED_NAME = 'defaults'
+SEED_PATH = Path(__file__).resolve().parent.parent / 'seeds' / 'defaults.json'
+
+
+def load_definition(path=SEED_PATH):
+    """
+    (definizione, impronta) del file dei dati predefiniti
+    """
+    content = Path(path).read_bytes()
+    return json.loads(content), hashlib.sha256(content).hexdigest()
+
+
+def _missing(model, rows, keys, using):
+    """
+    Righe della definizione non ancora presenti, cercate con una sola query
+    """
+    if not rows:
+        return []
+    lookup = reduce(or_, (Q(**{key: row[key] for key in keys}) for row in rows))
+    existing = set(model.objects.using(using).filter(lookup).values_list(*keys))
+    return [row for row in rows if tuple(row[key] for key in keys) not in existing]
+
+
+def apply_seed(using=DEFAULT_DB_ALIAS, force=False, path=SEED_PATH):
+    """
+    Crea i dati predefiniti mancanti. Restituisce {modello: righe create},
+    o None se la definizione era già applicata.
+    """
+    definition, digest = load_definition(path)
+    if not force and SeedVersion.objects.using(using).filter(name=SEED_NAME, digest=digest).exists():
+        return None
+
+    with db_transaction.atomic(using=using):
+        categories = _missing(TransactionCategory, definition.get('categories', []), ('name', 'transaction_type'), using)
+        TransactionCategory.objects.using(using).bulk_create([TransactionCategory(**row) for row in categories])
+
+        accounts = []
+        rows = definition.get('accounts', [])
+        # Il conto iniziale serve solo a un'installazione senza conti
+        if any(row.get('only_if_empty') for row in rows) and Account.objects.using(using).exists():
+            rows = [row for row in rows if not row.get('only_if_empty')]
+        for row in _missing(Account, rows, ('name',), using):
+            fields = {key: value for key, value in row.items() if key != 'only_if_empty'}
+            if 'initial_balance' in fields:
+                fields['initial_balance'] = Decimal(fields['initial_balance'])
+            accounts.append(Account(**fields))
+        Account.objects.using(using).bulk_create(accounts)
+
+        SeedVersion.objects.using(using).update_or_create(name=SEED_NAME, defaults={'digest': digest})
+
+    if categories or accounts:
+        # bulk_create non emette post_save
+        invalidate_choices(sender=None)
+    if categories:
+        invalidate_parents(sender=None)
+
+    logger.info("Seed %s applied: %d categories, %d accounts created.", digest[:12], len(categories), len(accounts))
+    return {TransactionCategory: len(categories), Account: len(accounts)}
+
+
+def seed_defaults(sender, using=DEFAULT_DB_ALIAS, plan=None, **kwargs):
+    """
+    Ricevitore di post_migrate. Gli errori non vengono intercettati: un
+    migrate che non riesce a creare i dati predefiniti deve fallire.
+
+    post_migrate arriva dopo ogni migrate, anche parziale (`migrate auth`) o
+    all'indietro (`migrate transactions zero`): in questi casi le tabelle
+    possono non esistere e non c'è nulla da creare.
+    """
+    if not getattr(settings, 'TRANSACTIONS_SEED_ON_MIGRATE', True):
+        return
+    if any(backwards and migration.app_label == SeedVersion._meta.app_label for migration, backwards in plan or ()):
+        return
+    tables = set(connections[using].introspection.table_names())
+    if not {model._meta.db_table for model in (SeedVersion, TransactionCategory, Account)} <= tables:
+        return
+    apply_seed(using=using)
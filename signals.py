@@ -0,0 +1,58 @@
+from collections import namedtuple
+from django.dispatch import Signal
+
+
+# Fotografia leggera di una transazione, indipendente dall'istanza del modello
+TransactionState = namedtuple('TransactionState', [
+    'id', 'account_id', 'category_id', 'transaction_type', 'date', 'amount', 'description',
+])
+
+# Inviato dopo ogni scrittura su Transaction, sia singola (save/delete) sia massiva
+# (bulk_create/bulk_update non emettono post_save). L'argomento `changes` è una lista
+# di coppie (before, after) di TransactionState: before è None per le creazioni,
+# after è None per le cancellazioni.
+transactions_changed = Signal()
+
+# Inviato quando la spesa di un budget supera la soglia di avviso o l'importo
+# del budget; argomenti: budget, period, level.
+budget_threshold_crossed = Signal()
+
+
+def snapshot(transaction):
+    # I valori possono essere ancora stringhe se l'istanza non è stata validata
+    meta = type(transaction)._meta
+    return TransactionState(
+        id=transaction.pk,
+        account_id=transaction.account_id,
+        category_id=transaction.category_id,
+        transaction_type=transaction.transaction_type,
+        date=meta.get_field('date').to_python(transaction.date),
+        amount=meta.get_field('amount').to_python(transaction.amount),
+        description=transaction.description,
+    )
+
+
+def capture_previous_state(sender, instance, raw=False, **kwargs):
+    """
+    Salva lo stato presente nel database prima di un aggiornamento, così che i
+    ricevitori possano calcolare la differenza. Nessuna query se nessuno ascolta.
+    """
+    instance._previous_state = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if not transactions_changed.has_listeners(sender):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(*TransactionState._fields).first()
+    if previous is not None:
+        instance._previous_state = TransactionState(*previous)
+
+
+def notify_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = None if created else getattr(instance, '_previous_state', None)
+    transactions_changed.send(sender=sender, changes=[(before, snapshot(instance))])
+
+
+def notify_deleted(sender, instance, **kwargs):
+    transactions_changed.send(sender=sender, changes=[(snapshot(instance), None)])
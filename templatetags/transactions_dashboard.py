@@ -0,0 +1,22 @@
+from django import template
+
+from transactions.models.currency import currency_symbol
+from transactions.services import dashboard, fx
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('transactions/dashboard/summary.html')
+def dashboard_summary(account=None):
+    """
+    Riepilogo del mese corrente per tutti i conti o per `account`
+    """
+    try:
+        summary = dashboard.summary(account)
+    except fx.ExchangeRateMissing:
+        summary = None
+    return {
+        'summary': summary,
+        'currency_symbol': currency_symbol(summary['currency']) if summary else '',
+    }
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 from datetime import date, timedelta
 from decimal import Decimal
@@ -177,4 +177,1708 @@ class AccountTransactionsTestCase(TestCase):
         self.assertEqual(
             self.account.get_balance_at_date(future_date), 
             Decimal('900.00')
-        )
\ No newline at end of file
+        )
+
+class BulkTransactionsTestCase(TestCase):
+    def setUp(self):
+        self.income_category = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.expense_category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Bulk Account",
+            account_type="checking",
+            initial_balance=Decimal('1000.00'),
+            institution="Test Bank"
+        )
+
+    def test_bulk_create_update_delete(self):
+        """Valid items are applied in one batch and reflected in the balance."""
+        from .services.bulk import apply_bulk
+        existing = Transaction.objects.create(
+            account=self.account, date=date.today(), amount=Decimal('50.00'),
+            transaction_type="expense", category=self.expense_category
+        )
+        removed = Transaction.objects.create(
+            account=self.account, date=date.today(), amount=Decimal('70.00'),
+            transaction_type="expense", category=self.expense_category
+        )
+        results = apply_bulk([
+            {'date': str(date.today()), 'amount': '300.00', 'transaction_type': 'income',
+             'category': self.income_category.id, 'account': self.account.id},
+            {'id': existing.id, 'amount': '20.00'},
+            {'op': 'delete', 'id': removed.id},
+        ])
+        self.assertEqual([r['status'] for r in results], ['created', 'updated', 'deleted'])
+        self.assertEqual(self.account.get_balance_at_date(), Decimal('1280.00'))
+
+    def test_bulk_per_item_errors(self):
+        """Invalid items report their errors without blocking the valid ones."""
+        from .services.bulk import apply_bulk
+        results = apply_bulk([
+            {'date': str(date.today()), 'amount': '10.00', 'transaction_type': 'expense',
+             'category': self.income_category.id, 'account': self.account.id},
+            {'date': str(date.today()), 'amount': '-5.00', 'transaction_type': 'expense',
+             'category': self.expense_category.id, 'account': self.account.id},
+            {'date': str(date.today()), 'amount': '5.00', 'transaction_type': 'expense',
+             'category': self.expense_category.id, 'account': self.account.id},
+        ])
+        self.assertIn('category', results[0]['errors'])
+        self.assertIn('amount', results[1]['errors'])
+        self.assertEqual(results[2]['status'], 'created')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_bulk_all_or_none(self):
+        """With all_or_none a single invalid item rolls back the whole batch."""
+        from .services.bulk import apply_bulk
+        results = apply_bulk([
+            {'date': str(date.today()), 'amount': '5.00', 'transaction_type': 'expense',
+             'category': self.expense_category.id, 'account': self.account.id},
+            {'op': 'update', 'id': 9999, 'amount': '1.00'},
+        ], all_or_none=True)
+        self.assertEqual([r['status'] for r in results], ['skipped', 'error'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_bulk_repeated_id_is_rejected(self):
+        """An id repeated in one batch is an item error and the ledger stays consistent."""
+        from .services.bulk import apply_bulk
+        from .services.ledger import balance_known_at
+        existing = Transaction.objects.create(
+            account=self.account, date=date.today(), amount=Decimal('10.00'),
+            transaction_type="expense", category=self.expense_category
+        )
+        results = apply_bulk([
+            {'id': existing.id, 'amount': '50.00'},
+            {'id': existing.id, 'amount': '30.00'},
+        ])
+        self.assertEqual(results[0]['status'], 'updated')
+        self.assertIn('id', results[1]['errors'])
+        existing.refresh_from_db()
+        self.assertEqual(existing.amount, Decimal('50.00'))
+        self.assertEqual(balance_known_at(self.account), Decimal('950.00'))
+
+
+class JsonApiTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        user = get_user_model().objects.create_user(username='api', password='secret')
+        self.client.force_login(user)
+        self.category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Api Account",
+            account_type="checking",
+            initial_balance=Decimal('100.00'),
+            institution="Test Bank"
+        )
+        for day in range(3):
+            Transaction.objects.create(
+                account=self.account, date=date.today() - timedelta(days=day), amount=Decimal('10.00'),
+                transaction_type="expense", category=self.category
+            )
+
+    def test_sparse_fields_and_cursor_pagination(self):
+        """Only requested fields are returned and the cursor walks every page."""
+        from django.urls import reverse
+        url = reverse('transactions:api_transactions')
+        response = self.client.get(url, {'fields': 'id,amount', 'limit': 2})
+        payload = response.json()
+        self.assertEqual(set(payload['results'][0]), {'id', 'amount'})
+        self.assertEqual(len(payload['results']), 2)
+
+        response = self.client.get(url, {'fields': 'id,amount', 'limit': 2, 'cursor': payload['next']})
+        second = response.json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+
+    def test_malformed_cursor_is_rejected(self):
+        """Cursors with values of the wrong type return 400 instead of failing."""
+        from django.urls import reverse
+        from .views.api import encode_cursor
+        url = reverse('transactions:api_transactions')
+        # Le transazioni sono ordinate per (-date, -id)
+        for values in ([{'a': 1}, 1], ['not-a-date', 1], [str(date.today()), 'x'], 'x', [1]):
+            response = self.client.get(url, {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+
+    def test_conditional_get(self):
+        """Unchanged transactions return 304, a modification invalidates the ETag."""
+        from django.urls import reverse
+        url = reverse('transactions:api_transactions')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Transaction.objects.filter(pk=Transaction.objects.first().pk).update(modified_at=timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_account_balance_field(self):
+        """Account balances are annotated in the list query."""
+        from django.urls import reverse
+        response = self.client.get(reverse('transactions:api_accounts'), {'fields': 'id,balance'})
+        balances = {row['id']: Decimal(row['balance']) for row in response.json()['results']}
+        self.assertEqual(balances[self.account.id], Decimal('70.00'))
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        self.user = get_user_model().objects.create_user(username='async', password='secret')
+        self.category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Async Account",
+            account_type="checking",
+            initial_balance=Decimal('100.00'),
+            institution="Test Bank"
+        )
+        Transaction.objects.create(
+            account=self.account, date=date.today(), amount=Decimal('40.00'),
+            transaction_type="expense", category=self.category
+        )
+
+    async def test_async_account_detail_daily_balances(self):
+        """The async detail view computes the same daily balances as the model."""
+        from django.urls import reverse
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse('transactions:async_account_detail_view', args=[self.account.id])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['daily_balances'], {date.today(): Decimal('60.00')})
+
+    async def test_async_views_require_login(self):
+        """Anonymous requests are redirected like the synchronous views."""
+        from django.urls import reverse
+        response = await self.async_client.get(reverse('transactions:async_account_view'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ReportingTestCase(TestCase):
+    def setUp(self):
+        self.category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Report Account",
+            account_type="checking",
+            initial_balance=Decimal('0.00'),
+            institution="Test Bank"
+        )
+        for day in (date(2022, 12, 31), date(2023, 3, 15), date(2023, 7, 1), date(2024, 2, 10), date(2024, 2, 20)):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal('10.00'),
+                transaction_type="expense", category=self.category
+            )
+
+    def test_plan_uses_coarsest_buckets(self):
+        """Whole years, quarters and months are used before single days."""
+        from .services.reporting import plan_segments
+        self.assertEqual(plan_segments(date(2022, 12, 30), date(2024, 2, 15)), [
+            ('daily', date(2022, 12, 30), date(2022, 12, 31)),
+            ('yearly', date(2023, 1, 1), date(2023, 12, 31)),
+            ('monthly', date(2024, 1, 1), date(2024, 1, 31)),
+            ('daily', date(2024, 2, 1), date(2024, 2, 15)),
+        ])
+
+    def test_report_matches_raw_transactions(self):
+        """Totals read from the aggregation tiers equal the raw totals."""
+        from .models.aggregated import (
+            DailyTransactionAggregation, MonthlyTransactionAggregation,
+            QuarterlyTransactionAggregation, YearlyTransactionAggregation,
+        )
+        from .services.reporting import report
+        DailyTransactionAggregation.aggregate_transactions()
+        MonthlyTransactionAggregation.aggregate_transactions()
+        QuarterlyTransactionAggregation.aggregate_transactions()
+        YearlyTransactionAggregation.aggregate_transactions()
+
+        for edge_source in ('daily', 'raw'):
+            rows = report(date(2022, 12, 30), date(2024, 2, 15), group_by=('account',), edge_source=edge_source)
+            self.assertEqual(rows, [{
+                'account': self.account.id,
+                'total_amount': Decimal('-40.00'),
+                'transaction_count': 4,
+            }])
+
+    def test_report_nets_types_and_reads_archived_rows(self):
+        """Without a type grouping income and expense are netted, archived rows included."""
+        from .models.aggregated import (
+            DailyTransactionAggregation, MonthlyTransactionAggregation, QuarterlyTransactionAggregation,
+        )
+        from .services.archive import close_period
+        from .services.reporting import report
+        salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        Transaction.objects.create(
+            account=self.account, date=date(2023, 3, 20), amount=Decimal('100.00'),
+            transaction_type="income", category=salary
+        )
+        DailyTransactionAggregation.aggregate_transactions()
+        MonthlyTransactionAggregation.aggregate_transactions()
+        QuarterlyTransactionAggregation.aggregate_transactions()
+        expected = [{'account': self.account.id, 'total_amount': Decimal('80.00'), 'transaction_count': 3}]
+        self.assertEqual(report(date(2023, 1, 2), date(2023, 12, 30), edge_source='raw'), expected)
+        self.assertEqual(
+            sorted(report(date(2023, 1, 2), date(2023, 12, 30), group_by=('transaction_type',), edge_source='raw'),
+                   key=lambda row: row['transaction_type']),
+            [{'transaction_type': 'expense', 'total_amount': Decimal('20.00'), 'transaction_count': 2},
+             {'transaction_type': 'income', 'total_amount': Decimal('100.00'), 'transaction_count': 1}],
+        )
+
+        # Le aggregazioni restano, i bordi grezzi leggono l'archivio
+        close_period(date(2023, 6, 30))
+        self.assertEqual(report(date(2023, 1, 2), date(2023, 12, 30), edge_source='raw'), expected)
+        self.assertEqual(report(date(2023, 3, 10), date(2023, 3, 25), edge_source='raw'), [
+            {'account': self.account.id, 'total_amount': Decimal('90.00'), 'transaction_count': 2},
+        ])
+
+
+class ExportSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Export Account",
+            account_type="checking",
+            initial_balance=Decimal('0.00'),
+            institution="Test Bank"
+        )
+
+    def test_incremental_export_rewrites_touched_partitions(self):
+        """Only partitions with rows modified since the last run are rewritten."""
+        import importlib.util
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        if importlib.util.find_spec('pyarrow') is None:
+            self.skipTest("pyarrow is not installed")
+        import pyarrow.parquet as pq
+
+        for day in (date(2023, 1, 10), date(2023, 2, 10)):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal('10.00'),
+                transaction_type="expense", category=self.category
+            )
+        with tempfile.TemporaryDirectory() as output:
+            call_command('export_snapshot', output, dataset=['transactions'], stdout=io.StringIO())
+            january = os.path.join(output, 'transactions', 'year=2023', 'month=01', 'data.parquet')
+            february = os.path.join(output, 'transactions', 'year=2023', 'month=02', 'data.parquet')
+            february_mtime = os.path.getmtime(february)
+
+            Transaction.objects.create(
+                account=self.account, date=date(2023, 1, 20), amount=Decimal('5.00'),
+                transaction_type="expense", category=self.category
+            )
+            call_command('export_snapshot', output, dataset=['transactions'], stdout=io.StringIO())
+
+            self.assertEqual(pq.read_table(january).num_rows, 2)
+            self.assertEqual(os.path.getmtime(february), february_mtime)
+
+    def test_incremental_export_follows_moves_and_deletes(self):
+        """Rows moved to another month or deleted leave their old partition."""
+        import importlib.util
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        if importlib.util.find_spec('pyarrow') is None:
+            self.skipTest("pyarrow is not installed")
+        import pyarrow.parquet as pq
+
+        moved, deleted = [
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal('10.00'),
+                transaction_type="expense", category=self.category
+            )
+            for day in (date(2023, 1, 10), date(2023, 2, 10))
+        ]
+        with tempfile.TemporaryDirectory() as output:
+            call_command('export_snapshot', output, dataset=['transactions'], stdout=io.StringIO())
+            path = os.path.join(output, 'transactions', 'year=2023', 'month=%02d', 'data.parquet')
+
+            moved.date = date(2023, 3, 5)
+            moved.save()
+            deleted.delete()
+            call_command('export_snapshot', output, dataset=['transactions'], stdout=io.StringIO())
+
+            self.assertFalse(os.path.exists(path % 1))
+            self.assertFalse(os.path.exists(path % 2))
+            self.assertEqual(pq.read_table(path % 3).column('id').to_pylist(), [moved.pk])
+
+
+class BudgetTestCase(TestCase):
+    def setUp(self):
+        from .models.budget import Budget
+        self.household = TransactionCategory.objects.create(name="Household", transaction_type="expense")
+        self.rent = TransactionCategory.objects.create(name="Rent", transaction_type="expense", parent=self.household)
+        self.account = Account.objects.create(
+            name="Budget Account",
+            account_type="checking",
+            initial_balance=Decimal('5000.00'),
+            institution="Test Bank"
+        )
+        self.budget = Budget.objects.create(name="Casa", category=self.household, amount=Decimal('1000.00'))
+        self.today = date.today()
+
+    def expense(self, amount, category=None):
+        return Transaction.objects.create(
+            account=self.account, date=self.today, amount=Decimal(amount),
+            transaction_type="expense", category=category or self.rent
+        )
+
+    def test_counter_follows_subcategory_writes(self):
+        """Creating, updating and deleting subcategory expenses moves the counter."""
+        first = self.expense('300.00')
+        self.expense('100.00', category=self.household)
+        self.assertEqual(self.budget.remaining(self.today.year, self.today.month), Decimal('600.00'))
+
+        first.amount = Decimal('250.00')
+        first.save()
+        self.assertEqual(self.budget.remaining(self.today.year, self.today.month), Decimal('650.00'))
+
+        first.delete()
+        self.assertEqual(self.budget.remaining(self.today.year, self.today.month), Decimal('900.00'))
+
+    def test_threshold_alert_emitted_once(self):
+        """Crossing the alert threshold sends a single signal per level."""
+        from .signals import budget_threshold_crossed
+        received = []
+
+        def receiver(sender, budget, period, level, **kwargs):
+            received.append(level)
+
+        budget_threshold_crossed.connect(receiver)
+        try:
+            with self.assertLogs('transactions.services.budgets', level='WARNING'):
+                self.expense('500.00')
+                self.expense('350.00')
+                self.expense('10.00')
+                self.expense('200.00')
+        finally:
+            budget_threshold_crossed.disconnect(receiver)
+        self.assertEqual(received, [1, 2])
+
+    def test_counters_follow_scope_changes(self):
+        """Reactivation, scope and hierarchy changes refresh existing counters."""
+        month = (self.today.year, self.today.month)
+        self.expense('300.00')
+        self.assertEqual(self.budget.remaining(*month), Decimal('700.00'))
+
+        self.budget.is_active = False
+        self.budget.save()
+        self.expense('100.00')
+        self.budget.is_active = True
+        self.budget.save()
+        self.assertEqual(self.budget.remaining(*month), Decimal('600.00'))
+
+        self.rent.parent = None
+        self.rent.save()
+        self.assertEqual(self.budget.remaining(*month), Decimal('1000.00'))
+
+        self.budget.category = self.rent
+        self.budget.save()
+        self.assertEqual(self.budget.remaining(*month), Decimal('600.00'))
+
+    def test_parent_map_is_cached_until_categories_change(self):
+        from .services.budgets import category_parents
+        category_parents()
+        with self.assertNumQueries(0):
+            self.assertEqual(category_parents()[self.rent.pk], self.household.pk)
+        self.rent.parent = None
+        self.rent.save()
+        self.assertIsNone(category_parents()[self.rent.pk])
+
+    def test_refresh_after_close_keeps_archived_spend(self):
+        from .services.archive import clear_closed_until, close_period
+        from .services.budgets import refresh_periods
+        self.addCleanup(clear_closed_until, sender=None)
+        Transaction.objects.create(
+            account=self.account, date=date(2023, 1, 10), amount=Decimal('300.00'),
+            transaction_type="expense", category=self.rent
+        )
+        close_period(date(2023, 1, 31))
+        refresh_periods([self.budget])
+        self.assertEqual(self.budget.remaining(2023, 1), Decimal('700.00'))
+
+
+class ForecastTestCase(TestCase):
+    def setUp(self):
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Forecast Account",
+            account_type="checking",
+            initial_balance=Decimal('1000.00'),
+            institution="Test Bank"
+        )
+
+    def test_forecast_combines_scheduled_and_seasonal(self):
+        """Scheduled rows are used as-is and seasonal averages fill the other categories."""
+        from .models.aggregated import MonthlyTransactionAggregation
+        from .services.forecast import forecast_balances
+        as_of = date(2024, 6, 15)
+        # Spesa storica di 100 ogni luglio negli ultimi due anni
+        for year in (2022, 2023):
+            Transaction.objects.create(
+                account=self.account, date=date(year, 7, 5), amount=Decimal('100.00'),
+                transaction_type="expense", category=self.groceries
+            )
+        # Stipendio già programmato a luglio
+        Transaction.objects.create(
+            account=self.account, date=date(2024, 7, 27), amount=Decimal('500.00'),
+            transaction_type="income", category=self.salary
+        )
+        MonthlyTransactionAggregation.aggregate_transactions()
+
+        result = forecast_balances(months=2, accounts=[self.account.id], as_of=as_of)
+        self.assertEqual(result['periods'], [date(2024, 7, 31), date(2024, 8, 31)])
+        # 1000 - 200 storici + 500 - 100 (media di luglio sulla finestra di 24 mesi)
+        self.assertEqual(result['balances'][self.account.id], [Decimal('1200.00'), Decimal('1200.00')])
+
+    def test_forecast_hypothetical_rule(self):
+        """Recurring rules passed by the caller are expanded over the horizon."""
+        from .services.forecast import forecast_balances
+        result = forecast_balances(
+            months=3, accounts=[self.account.id], as_of=date(2024, 1, 10),
+            rules=[{
+                'account': self.account.id, 'amount': '50.00', 'transaction_type': 'expense',
+                'frequency': 'monthly', 'start_date': date(2024, 2, 1),
+            }],
+        )
+        self.assertEqual(
+            result['balances'][self.account.id],
+            [Decimal('950.00'), Decimal('900.00'), Decimal('850.00')],
+        )
+
+    def test_forecast_projects_detected_recurring_series(self):
+        """A monthly series that started recently is projected at its full amount."""
+        from .models.aggregated import MonthlyTransactionAggregation
+        from .services.forecast import forecast_balances
+        for month in (3, 4, 5):
+            Transaction.objects.create(
+                account=self.account, date=date(2024, month, 5), amount=Decimal('700.00'),
+                transaction_type="expense", category=self.groceries
+            )
+        MonthlyTransactionAggregation.aggregate_transactions()
+        result = forecast_balances(months=2, accounts=[self.account.id], as_of=date(2024, 6, 15))
+        self.assertEqual(result['balances'][self.account.id], [Decimal('-1800.00'), Decimal('-2500.00')])
+
+    def test_detect_recurring_cadences(self):
+        import numpy as np
+        from .services.forecast import ANNUAL, MONTHLY, NOT_RECURRING, WEEKLY, detect_recurring
+        counts = np.array([
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1],
+            [4, 4, 5, 4, 4, 5, 4, 5, 4, 4, 5, 4],
+            [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1],
+        ])
+        totals = counts * np.array([[-700], [-20], [-90], [-50]])
+        totals[3, -1] = -60
+        cadence, amount, last = detect_recurring(totals, counts, [31] * 12)
+        self.assertEqual(cadence.tolist(), [MONTHLY, WEEKLY, NOT_RECURRING, NOT_RECURRING])
+        self.assertEqual(amount[:2].tolist(), [-700, -20])
+
+        counts = np.zeros((1, 24), dtype=np.int64)
+        counts[0, [1, 13]] = 1
+        cadence, amount, last = detect_recurring(counts * -100, counts, [30] * 24)
+        self.assertEqual((cadence[0], last[0]), (ANNUAL, 13))
+
+
+class CurrencyTestCase(TestCase):
+    def setUp(self):
+        from .models.currency import ExchangeRate
+        from .services import fx
+        fx.rate_cache.clear()
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.eur = Account.objects.create(
+            name="Euro Account", account_type="checking",
+            initial_balance=Decimal('100.00'), institution="Test Bank"
+        )
+        self.usd = Account.objects.create(
+            name="Dollar Account", account_type="checking", currency="USD",
+            initial_balance=Decimal('200.00'), institution="Test Bank"
+        )
+        ExchangeRate.objects.create(currency="USD", date=date(2024, 1, 1), rate=Decimal('0.90'))
+        ExchangeRate.objects.create(currency="USD", date=date(2024, 3, 1), rate=Decimal('0.80'))
+
+    def test_transaction_takes_account_currency(self):
+        transaction = Transaction.objects.create(
+            account=self.usd, date=date(2024, 1, 5), amount=Decimal('10.00'),
+            transaction_type="income", category=self.salary
+        )
+        self.assertEqual(transaction.currency, "USD")
+        self.assertIn("$", str(transaction))
+        transaction.currency = "EUR"
+        transaction.clean()
+        self.assertEqual(transaction.currency, "USD")
+
+    def test_edit_into_account_with_another_currency(self):
+        """Moving a transaction to an account in another currency takes that currency."""
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        self.client.force_login(get_user_model().objects.create_user(username='fx', password='secret'))
+        transaction = Transaction.objects.create(
+            account=self.usd, date=date(2024, 1, 5), amount=Decimal('10.00'),
+            transaction_type="income", category=self.salary
+        )
+        response = self.client.post(reverse('transactions:transaction_detail_view', args=[transaction.pk]), {
+            'update_transaction': '', 'date': '2024-01-05', 'amount': '10.00', 'description': '',
+            'transaction_type': 'income', 'category': self.salary.pk, 'account': self.eur.pk,
+        })
+        self.assertRedirects(response, reverse('transactions:income_view'), fetch_redirect_response=False)
+        transaction.refresh_from_db()
+        self.assertEqual((transaction.account, transaction.currency), (self.eur, "EUR"))
+
+    def test_account_currency_change_updates_transactions(self):
+        transaction = Transaction.objects.create(
+            account=self.usd, date=date(2024, 1, 5), amount=Decimal('10.00'),
+            transaction_type="income", category=self.salary
+        )
+        self.usd.currency = "GBP"
+        self.usd.save()
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.currency, "GBP")
+
+    def test_rates_use_latest_previous_date(self):
+        from .services import fx
+        self.assertEqual(fx.get_rate("USD", date(2024, 2, 15)), Decimal('0.90'))
+        self.assertEqual(fx.convert(Decimal('100'), "USD", "EUR", date(2024, 3, 2)), Decimal('80.00'))
+        with self.assertRaises(fx.ExchangeRateMissing):
+            fx.get_rate("USD", date(2023, 12, 31))
+
+    def test_batched_conversion_single_query(self):
+        from .services import fx
+        items = [
+            (Decimal('100'), "USD", date(2024, 1, 10)),
+            (Decimal('100'), "USD", date(2024, 3, 10)),
+            (Decimal('100'), "EUR", date(2024, 3, 10)),
+        ]
+        with self.assertNumQueries(1):
+            converted = fx.convert_many(items, "EUR")
+        self.assertEqual(converted, [Decimal('90.00'), Decimal('80.00'), Decimal('100')])
+        # I tassi restano in cache
+        with self.assertNumQueries(0):
+            fx.convert_many(items, "EUR")
+
+    def test_rate_changes_elsewhere_invalidate_the_cache(self):
+        from .models.currency import ExchangeRate
+        from .services import fx
+        from .versioning import bump_version
+        self.assertEqual(fx.get_rate("USD", date(2024, 2, 15)), Decimal('0.90'))
+        # Scrittura di un altro processo: qui arriva solo il cambio di versione
+        ExchangeRate.objects.filter(date=date(2024, 1, 1)).update(rate=Decimal('0.95'))
+        self.assertEqual(fx.get_rate("USD", date(2024, 2, 15)), Decimal('0.90'))
+        bump_version(fx.VERSION_KEY)
+        self.assertEqual(fx.get_rate("USD", date(2024, 2, 15)), Decimal('0.95'))
+        ExchangeRate.objects.create(currency="USD", date=date(2024, 2, 1), rate=Decimal('0.85'))
+        self.assertEqual(fx.convert_many([(Decimal('100'), "USD", date(2024, 2, 15))], "EUR"), [Decimal('85.00')])
+
+    def test_balances_in_reporting_currency(self):
+        from .services import fx
+        from .services.reporting import report
+        self.assertEqual(self.usd.get_balance_at_date(date(2024, 3, 1), currency="EUR"), Decimal('160.00'))
+        Transaction.objects.create(
+            account=self.usd, date=date(2024, 3, 5), amount=Decimal('50.00'),
+            transaction_type="income", category=self.salary
+        )
+        Transaction.objects.create(
+            account=self.eur, date=date(2024, 3, 5), amount=Decimal('10.00'),
+            transaction_type="income", category=self.salary
+        )
+        total = fx.total_balance(
+            {self.eur: Decimal('100.00'), self.usd: Decimal('200.00')}, "EUR", date(2024, 3, 5)
+        )
+        self.assertEqual(total, Decimal('260.00'))
+        rows = report(
+            date(2024, 3, 5), date(2024, 3, 5), group_by=('transaction_type',),
+            edge_source='raw', currency="EUR",
+        )
+        self.assertEqual(rows, [{'transaction_type': 'income', 'total_amount': Decimal('50.00'), 'transaction_count': 2}])
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Search Account", account_type="checking",
+            initial_balance=Decimal('0.00'), institution="Test Bank"
+        )
+
+    def create(self, description, amount='10.00'):
+        return Transaction.objects.create(
+            account=self.account, date=date(2024, 1, 1), amount=Decimal(amount),
+            transaction_type="expense", category=self.groceries, description=description
+        )
+
+    def test_index_follows_writes(self):
+        from .services.search import get_backend
+        backend = get_backend()
+        bakery = self.create("Panetteria sotto casa")
+        market = self.create("Mercato rionale")
+        self.assertEqual(backend.search("panet"), [bakery.pk])
+        self.assertCountEqual(backend.search("groceries"), [bakery.pk, market.pk])
+
+        bakery.description = "Farmacia"
+        bakery.save()
+        self.assertEqual(backend.search("panetteria"), [])
+        self.assertEqual(backend.search("farmacia"), [bakery.pk])
+
+        market.delete()
+        self.assertEqual(backend.search("mercato"), [])
+
+        self.account.name = "Carta Prepagata"
+        self.account.save()
+        self.assertEqual(backend.search("prepagata"), [bakery.pk])
+
+    def test_results_are_ranked(self):
+        from .services.search import search_transactions
+        weak = self.create("Spesa")
+        strong = self.create("Spesa spesa spesa al mercato")
+        results = search_transactions(Transaction.objects.all(), "spesa")
+        self.assertEqual([transaction.pk for transaction in results], [strong.pk, weak.pk])
+
+    def test_filters_are_applied_before_the_limit(self):
+        """Matches of another type do not crowd out the requested ones."""
+        from .services.search import search_transactions
+        salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        for _ in range(5):
+            self.create("Bonifico spesa spesa spesa")
+        income = Transaction.objects.create(
+            account=self.account, date=date(2024, 1, 1), amount=Decimal('10.00'),
+            transaction_type="income", category=salary, description="Bonifico"
+        )
+        results = search_transactions(Transaction.objects.filter(transaction_type='income'), "bonifico", limit=2)
+        self.assertEqual(results, [income])
+
+    def test_admin_keeps_rank_order(self):
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        self.client.force_login(get_user_model().objects.create_superuser('search', 'search@example.com', 'secret'))
+        # La più recente viene prima nell'ordinamento predefinito
+        strong = self.create("Spesa spesa spesa al mercato")
+        weak = self.create("Spesa")
+        response = self.client.get(reverse('admin:transactions_transaction_changelist'), {'q': 'spesa'})
+        self.assertEqual([obj.pk for obj in response.context['cl'].result_list], [strong.pk, weak.pk])
+
+    def test_missing_index_table_is_created_on_write(self):
+        from django.db import connection
+        from .services.search import SEARCH_TABLE, get_backend
+        backend = get_backend()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {SEARCH_TABLE}")
+        backend.ready = False
+        try:
+            bakery = self.create("Panetteria")
+            self.assertEqual(backend.search("panetteria"), [bakery.pk])
+        finally:
+            backend.ensure_setup()
+
+
+class CategorizationTestCase(TestCase):
+    def setUp(self):
+        from .models.rules import CategorizationRule
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.fuel = TransactionCategory.objects.create(name="Fuel", transaction_type="expense")
+        self.rent = TransactionCategory.objects.create(name="Rent", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Rules Account", account_type="checking",
+            initial_balance=Decimal('0.00'), institution="Test Bank"
+        )
+        CategorizationRule.objects.create(
+            name="Supermarkets", pattern="esselunga, coop", transaction_type="expense", category=self.groceries
+        )
+        CategorizationRule.objects.create(
+            name="Fuel", match_type="regex", pattern=r"(?:eni|q8)\s+station", priority=50,
+            transaction_type="expense", category=self.fuel
+        )
+        self.big_rule = CategorizationRule.objects.create(
+            name="Big transfers", pattern="bonifico", min_amount=Decimal('500.00'), priority=10,
+            account=self.account, transaction_type="expense", category=self.rent
+        )
+
+    def tearDown(self):
+        # Il rollback del test non emette segnali: il matcher va invalidato a mano
+        from .services.categorization import invalidate_rules
+        invalidate_rules(sender=None)
+
+    def test_combined_matcher(self):
+        from .services.categorization import categorize
+        items = [
+            {'description': "COOP Milano", 'amount': '20.00', 'transaction_type': 'expense'},
+            {'description': "ENI  station 42", 'amount': '50.00', 'transaction_type': 'expense'},
+            {'description': "Bonifico affitto", 'amount': '800.00', 'transaction_type': 'expense', 'account': self.account.id},
+            {'description': "Bonifico affitto", 'amount': '100.00', 'transaction_type': 'expense', 'account': self.account.id},
+            {'description': "Cooperativa", 'amount': '5.00', 'transaction_type': 'expense'},
+        ]
+        self.assertEqual(
+            categorize(items),
+            [self.groceries.id, self.fuel.id, self.rent.id, None, None],
+        )
+
+    def test_matcher_cached_until_rules_change(self):
+        from .services.categorization import get_matcher
+        matcher = get_matcher()
+        with self.assertNumQueries(0):
+            self.assertIs(get_matcher(), matcher)
+        self.big_rule.delete()
+        self.assertIsNot(get_matcher(), matcher)
+        self.assertIsNone(get_matcher().categorize("Bonifico", Decimal('900'), self.account.id, 'expense'))
+
+    def test_bulk_import_uses_rules(self):
+        from .services.bulk import apply_bulk
+        results = apply_bulk([
+            {'account': self.account.id, 'date': '2024-01-01', 'amount': '12.00',
+             'transaction_type': 'expense', 'description': "Esselunga"},
+            {'account': self.account.id, 'date': '2024-01-01', 'amount': '12.00',
+             'transaction_type': 'expense', 'description': "Sconosciuto"},
+        ])
+        self.assertEqual([result['status'] for result in results], ['created', 'error'])
+        self.assertEqual(Transaction.objects.get(pk=results[0]['id']).category, self.groceries)
+
+    def test_regex_rules_must_not_capture(self):
+        from .models.rules import CategorizationRule
+        rule = CategorizationRule(
+            name="Bad", match_type="regex", pattern="(eni)", transaction_type="expense", category=self.fuel
+        )
+        with self.assertRaises(ValidationError):
+            rule.clean()
+
+    def test_invalid_combined_regex_is_rejected_and_skipped(self):
+        """Global inline flags fail validation, and a saved bad rule does not break the others."""
+        from .models.rules import CategorizationRule
+        from .services.categorization import categorize
+        rule = CategorizationRule(
+            name="Amazon", match_type="regex", pattern="(?i)amazon", transaction_type="expense", category=self.groceries
+        )
+        with self.assertRaises(ValidationError):
+            rule.clean()
+
+        # Salvata senza clean(), la regola viene scartata dal matcher
+        rule.save()
+        with self.assertLogs('transactions.services.categorization', level='WARNING'):
+            self.assertEqual(
+                categorize([{'description': "ENI station", 'amount': '50.00', 'transaction_type': 'expense'},
+                            {'description': "Amazon", 'amount': '50.00', 'transaction_type': 'expense'}]),
+                [self.fuel.id, None],
+            )
+
+
+class PartitioningTestCase(TestCase):
+    def test_partition_bounds(self):
+        from .services.partitioning import partition_bounds, horizon
+        table = Transaction._meta.db_table
+        self.assertEqual(
+            partition_bounds(date(2023, 6, 1), date(2024, 2, 1)),
+            [(f'{table}_y2023', date(2023, 1, 1), date(2024, 1, 1)),
+             (f'{table}_y2024', date(2024, 1, 1), date(2025, 1, 1))],
+        )
+        monthly = partition_bounds(date(2024, 11, 15), horizon(date(2024, 11, 15), 2, 'monthly'), 'monthly')
+        self.assertEqual([name for name, _, _ in monthly], [
+            f'{table}_y2024m11', f'{table}_y2024m12', f'{table}_y2025m01',
+        ])
+        self.assertEqual(monthly[-1][2], date(2025, 2, 1))
+
+    def test_command_requires_postgresql(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            self.skipTest("Runs only on databases without partitioning support")
+        with self.assertRaises(CommandError):
+            call_command('partition_transactions', '--convert')
+
+    def test_convert_refuses_to_drop_foreign_keys(self):
+        """Conversion stops on referencing foreign keys unless asked to drop them."""
+        from django.db import connection
+        from .models.anomaly import TransactionAnomaly
+        from .services.partitioning import PartitioningError, convert_table, is_partitioned
+        if connection.vendor != 'postgresql':
+            self.skipTest("Table partitioning requires PostgreSQL")
+        category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        account = Account.objects.create(
+            name="Partitioned Account", account_type="checking",
+            initial_balance=Decimal('0.00'), institution="Test Bank"
+        )
+        transaction = Transaction.objects.create(
+            account=account, date=date(2024, 1, 10), amount=Decimal('10.00'),
+            transaction_type="expense", category=category
+        )
+        TransactionAnomaly.objects.create(transaction=transaction, new_description=True)
+
+        with self.assertRaises(PartitioningError):
+            convert_table()
+        _, dropped = convert_table(drop_foreign_keys=True)
+        self.assertIn(TransactionAnomaly._meta.db_table, [table.strip('"') for table, _ in dropped])
+        with connection.cursor() as cursor:
+            self.assertTrue(is_partitioned(cursor))
+
+        # Le cancellazioni a cascata restano a carico dell'ORM
+        transaction.delete()
+        self.assertFalse(TransactionAnomaly.objects.exists())
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Archive Account", account_type="checking",
+            initial_balance=Decimal('1000.00'), institution="Test Bank"
+        )
+        for day, amount, transaction_type, category in (
+            (date(2022, 3, 1), '500.00', 'income', self.salary),
+            (date(2022, 9, 1), '200.00', 'expense', self.groceries),
+            (date(2023, 2, 1), '100.00', 'expense', self.groceries),
+        ):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal(amount),
+                transaction_type=transaction_type, category=category, description="Archivio"
+            )
+
+    def tearDown(self):
+        from .services.archive import clear_closed_until
+        clear_closed_until(sender=None)
+
+    def test_close_moves_rows_and_keeps_balances(self):
+        from .models.archive import ArchivedTransaction
+        from .services.archive import close_period
+        from .services.search import get_backend
+        period = close_period(date(2022, 12, 31))
+        self.assertEqual(period.archived_count, 2)
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 1)
+        self.assertEqual(ArchivedTransaction.objects.filter(account=self.account).count(), 2)
+        self.assertEqual(len(get_backend().search("archivio")), 1)
+
+        # Dopo la chiusura, prima della chiusura e tra le due righe archiviate
+        self.assertEqual(self.account.get_balance_at_date(date(2023, 6, 1)), Decimal('1200.00'))
+        self.assertEqual(self.account.get_balance_at_date(date(2022, 6, 1)), Decimal('1500.00'))
+        balances = {
+            day: Account.objects.with_balance(day).get(pk=self.account.pk).balance
+            for day in (date(2023, 6, 1), date(2022, 6, 1), date(2022, 12, 31))
+        }
+        self.assertEqual(balances, {
+            date(2023, 6, 1): Decimal('1200'), date(2022, 6, 1): Decimal('1500'), date(2022, 12, 31): Decimal('1300'),
+        })
+        self.assertEqual(list(self.account.get_daily_balances().values()), [Decimal('1200.00')])
+
+    def test_closed_dates_are_rejected(self):
+        from .services.archive import ArchiveError, close_period
+        close_period(date(2022, 12, 31))
+        with self.assertRaises(ArchiveError):
+            close_period(date(2022, 6, 30))
+        transaction = Transaction(
+            account=self.account, date=date(2022, 5, 1), amount=Decimal('1.00'),
+            transaction_type='expense', category=self.groceries
+        )
+        with self.assertRaises(ValidationError):
+            transaction.clean()
+
+    def test_closed_dates_are_cached_for_balances(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models.archive import ClosedPeriod
+        from .services.archive import close_period
+        close_period(date(2022, 12, 31))
+        self.account.get_balance_at_date(date(2023, 6, 1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.account.get_balance_at_date(date(2023, 6, 1)), Decimal('1200.00'))
+        table = ClosedPeriod._meta.db_table
+        self.assertFalse([query for query in queries if f'FROM "{table}"' in query['sql']])
+
+    def test_rebuild_after_close_keeps_archived_totals(self):
+        from .models.aggregated import DailyTransactionAggregation, YearlyTransactionAggregation
+        from .services.archive import close_period
+        Transaction.objects.create(
+            account=self.account, date=date(2023, 5, 1), amount=Decimal('40.00'),
+            transaction_type='expense', category=self.groceries
+        )
+        close_period(date(2023, 3, 31))
+        YearlyTransactionAggregation.aggregate_transactions(year=2023)
+        DailyTransactionAggregation.aggregate_transactions(date(2022, 1, 1), date(2022, 12, 31))
+
+        row = YearlyTransactionAggregation.objects.get(account=self.account, year=2023, transaction_type='expense')
+        self.assertEqual((row.total_amount, row.transaction_count), (Decimal('140.00'), 2))
+        self.assertEqual(row.average_transaction_amount, Decimal('70.00'))
+        self.assertEqual(DailyTransactionAggregation.objects.filter(account=self.account).count(), 2)
+
+    def test_archived_rows_are_exported(self):
+        import importlib.util
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from .services.archive import close_period
+        if importlib.util.find_spec('pyarrow') is None:
+            self.skipTest("pyarrow is not installed")
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as output:
+            datasets = ['transactions', 'archived_transactions']
+            call_command('export_snapshot', output, dataset=datasets, stdout=io.StringIO())
+            close_period(date(2022, 12, 31))
+            call_command('export_snapshot', output, dataset=datasets, stdout=io.StringIO())
+            partition = os.path.join('year=2022', 'month=03', 'data.parquet')
+            self.assertFalse(os.path.exists(os.path.join(output, 'transactions', partition)))
+            self.assertEqual(pq.read_table(os.path.join(output, 'archived_transactions', partition)).num_rows, 1)
+
+
+class IndexAuditTestCase(TestCase):
+    def test_hot_paths_use_indexes(self):
+        from django.db import connection
+        from .services.index_audit import SEQUENTIAL, audit
+        if connection.vendor != 'sqlite':
+            # PostgreSQL preferisce letture complete sulle tabelle quasi vuote dei test
+            self.skipTest("Plans are only stable on SQLite with empty tables")
+        results = audit(['income_list', 'account_balance'])
+        transaction_table = Transaction._meta.db_table
+        for name, queries in results.items():
+            self.assertTrue(queries)
+            for sql, plan, findings in queries:
+                for kind, line in findings:
+                    if transaction_table in line:
+                        self.assertNotEqual(kind, SEQUENTIAL, f"{name}: {line}")
+
+
+class AggregationUpsertTestCase(TestCase):
+    def test_rebuild_updates_existing_rows(self):
+        from .models.aggregated import MonthlyTransactionAggregation
+        category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        account = Account.objects.create(
+            name="Upsert Account", account_type="checking",
+            initial_balance=Decimal('0.00'), institution="Test Bank"
+        )
+        transaction = Transaction.objects.create(
+            account=account, date=date(2024, 5, 3), amount=Decimal('10.00'),
+            transaction_type="expense", category=category
+        )
+        MonthlyTransactionAggregation.aggregate_transactions(year=2024, month=5)
+        Transaction.objects.create(
+            account=account, date=date(2024, 5, 9), amount=Decimal('30.00'),
+            transaction_type="expense", category=category
+        )
+        MonthlyTransactionAggregation.aggregate_transactions(year=2024, month=5)
+
+        row = MonthlyTransactionAggregation.objects.get(account=account, year=2024, month=5)
+        self.assertEqual((row.total_amount, row.transaction_count), (Decimal('40.00'), 2))
+        self.assertEqual(row.average_transaction_amount, Decimal('20.00'))
+        self.assertEqual(MonthlyTransactionAggregation.objects.filter(account=account).count(), 1)
+
+
+class JobsTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from .services import jobs
+        self.user = get_user_model().objects.create_user(username='jobs', password='secret')
+        self.category = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.account = Account.objects.create(
+            name="Jobs Account", account_type="checking",
+            initial_balance=Decimal('0.00'), institution="Test Bank"
+        )
+        self.calls = 0
+
+        @jobs.task('tests.flaky')
+        def flaky():
+            self.calls += 1
+            raise RuntimeError("boom")
+
+    def tearDown(self):
+        from .services import jobs
+        jobs.TASKS.pop('tests.flaky', None)
+
+    def test_enqueue_deduplicates_active_jobs(self):
+        from .models.jobs import Job
+        from .services import jobs
+        first = jobs.enqueue('aggregations.rebuild', {'period': 'monthly', 'year': 2025}, key='rebuild monthly 2025')
+        second = jobs.enqueue('aggregations.rebuild', {'period': 'monthly', 'year': 2025}, key='rebuild monthly 2025')
+        self.assertEqual(first.pk, second.pk)
+
+        self.assertEqual(jobs.claim('test'), [first.pk])
+        self.assertEqual(jobs.run(first.pk), Job.SUCCEEDED)
+        # Concluso il primo, la stessa chiave può essere accodata di nuovo
+        third = jobs.enqueue('aggregations.rebuild', {'period': 'monthly', 'year': 2025}, key='rebuild monthly 2025')
+        self.assertNotEqual(third.pk, first.pk)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        from .models.jobs import Job
+        from .services import jobs
+        job = jobs.enqueue('tests.flaky', max_attempts=2)
+
+        jobs.claim('test')
+        with self.assertLogs('transactions.services.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(job.pk), Job.QUEUED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("boom", job.last_error)
+        self.assertGreaterEqual(job.run_after, timezone.now() + timedelta(seconds=jobs.backoff(1) - 5))
+        # In attesa del backoff il lavoro non viene prenotato
+        self.assertEqual(jobs.claim('test'), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.claim('test')
+        with self.assertLogs('transactions.services.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(job.pk), Job.FAILED)
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_jobs_fail_after_last_attempt(self):
+        """A job whose worker dies on every attempt is not requeued forever."""
+        from .models.jobs import Job
+        from .services import jobs
+        retried = jobs.enqueue('tests.flaky', max_attempts=2)
+        exhausted = jobs.enqueue('tests.flaky', max_attempts=1)
+        jobs.claim('test', limit=2)
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=jobs.JOB_STALE_AFTER + 1))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((retried.status, exhausted.status), (Job.QUEUED, Job.FAILED))
+
+    def test_release_records_lost_results(self):
+        """Jobs whose executor died are requeued or failed like a raised error."""
+        from .models.jobs import Job
+        from .services import jobs
+        job = jobs.enqueue('tests.flaky', max_attempts=1)
+        jobs.claim('test')
+        self.assertEqual(jobs.release(job.pk, "BrokenProcessPool: terminated"), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.last_error, "BrokenProcessPool: terminated")
+        self.assertIsNone(jobs.release(job.pk, "again"))
+
+    def test_long_recurring_series_is_queued(self):
+        from django.urls import reverse
+        from .services import jobs
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('transactions:income_view'), {
+            'create_recurring_transaction': '1',
+            'account': self.account.pk,
+            'category': self.category.pk,
+            'amount': '10.00',
+            'description': 'Daily',
+            'start_date': '2024-01-01',
+            'end_date': '2024-12-31',
+            'transaction_type': 'income',
+            'frequency': 'daily',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Transaction.objects.exists())
+
+        job_id, = jobs.claim('test')
+        jobs.run(job_id)
+        self.assertEqual(Transaction.objects.filter(description='Daily').count(), 366)
+
+
+class JobWorkerTestCase(TransactionTestCase):
+    def test_run_jobs_once(self):
+        import io
+        from django.core.management import call_command
+        from .models.jobs import Job
+        from .services import jobs
+        job = jobs.enqueue('aggregations.rebuild', {'period': 'yearly'}, key='rebuild yearly all')
+        call_command('run_jobs', '--once', '--workers', '1', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+
+
+class SeedTestCase(TestCase):
+    def test_seed_applied_on_migrate(self):
+        from .services.seed import apply_seed
+        self.assertTrue(TransactionCategory.objects.filter(name="Transfer Commission", transaction_type="expense").exists())
+        self.assertTrue(Account.objects.filter(name="Contanti").exists())
+        # Definizione invariata: una sola query di controllo
+        with self.assertNumQueries(1):
+            self.assertIsNone(apply_seed())
+
+    def test_force_creates_only_missing_rows(self):
+        from .services.seed import apply_seed
+        TransactionCategory.objects.filter(name="Transfer Income").delete()
+        Account.objects.create(name="Other", account_type="checking", initial_balance=Decimal('0.00'), institution="Bank")
+        Account.objects.filter(name="Contanti").delete()
+
+        created = apply_seed(force=True)
+        self.assertEqual(created, {TransactionCategory: 1, Account: 0})
+        self.assertEqual(TransactionCategory.objects.filter(name="Transfer Income").count(), 1)
+        # Il conto iniziale non viene ricreato se esistono già altri conti
+        self.assertFalse(Account.objects.filter(name="Contanti").exists())
+
+    def test_seed_can_be_skipped(self):
+        from django.test import override_settings
+        from .models.seed import SeedVersion
+        from .services.seed import seed_defaults
+        SeedVersion.objects.all().delete()
+        TransactionCategory.objects.filter(name="Transfer Income").delete()
+        with override_settings(TRANSACTIONS_SEED_ON_MIGRATE=False):
+            seed_defaults(sender=None)
+        self.assertFalse(TransactionCategory.objects.filter(name="Transfer Income").exists())
+        seed_defaults(sender=None)
+        self.assertTrue(TransactionCategory.objects.filter(name="Transfer Income").exists())
+
+    def test_seed_skipped_on_rollback(self):
+        from django.db.migrations import Migration
+        from .models.seed import SeedVersion
+        from .services.seed import seed_defaults
+        SeedVersion.objects.all().delete()
+        TransactionCategory.objects.filter(name="Transfer Income").delete()
+        seed_defaults(sender=None, plan=[(Migration('0001_initial', 'transactions'), True)])
+        self.assertFalse(TransactionCategory.objects.filter(name="Transfer Income").exists())
+
+
+class FormChoicesTestCase(TestCase):
+    def setUp(self):
+        self.home = TransactionCategory.objects.create(name="Home", transaction_type="expense")
+        self.rent = TransactionCategory.objects.create(name="Rent", transaction_type="expense", parent=self.home)
+        TransactionCategory.objects.bulk_create([
+            TransactionCategory(name=f"Bill {n}", transaction_type="expense", parent=self.rent) for n in range(2000)
+        ])
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.account = Account.objects.create(
+            name="Choices Account", account_type="checking",
+            initial_balance=Decimal('0.00'), institution="Test Bank"
+        )
+
+    def test_options_render_without_queries(self):
+        from .forms import TransactionForm, RecurringTransactionForm
+        TransactionForm(transaction_type='expense').as_p()
+        with self.assertNumQueries(0):
+            html = TransactionForm(transaction_type='expense').as_p()
+            RecurringTransactionForm(transaction_type='expense').as_p()
+        self.assertIn("Home &gt; Rent &gt; Bill 1999", html)
+        self.assertNotIn("Salary", html)
+
+    def test_saving_refreshes_options_and_validation_uses_queryset(self):
+        from .forms import TransactionForm
+        TransactionForm(transaction_type='income').as_p()
+        bonus = TransactionCategory.objects.create(name="Bonus", transaction_type="income")
+        self.assertIn("Bonus", TransactionForm(transaction_type='income').as_p())
+
+        form = TransactionForm({
+            'date': '2024-01-01', 'amount': '10.00', 'transaction_type': 'income',
+            'category': self.rent.pk, 'account': self.account.pk,
+        }, transaction_type='income')
+        self.assertFalse(form.is_valid())
+        self.assertIn('category', form.errors)
+        bonus.delete()
+
+    def test_admin_bulk_actions_and_ttl_refresh_options(self):
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        from .services import choices
+        self.assertIn(self.account.pk, dict(choices.account_choices()))
+        self.client.force_login(get_user_model().objects.create_superuser(username='admin', password='secret'))
+        self.client.post(reverse('admin:transactions_account_changelist'), {
+            'action': 'mark_as_inactive', '_selected_action': [self.account.pk],
+        })
+        self.assertNotIn(self.account.pk, dict(choices.account_choices()))
+
+        # Un altro processo non vede il cambio di versione: conta la scadenza
+        Account.objects.filter(pk=self.account.pk).update(is_active=True)
+        version, built_at, lists = choices._cached
+        choices._cached = (version, built_at - choices.CHOICES_TTL - 1, lists)
+        self.assertIn(self.account.pk, dict(choices.account_choices()))
+
+
+class AdminPerformanceTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        self.user = get_user_model().objects.create_superuser(username='admin', password='secret')
+        self.category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.accounts = [
+            Account.objects.create(
+                name=f"Admin Account {n}", account_type="checking",
+                initial_balance=Decimal('100.00'), institution="Test Bank"
+            )
+            for n in range(3)
+        ]
+        for account in self.accounts:
+            Transaction.objects.create(
+                account=account, date=date(2024, 5, 10), amount=Decimal('30.00'),
+                transaction_type="expense", category=self.category
+            )
+
+    def tearDown(self):
+        from django.core.cache import cache
+        cache.delete('transactions:admin_months:transactions.transaction')
+
+    def changelist(self, model_admin, **params):
+        from django.test import RequestFactory
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return model_admin.get_changelist_instance(request)
+
+    def test_account_balances_are_annotated(self):
+        from django.contrib.admin.sites import AdminSite
+        from .admin import AccountAdmin
+        model_admin = AccountAdmin(Account, AdminSite())
+        accounts = list(self.changelist(model_admin).result_list)
+        with self.assertNumQueries(0):
+            for account in accounts:
+                model_admin.current_balance(account)
+        balances = {account.pk: account.balance for account in accounts}
+        for account in self.accounts:
+            self.assertEqual(balances[account.pk], Decimal('70.00'))
+
+    def test_performance_mode_filters(self):
+        from django.contrib.admin.sites import AdminSite
+        from django.test import override_settings
+        from .admin import TransactionAdmin
+        with override_settings(TRANSACTIONS_ADMIN_PERFORMANCE_MODE=True):
+            model_admin = TransactionAdmin(Transaction, AdminSite())
+        self.assertIsNone(model_admin.date_hierarchy)
+
+        changelist = self.changelist(model_admin, **{'account__id__exact': self.accounts[1].pk, 'period': '2024-05'})
+        self.assertEqual([t.account_id for t in changelist.result_list], [self.accounts[1].pk])
+        # Le date del filtro vengono dalla cache: resta solo il conteggio
+        with self.assertNumQueries(1):
+            changelist = self.changelist(model_admin, period='2024')
+        self.assertEqual(changelist.result_count, 3)
+        self.assertEqual(self.changelist(model_admin, period='2023-01').result_count, 0)
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Ledger Account", account_type="checking",
+            initial_balance=Decimal('100.00'), institution="Test Bank"
+        )
+
+    def create(self, amount, transaction_type='expense'):
+        return Transaction.objects.create(
+            account=self.account, date=date(2024, 1, 15), amount=Decimal(amount), transaction_type=transaction_type,
+            category=self.salary if transaction_type == 'income' else self.groceries,
+        )
+
+    def test_edits_append_entries_and_balance_is_known_at_any_moment(self):
+        from .models.ledger import LedgerEntry
+        from .services.ledger import balance_known_at
+        transaction = self.create('30.00')
+        after_create = timezone.now()
+        transaction.amount = Decimal('50.00')
+        transaction.save()
+        after_update = timezone.now()
+        transaction.description = "Solo descrizione"
+        transaction.save()
+        transaction.delete()
+
+        kinds = list(LedgerEntry.objects.filter(account=self.account).values_list('kind', 'amount'))
+        self.assertEqual(kinds, [
+            ('created', Decimal('-30.00')), ('reversed', Decimal('30.00')),
+            ('created', Decimal('-50.00')), ('reversed', Decimal('50.00')),
+        ])
+        self.assertEqual(balance_known_at(self.account, after_create), Decimal('70.00'))
+        self.assertEqual(balance_known_at(self.account, after_update), Decimal('50.00'))
+        self.assertEqual(balance_known_at(self.account), Decimal('100.00'))
+        self.assertEqual(balance_known_at(self.account, after_update, on_date=date(2023, 12, 31)), Decimal('100.00'))
+
+    def test_rebuild_with_snapshots_replays_from_nearest_snapshot(self):
+        from .models.ledger import LedgerSnapshot
+        from .services.ledger import balance_known_at, rebuild
+        for amount in ('10.00', '20.00', '30.00', '40.00', '50.00'):
+            self.create(amount, 'income')
+
+        self.assertEqual(rebuild(snapshot_every=2), 5)
+        self.assertEqual(
+            list(LedgerSnapshot.objects.filter(account=self.account).values_list('sequence', 'total')),
+            [(2, Decimal('30.00')), (4, Decimal('100.00'))],
+        )
+        # Istantanea al progressivo 4 più il solo quinto movimento
+        with self.assertNumQueries(2):
+            self.assertEqual(balance_known_at(self.account), Decimal('250.00'))
+
+
+class ReconciliationTestCase(TestCase):
+    def setUp(self):
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Reconcile Account", account_type="checking",
+            initial_balance=Decimal('100.00'), institution="Test Bank"
+        )
+        for day, amount, transaction_type, category in (
+            (date(2024, 1, 5), '1000.00', 'income', self.salary),
+            (date(2024, 2, 3), '45.00', 'expense', self.groceries),
+            (date(2024, 2, 20), '12.50', 'expense', self.groceries),
+            (date(2024, 3, 9), '80.00', 'expense', self.groceries),
+        ):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal(amount),
+                transaction_type=transaction_type, category=category
+            )
+
+    def test_balances_for_all_dates_in_one_pass(self):
+        from .services.archive import closed_dates
+        from .services.reconciliation import balances_at
+        dates = [date(2023, 12, 31), date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)]
+        # Archivio e transazioni correnti; le date di chiusura sono in cache
+        closed_dates()
+        with self.assertNumQueries(2):
+            balances = balances_at(self.account, dates)
+        self.assertEqual(balances, {
+            date(2023, 12, 31): Decimal('100.00'),
+            date(2024, 1, 31): Decimal('1100.00'),
+            date(2024, 2, 29): Decimal('1042.50'),
+            date(2024, 3, 31): Decimal('962.50'),
+        })
+        for day in dates:
+            self.assertEqual(balances[day], self.account.get_balance_at_date(day))
+
+    def test_first_divergence_and_candidates(self):
+        from .services.reconciliation import reconcile
+        # L'estratto non contiene la spesa da 12,50 di febbraio
+        result = reconcile(self.account, [
+            (date(2024, 1, 31), '1100.00'),
+            (date(2024, 2, 29), '1055.00'),
+            (date(2024, 3, 31), '975.00'),
+        ])
+        self.assertEqual(result.first_divergence.date, date(2024, 2, 29))
+        self.assertEqual(result.first_divergence.difference, Decimal('-12.50'))
+        self.assertEqual(result.last_match.date, date(2024, 1, 31))
+        self.assertEqual([t.amount for t in result.candidates], [Decimal('12.50'), Decimal('45.00')])
+
+
+class AnalyticsTestCase(TestCase):
+    def setUp(self):
+        import importlib.util
+        if importlib.util.find_spec('numpy') is None:
+            self.skipTest("numpy is not installed")
+        self.food = TransactionCategory.objects.create(name="Food", transaction_type="expense")
+        self.groceries = TransactionCategory.objects.create(
+            name="Groceries", transaction_type="expense", parent=self.food
+        )
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.account = Account.objects.create(
+            name="Analytics Account", account_type="checking",
+            initial_balance=Decimal('100.00'), institution="Test Bank"
+        )
+        for day, amount, transaction_type, category in (
+            (date(2024, 1, 5), '1000.00', 'income', self.salary),
+            (date(2024, 1, 5), '20.00', 'expense', self.food),
+            (date(2024, 1, 20), '45.10', 'expense', self.groceries),
+            (date(2024, 2, 3), '12.50', 'expense', self.groceries),
+        ):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal(amount),
+                transaction_type=transaction_type, category=category
+            )
+
+    def test_columns_are_compact(self):
+        from .services.analytics import load
+        frame = load(Transaction.objects.filter(account=self.account), chunk_size=3)
+        self.assertEqual(len(frame), 4)
+        self.assertEqual(str(frame.day.dtype), 'int32')
+        self.assertEqual(str(frame.cents.dtype), 'int64')
+        self.assertEqual(frame.account.itemsize, 1)
+        self.assertEqual(sorted(frame.cents.tolist()), [1250, 2000, 4510, 100000])
+
+    def test_group_by_month_and_pivot_by_hierarchy(self):
+        from .services.analytics import load, to_decimal
+        from .services.budgets import category_parents
+        frame = load(Transaction.objects.filter(account=self.account))
+
+        keys, totals = frame.where(transaction_type='expense').group_by('category', signed=False)
+        self.assertEqual(dict(zip(keys[:, 0].tolist(), totals.tolist())), {
+            self.food.id: 2000, self.groceries.id: 5760,
+        })
+
+        categories, periods, table = frame.pivot_categories(category_parents(), signed=False)
+        rows = dict(zip(categories.tolist(), table.tolist()))
+        self.assertEqual(len(periods), 2)
+        self.assertEqual(rows[self.food.id], [6510, 1250])
+        self.assertEqual(rows[self.groceries.id], [4510, 1250])
+        self.assertEqual(to_decimal(rows[self.salary.id][0]), Decimal('1000.00'))
+
+    def test_load_tolerates_rows_beyond_count_and_unknown_categories(self):
+        import numpy as np
+        from .services.analytics import _fill, load
+        columns = [np.empty(0, dtype=dtype) for dtype in (np.int32, np.int64, np.int64, np.int64, np.int8)]
+        row = (date(2024, 3, 1), Decimal('1.00'), self.account.id, self.food.id, 'expense')
+        self.assertEqual(_fill([row], 0, *columns), 0)
+        self.assertEqual(len(load(Transaction.objects.none())), 0)
+
+        frame = load(Transaction.objects.filter(account=self.account))
+        categories, _, table = frame.pivot_categories({self.food.id: None}, signed=False)
+        rows = dict(zip(categories.tolist(), table.tolist()))
+        self.assertEqual(rows[self.groceries.id], [4510, 1250])
+        self.assertEqual(rows[self.food.id], [2000, 0])
+
+    def test_cumulative_balances_match_account(self):
+        from .services.analytics import load, to_day
+        frame = load()
+        days, balances = frame.cumulative_balances(self.account.id, opening_cents=10000)
+        self.assertEqual(days.tolist(), [to_day(date(2024, 1, 5)), to_day(date(2024, 1, 20)), to_day(date(2024, 2, 3))])
+        self.assertEqual(balances[-1], int(self.account.get_balance_at_date(date(2024, 2, 3)) * 100))
+
+
+class CentsFieldTestCase(TestCase):
+    def test_amounts_round_trip_as_integer_cents(self):
+        from .models.fields import CentsField
+        field = CentsField(max_digits=10, decimal_places=2)
+        self.assertEqual(field.get_prep_value(Decimal('12.50')), 1250)
+        self.assertEqual(field.get_prep_value('0.07'), 7)
+        self.assertEqual(field.from_db_value(1250, None, None), Decimal('12.50'))
+        # Le medie calcolate dal database arrivano come float
+        self.assertEqual(field.from_db_value(211.666, None, None), Decimal('2.12'))
+        self.assertIsNone(field.from_db_value(None, None, None))
+        self.assertEqual(field.formfield().decimal_places, 2)
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models.aggregated import MonthlyTransactionAggregation
+        cache.clear()
+        self.salary = TransactionCategory.objects.create(name="Salary", transaction_type="income")
+        self.groceries = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.rent = TransactionCategory.objects.create(name="Rent", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Dashboard Account", account_type="checking",
+            initial_balance=Decimal('100.00'), institution="Test Bank"
+        )
+        for day, amount, transaction_type, category in (
+            (date(2024, 2, 20), '500.00', 'income', self.salary),
+            (date(2024, 3, 1), '1000.00', 'income', self.salary),
+            (date(2024, 3, 10), '200.00', 'expense', self.groceries),
+            # Ricorrente con data futura rispetto al 15 marzo
+            (date(2024, 3, 20), '50.00', 'expense', self.rent),
+        ):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal(amount),
+                transaction_type=transaction_type, category=category
+            )
+        MonthlyTransactionAggregation.aggregate_transactions(year=2024, month=3)
+        # Creata dopo l'aggiornamento dell'aggregazione
+        Transaction.objects.create(
+            account=self.account, date=date(2024, 3, 15), amount=Decimal('30.00'),
+            transaction_type='expense', category=self.rent
+        )
+
+    def test_month_to_date_from_aggregation_plus_delta(self):
+        from .services.dashboard import summary
+        data = summary(self.account, today=date(2024, 3, 15))
+        self.assertEqual(data['month_income'], Decimal('1000.00'))
+        self.assertEqual(data['month_expense'], Decimal('230.00'))
+        self.assertEqual(data['month_net'], Decimal('770.00'))
+        self.assertEqual(
+            [(category['name'], category['total']) for category in data['top_categories']],
+            [("Groceries", Decimal('200.00')), ("Rent", Decimal('30.00'))],
+        )
+        self.assertEqual(data['net_worth'], self.account.get_balance_at_date(date(2024, 3, 15)))
+
+        # Letto dalla cache fino alla scadenza
+        with self.assertNumQueries(0):
+            self.assertEqual(summary(self.account, today=date(2024, 3, 15)), data)
+
+    def test_month_to_date_follows_edits_and_deletes(self):
+        from .services.dashboard import compute_summary
+        from .models.aggregated import MonthlyTransactionAggregation
+        groceries = Transaction.objects.get(category=self.groceries)
+        extra = Transaction.objects.create(
+            account=self.account, date=date(2024, 3, 5), amount=Decimal('20.00'),
+            transaction_type='expense', category=self.groceries
+        )
+        MonthlyTransactionAggregation.aggregate_transactions(year=2024, month=3)
+
+        extra.delete()
+        groceries.amount = Decimal('5.00')
+        groceries.save()
+        # Spostata in un altro gruppo: il gruppo di partenza viene ricalcolato
+        rent = Transaction.objects.get(category=self.rent, date=date(2024, 3, 15))
+        rent.category = self.groceries
+        rent.save()
+
+        data = compute_summary(date(2024, 3, 15), self.account)
+        self.assertEqual(data['month_expense'], Decimal('35.00'))
+        self.assertEqual(
+            [(category['name'], category['total']) for category in data['top_categories']],
+            [("Groceries", Decimal('35.00'))],
+        )
+
+    def test_net_worth_from_closing_and_aggregations(self):
+        from .models.aggregated import MonthlyTransactionAggregation
+        from .services.archive import clear_closed_until, close_period
+        from .services.dashboard import compute_summary
+        self.addCleanup(clear_closed_until, sender=None)
+        for day, amount, transaction_type in (
+            (date(2024, 1, 10), '100.00', 'expense'),
+            (date(2024, 1, 20), '40.00', 'income'),
+        ):
+            Transaction.objects.create(
+                account=self.account, date=day, amount=Decimal(amount),
+                transaction_type=transaction_type, category=self.salary if transaction_type == 'income' else self.rent
+            )
+        close_period(date(2024, 1, 15))
+        MonthlyTransactionAggregation.aggregate_transactions(year=2024, month=2)
+        february = Transaction.objects.get(date=date(2024, 2, 20))
+        february.amount = Decimal('600.00')
+        february.save()
+
+        for today in (date(2024, 3, 15), date(2024, 3, 31)):
+            data = compute_summary(today, self.account)
+            self.assertEqual(data['net_worth'], self.account.get_balance_at_date(today))
+        self.assertEqual(compute_summary(date(2024, 3, 15))['net_worth'], Decimal('1410.00'))
+
+    def test_dashboard_api(self):
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        self.client.force_login(get_user_model().objects.create_user(username='dashboard', password='secret'))
+        response = self.client.get(reverse('transactions:api_dashboard'), {'account': self.account.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('net_worth', response.json())
+        self.assertEqual(self.client.get(reverse('transactions:api_dashboard'), {'account': 0}).status_code, 404)
+
+
+class PartialRenderingTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        self.client.force_login(get_user_model().objects.create_user(username='htmx', password='secret'))
+        self.category = TransactionCategory.objects.create(name="Groceries", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Htmx Account", account_type="checking",
+            initial_balance=Decimal('100.00'), institution="Test Bank"
+        )
+        self.transaction = Transaction.objects.create(
+            account=self.account, date=date.today(), amount=Decimal('40.00'),
+            transaction_type="expense", category=self.category
+        )
+
+    def test_create_returns_only_the_new_row(self):
+        from django.urls import reverse
+        response = self.client.post(reverse('transactions:expense_view'), {
+            'create_transaction': '', 'date': date.today().isoformat(), 'amount': '12.00',
+            'transaction_type': 'expense', 'category': self.category.pk, 'account': self.account.pk,
+        }, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 201)
+        created = Transaction.objects.latest('pk')
+        self.assertTrue(response.content.decode().strip().startswith(f'<tr id="transaction-{created.pk}">'))
+
+        response = self.client.post(reverse('transactions:expense_view'), {
+            'create_transaction': '', 'amount': '-1',
+        }, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.headers['HX-Retarget'], '#create-transaction-form')
+        self.assertContains(response, 'id="create-transaction-form"')
+        self.assertNotContains(response, '<table')
+
+    def test_row_delete_returns_empty_response(self):
+        from django.urls import reverse
+        response = self.client.post(
+            reverse('transactions:transaction_detail_view', args=[self.transaction.pk]),
+            {'delete_transaction': '1'},
+            HTTP_HX_REQUEST='true', HTTP_HX_TARGET=f'transaction-{self.transaction.pk}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertFalse(Transaction.objects.filter(pk=self.transaction.pk).exists())
+
+    def test_invalid_update_shows_stored_values(self):
+        from django.urls import reverse
+        from django.utils.formats import date_format
+        from .services.archive import clear_closed_until, close_period
+        close_period(date.today() - timedelta(days=10))
+        self.addCleanup(clear_closed_until, sender=None)
+        response = self.client.post(
+            reverse('transactions:transaction_detail_view', args=[self.transaction.pk]), {
+                'update_transaction': '', 'date': (date.today() - timedelta(days=20)).isoformat(),
+                'amount': '99.00', 'transaction_type': 'expense',
+                'category': self.category.pk, 'account': self.account.pk,
+            }, HTTP_HX_REQUEST='true',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('date', response.context['form'].errors)
+        info = response.content.decode().split('id="transaction-info"', 1)[1]
+        self.assertIn(date_format(date.today()), info)
+        self.assertIn('40.00', info)
+        self.assertNotIn('99.00', info)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.amount, Decimal('40.00'))
+
+    def test_htmx_is_served_from_static_files(self):
+        from django.templatetags.static import static
+        from django.urls import reverse
+        response = self.client.get(reverse('transactions:expense_view'))
+        self.assertContains(response, static('transactions/js/htmx.min.js'))
+        self.assertNotContains(response, 'unpkg.com')
+
+    def test_daily_balances_fragment_is_cached_until_transactions_change(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        url = reverse('transactions:account_detail_view', args=[self.account.id])
+        self.assertContains(self.client.get(url), '60.00')
+
+        # Dalla cache: i totali giornalieri non vengono ricalcolati
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(url), '60.00')
+        self.assertFalse([query for query in queries if 'total_income' in query['sql']])
+
+        Transaction.objects.create(
+            account=self.account, date=date.today(), amount=Decimal('10.00'),
+            transaction_type="expense", category=self.category
+        )
+        self.assertContains(self.client.get(url), '50.00')
+
+
+class AnomalyTestCase(TestCase):
+    def setUp(self):
+        self.category = TransactionCategory.objects.create(name="Utilities", transaction_type="expense")
+        self.account = Account.objects.create(
+            name="Anomaly Account", account_type="checking",
+            initial_balance=Decimal('1000.00'), institution="Test Bank"
+        )
+        for day, amount in enumerate(['50.00', '52.00', '48.00', '51.00', '49.00', '50.00'], start=1):
+            self.create(amount, "Bolletta luce 0%d/2024" % day, date(2024, 1, day))
+
+    def create(self, amount, description, day=None):
+        return Transaction.objects.create(
+            account=self.account, date=day or date(2024, 2, 1), amount=Decimal(amount),
+            transaction_type="expense", category=self.category, description=description
+        )
+
+    def test_statistics_follow_writes(self):
+        from statistics import mean, variance
+        from .models.anomaly import CategoryStats
+        stats = CategoryStats.objects.get(account=self.account, category=self.category)
+        amounts = [50, 52, 48, 51, 49, 50]
+        self.assertEqual(stats.count, 6)
+        self.assertAlmostEqual(stats.mean, mean(amounts))
+        self.assertAlmostEqual(stats.variance, variance(amounts))
+
+        transaction = Transaction.objects.filter(account=self.account).latest('pk')
+        transaction.amount = Decimal('56.00')
+        transaction.save()
+        transaction = Transaction.objects.filter(account=self.account).earliest('pk')
+        transaction.delete()
+        amounts = [52, 48, 51, 49, 56]
+        stats.refresh_from_db()
+        self.assertEqual(stats.count, 5)
+        self.assertAlmostEqual(stats.mean, mean(amounts))
+        self.assertAlmostEqual(stats.variance, variance(amounts))
+
+    def test_unusual_amount_and_description_are_flagged(self):
+        from .models.anomaly import TransactionAnomaly
+        usual = self.create('51.00', "BOLLETTA LUCE 07/2024")
+        self.assertFalse(TransactionAnomaly.objects.filter(transaction=usual).exists())
+
+        large = self.create('400.00', "Bolletta luce 08/2024")
+        self.assertGreater(large.anomaly.amount_score, 3)
+        self.assertFalse(large.anomaly.new_description)
+
+        unknown = self.create('50.00', "Bonifico sconosciuto")
+        self.assertIsNone(unknown.anomaly.amount_score)
+        self.assertTrue(unknown.anomaly.new_description)
+
+        # Correggendo l'importo la segnalazione sparisce
+        large.amount = Decimal('50.00')
+        large.save()
+        self.assertFalse(TransactionAnomaly.objects.filter(transaction=large).exists())
+
+    def test_expense_list_shows_flag(self):
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+        self.client.force_login(get_user_model().objects.create_user(username='anomaly', password='secret'))
+        self.create('400.00', "Bolletta luce 08/2024")
+        response = self.client.get(reverse('transactions:expense_view'))
+        self.assertContains(response, 'Insolita', count=1)
+
+    def test_rebuild_matches_incremental_statistics(self):
+        from .models.anomaly import CategoryStats, KnownDescription
+        from .services import anomaly
+        before = CategoryStats.objects.get(account=self.account, category=self.category)
+        self.assertEqual(anomaly.rebuild(), Transaction.objects.count())
+        after = CategoryStats.objects.get(account=self.account, category=self.category)
+        self.assertEqual(after.count, before.count)
+        self.assertAlmostEqual(after.mean, before.mean)
+        self.assertAlmostEqual(after.m2, before.m2)
+        self.assertEqual(KnownDescription.objects.filter(account=self.account).count(), 1)
@@ -1,5 +1,12 @@
 from django.urls import path
 from .views.base import *
+from .views.bulk import TransactionBulkView
+from .views.jobs import JobStatusView, JobDetailView
+from .views.asynchronous import AsyncAccountView, AsyncAccountDetailView, AsyncIncomeView, AsyncExpenseView
+from .views.api import (
+    AccountApiView, CategoryApiView, TransactionApiView, TransactionApiDetailView, AggregationApiView,
+    DashboardApiView,
+)
 
 app_name = 'transactions'
 
@@ -9,6 +16,21 @@ urlpatterns = [
     path('income/', IncomeView.as_view(), name='income_view'),
     path('expense/', ExpenseView.as_view(), name='expense_view'),
     path('transaction/<int:transaction_id>/', TransactionDetailView.as_view(), name='transaction_detail_view'),
+    path('transaction/bulk/', TransactionBulkView.as_view(), name='transaction_bulk_view'),
     path('categories/', CategoryView.as_view(), name='category_view'),
     path('categories/<int:category_id>/', CategoryDetailView.as_view(), name='category_detail_view'),
+    path('jobs/', JobStatusView.as_view(), name='job_status_view'),
+    path('jobs/<int:job_id>/', JobDetailView.as_view(), name='job_detail'),
+
+    path('async/accounts/', AsyncAccountView.as_view(), name='async_account_view'),
+    path('async/accounts/<int:account_id>/', AsyncAccountDetailView.as_view(), name='async_account_detail_view'),
+    path('async/income/', AsyncIncomeView.as_view(), name='async_income_view'),
+    path('async/expense/', AsyncExpenseView.as_view(), name='async_expense_view'),
+
+    path('api/accounts/', AccountApiView.as_view(), name='api_accounts'),
+    path('api/categories/', CategoryApiView.as_view(), name='api_categories'),
+    path('api/transactions/', TransactionApiView.as_view(), name='api_transactions'),
+    path('api/transactions/<int:transaction_id>/', TransactionApiDetailView.as_view(), name='api_transaction_detail'),
+    path('api/aggregations/<str:period>/', AggregationApiView.as_view(), name='api_aggregations'),
+    path('api/dashboard/', DashboardApiView.as_view(), name='api_dashboard'),
 ]
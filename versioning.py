@@ -0,0 +1,28 @@
+"""
+Numeri di versione condivisi tramite la cache di Django, usati per invalidare
+strutture costruite una volta per processo (matcher compilati, elenchi di
+scelte, ...). Con una cache condivisa (Redis, Memcached) il cambio di versione
+è visto da tutti i processi; con LocMemCache solo da quello corrente.
+"""
+from django.core.cache import cache
+
+
+def _key(name):
+    return f'transactions:version:{name}'
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), 1, timeout=None)
+        version = cache.get(_key(name), 1)
+    return version
+
+
+def bump_version(name):
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        # Chiave assente o scaduta
+        cache.set(_key(name), 2, timeout=None)
+        return 2
@@ -0,0 +1,328 @@
+import base64
+import hashlib
+import json
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, Max, Count
+from django.http import JsonResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.gzip import gzip_page
+
+from transactions.models.base import Account, Transaction, TransactionCategory
+from transactions.services import dashboard, fx
+from transactions.models.aggregated import (
+    DailyTransactionAggregation,
+    WeeklyTransactionAggregation,
+    MonthlyTransactionAggregation,
+    QuarterlyTransactionAggregation,
+    YearlyTransactionAggregation,
+)
+
+
+# JSON senza spazi superflui: payload più piccoli e più comprimibili
+COMPACT_JSON = {'separators': (',', ':')}
+
+
+class ApiError(Exception):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ApiError('Invalid cursor.')
+
+
+@method_decorator(gzip_page, name='dispatch')
+class ApiListView(LoginRequiredMixin, View):
+    """
+    Vista JSON di sola lettura con selezione dei campi (`?fields=`),
+    paginazione a cursore e GET condizionale.
+
+    Le risorse che dichiarano `modified_field` ricavano ETag e Last-Modified da
+    un solo aggregato (massimo e conteggio) e rispondono 304 senza caricare la
+    pagina; le altre usano l'hash del corpo come ETag.
+    """
+    model = None
+    # nome pubblico -> lookup per values()
+    fields = {}
+    default_fields = None
+    # campi di ordinamento, usati anche come chiave del cursore
+    ordering = ('id',)
+    # parametro della query -> lookup del filtro
+    filters = {}
+    modified_field = None
+    page_size = 100
+    max_page_size = 1000
+
+    def get_queryset(self, request, fields):
+        return self.model.objects.all()
+
+    def get_fields(self, request):
+        requested = request.GET.get('fields')
+        if not requested:
+            return list(self.default_fields or self.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}.")
+        return names
+
+    def filter_queryset(self, request, queryset):
+        for param, lookup in self.filters.items():
+            value = request.GET.get(param)
+            if value not in (None, ''):
+                try:
+                    queryset = queryset.filter(**{lookup: value})
+                except (ValueError, ValidationError):
+                    raise ApiError(f"Invalid value for '{param}'.")
+        return queryset
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.GET.get('limit', self.page_size))
+        except ValueError:
+            raise ApiError('Invalid limit.')
+        return max(1, min(size, self.max_page_size))
+
+    def apply_cursor(self, queryset, cursor):
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ApiError('Invalid cursor.')
+        if not all(isinstance(value, (str, int, float)) for value in values):
+            raise ApiError('Invalid cursor.')
+
+        # Keyset: (a, b) > (va, vb) diventa a > va OR (a = va AND b > vb)
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            step = Q(**{f"{name}__{'lt' if field.startswith('-') else 'gt'}": values[i]})
+            for previous, value in zip(self.ordering[:i], values[:i]):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        try:
+            return queryset.filter(condition)
+        except (ValueError, TypeError, ValidationError):
+            raise ApiError('Invalid cursor.')
+
+    def get_validators(self, queryset):
+        if not self.modified_field:
+            return None, None
+        summary = queryset.order_by().aggregate(last=Max(self.modified_field), count=Count('pk'))
+        last_modified = summary['last']
+        key = f"{self.request.get_full_path()}|{last_modified}|{summary['count']}"
+        etag = hashlib.md5(key.encode()).hexdigest()
+        return etag, (int(last_modified.timestamp()) if last_modified else None)
+
+    def not_modified(self, request, etag, last_modified):
+        response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+        if response is not None:
+            response.headers['ETag'] = quote_etag(etag)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = self.get_fields(request)
+            queryset = self.filter_queryset(request, self.get_queryset(request, fields))
+
+            etag, last_modified = self.get_validators(queryset)
+            if etag:
+                response = self.not_modified(request, etag, last_modified)
+                if response is not None:
+                    return response
+
+            page_size = self.get_page_size(request)
+            cursor = request.GET.get('cursor')
+            if cursor:
+                queryset = self.apply_cursor(queryset, cursor)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        keys = [field.lstrip('-') for field in self.ordering]
+        lookups = {self.fields[name]: name for name in fields}
+        rows = list(
+            queryset.order_by(*self.ordering).values(*dict.fromkeys([*lookups, *keys]))[:page_size + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor([rows[-1][key] for key in keys])
+
+        results = [{name: row[lookup] for lookup, name in lookups.items()} for row in rows]
+        response = JsonResponse(
+            {'results': results, 'next': next_cursor},
+            json_dumps_params=COMPACT_JSON,
+        )
+
+        if etag is None:
+            etag = hashlib.md5(response.content).hexdigest()
+            not_modified = self.not_modified(request, etag, None)
+            if not_modified is not None:
+                return not_modified
+        response.headers['ETag'] = quote_etag(etag)
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class AccountApiView(ApiListView):
+    model = Account
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'account_type': 'account_type',
+        'institution': 'institution',
+        'initial_balance': 'initial_balance',
+        'balance': 'balance',
+        'created_at': 'created_at',
+        'is_active': 'is_active',
+    }
+    filters = {
+        'account_type': 'account_type',
+        'is_active': 'is_active',
+    }
+
+    def get_queryset(self, request, fields):
+        # Il saldo si calcola solo se richiesto, in un'unica query
+        if 'balance' in fields:
+            return Account.objects.with_balance()
+        return Account.objects.all()
+
+
+class CategoryApiView(ApiListView):
+    model = TransactionCategory
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'transaction_type': 'transaction_type',
+        'parent': 'parent_id',
+        'description': 'description',
+    }
+    filters = {
+        'type': 'transaction_type',
+        'parent': 'parent_id',
+    }
+
+
+class TransactionApiView(ApiListView):
+    model = Transaction
+    fields = {
+        'id': 'id',
+        'date': 'date',
+        'amount': 'amount',
+        'transaction_type': 'transaction_type',
+        'account': 'account_id',
+        'category': 'category_id',
+        'description': 'description',
+        'created_at': 'created_at',
+        'modified_at': 'modified_at',
+    }
+    ordering = ('-date', '-id')
+    filters = {
+        'type': 'transaction_type',
+        'account': 'account_id',
+        'category': 'category_id',
+        'date_from': 'date__gte',
+        'date_to': 'date__lte',
+        'modified_since': 'modified_at__gt',
+    }
+    modified_field = 'modified_at'
+
+
+class TransactionApiDetailView(TransactionApiView):
+    def get(self, request, transaction_id, *args, **kwargs):
+        try:
+            fields = self.get_fields(request)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        lookups = {self.fields[name]: name for name in fields}
+        row = Transaction.objects.filter(pk=transaction_id).values(*lookups, 'modified_at').first()
+        if row is None:
+            raise Http404('Transaction not found.')
+
+        key = f"{request.get_full_path()}|{row['modified_at']}"
+        etag = hashlib.md5(key.encode()).hexdigest()
+        last_modified = int(row['modified_at'].timestamp())
+        response = self.not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        response = JsonResponse(
+            {name: row[lookup] for lookup, name in lookups.items()},
+            json_dumps_params=COMPACT_JSON,
+        )
+        response.headers['ETag'] = quote_etag(etag)
+        response.headers['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+AGGREGATION_COMMON_FIELDS = {
+    'id': 'id',
+    'account': 'account_id',
+    'category': 'category_id',
+    'transaction_type': 'transaction_type',
+    'total_amount': 'total_amount',
+    'transaction_count': 'transaction_count',
+    'average_transaction_amount': 'average_transaction_amount',
+    'updated_at': 'updated_at',
+}
+
+# periodo -> (modello, campi del periodo)
+AGGREGATION_PERIODS = {
+    'daily': (DailyTransactionAggregation, ('date',)),
+    'weekly': (WeeklyTransactionAggregation, ('year', 'week')),
+    'monthly': (MonthlyTransactionAggregation, ('year', 'month')),
+    'quarterly': (QuarterlyTransactionAggregation, ('year', 'quarter')),
+    'yearly': (YearlyTransactionAggregation, ('year',)),
+}
+
+
+class AggregationApiView(ApiListView):
+    modified_field = 'updated_at'
+
+    def dispatch(self, request, *args, **kwargs):
+        if kwargs.get('period') not in AGGREGATION_PERIODS:
+            raise Http404('Unknown aggregation period.')
+        self.model, period_fields = AGGREGATION_PERIODS[kwargs['period']]
+        self.fields = {**{name: name for name in period_fields}, **AGGREGATION_COMMON_FIELDS}
+        self.ordering = (*(f'-{name}' for name in period_fields), '-id')
+        self.filters = {
+            'account': 'account_id',
+            'category': 'category_id',
+            'type': 'transaction_type',
+            **{name: name for name in period_fields if name != 'date'},
+            **({'date_from': 'date__gte', 'date_to': 'date__lte'} if 'date' in period_fields else {}),
+        }
+        return super().dispatch(request, *args, **kwargs)
+
+
+class DashboardApiView(LoginRequiredMixin, View):
+    """
+    Indicatori del mese corrente per tutti i conti o per `?account=`
+    """
+
+    def get(self, request, *args, **kwargs):
+        account = None
+        if request.GET.get('account'):
+            try:
+                account = Account.objects.get(pk=request.GET['account'])
+            except (Account.DoesNotExist, ValueError, ValidationError):
+                raise Http404('Account not found.')
+        try:
+            summary = dashboard.summary(account)
+        except fx.ExchangeRateMissing as e:
+            return JsonResponse({'error': f'{e}.'}, status=409)
+        return JsonResponse(summary, json_dumps_params=COMPACT_JSON)
@@ -0,0 +1,144 @@
+"""
+Varianti asincrone delle viste di sola lettura, da servire sotto ASGI.
+
+Le query vengono eseguite con l'ORM asincrono (aget e iterazione async); il
+rendering, che legge le opzioni dei form da services.choices, gira in un
+thread tramite sync_to_async.
+Le POST sono delegate alle viste sincrone originali.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.mixins import AccessMixin
+from django.http import Http404
+from django.shortcuts import render
+from django.views import View
+
+from transactions.models.base import Account, Transaction
+from transactions.models.currency import REPORTING_CURRENCY, currency_symbol
+from transactions.services import fx, search
+from transactions.services.fragments import fragment_context
+from transactions.forms import AccountForm, TransferFundsForm, TransactionForm, RecurringTransactionForm
+from transactions.views.base import AccountView, AccountDetailView, IncomeView, ExpenseView
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """
+    Equivalente asincrono di LoginRequiredMixin: carica l'utente con
+    request.auser() invece di valutare request.user nel loop degli eventi.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        if hasattr(request, 'auser'):
+            user = await request.auser()
+        else:
+            # Django < 5.0: valutiamo l'utente pigro in un thread
+            def load_user():
+                request.user.is_authenticated
+                return request.user
+            user = await sync_to_async(load_user)()
+        request.user = user
+        if not user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+def delegate_post(sync_view_class):
+    """
+    Esegue la POST della vista sincrona corrispondente in un thread
+    """
+    sync_view = sync_to_async(sync_view_class.as_view())
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_view(request, *args, **kwargs)
+
+    return post
+
+
+async def render_async(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+class AsyncAccountView(AsyncLoginRequiredMixin, View):
+    template_name = AccountView.template_name
+
+    async def get(self, request, *args, **kwargs):
+        # Tutti i saldi in un'unica query annotata invece di un aggregato per conto
+        account_balances = {
+            account: account.balance async for account in Account.objects.with_balance()
+        }
+        try:
+            total_balance = await sync_to_async(fx.total_balance)(account_balances)
+        except fx.ExchangeRateMissing as e:
+            await sync_to_async(messages.warning)(request, f'Total balance unavailable: {e}.')
+            total_balance = None
+
+        return await render_async(request, self.template_name, {
+            'total_balance': total_balance,
+            'reporting_currency_symbol': currency_symbol(REPORTING_CURRENCY),
+            'account_balances': account_balances,
+            'account_form': AccountForm(),
+        })
+
+    post = delegate_post(AccountView)
+
+
+class AsyncAccountDetailView(AsyncLoginRequiredMixin, View):
+    template_name = AccountDetailView.template_name
+
+    async def get(self, request, account_id, *args, **kwargs):
+        try:
+            account = await Account.objects.aget(id=account_id)
+        except Account.DoesNotExist:
+            raise Http404('Account not found.')
+
+        # I totali giornalieri partono dall'ultima chiusura di periodo
+        start_date, opening, _ = await sync_to_async(account.opening_balance)()
+        totals = [row async for row in Account.daily_totals(account_id, since=start_date)]
+
+        return await render_async(request, self.template_name, {
+            'account': account,
+            'form': AccountForm(instance=account),
+            'transfer_form': TransferFundsForm(initial={'source_fund': account}),
+            'daily_balances': Account.accumulate_daily_balances(opening, totals),
+            **await sync_to_async(fragment_context)(),
+        })
+
+    post = delegate_post(AccountDetailView)
+
+
+class AsyncTransactionListView(AsyncLoginRequiredMixin, View):
+    transaction_type = None
+
+    async def get(self, request, *args, **kwargs):
+        queryset = Transaction.objects.filter(
+            transaction_type=self.transaction_type
+        ).select_related('account', 'category', 'anomaly').order_by('-date', '-created_at')
+        query = request.GET.get('q', '').strip()
+
+        if query:
+            transaction_list = await sync_to_async(search.search_transactions)(queryset, query)
+        else:
+            transaction_list = [transaction async for transaction in queryset]
+
+        initial = {'transaction_type': self.transaction_type}
+        return await render_async(request, self.template_name, {
+            'transactions': transaction_list,
+            'query': query,
+            'transaction_form': TransactionForm(initial=initial, transaction_type=self.transaction_type),
+            'recurring_transaction_form': RecurringTransactionForm(initial=initial, transaction_type=self.transaction_type),
+            **await sync_to_async(fragment_context)(),
+        })
+
+
+class AsyncIncomeView(AsyncTransactionListView):
+    template_name = IncomeView.template_name
+    transaction_type = 'income'
+
+    post = delegate_post(IncomeView)
+
+
+class AsyncExpenseView(AsyncTransactionListView):
+    template_name = ExpenseView.template_name
+    transaction_type = 'expense'
+
+    post = delegate_post(ExpenseView)
@@ -1,34 +1,62 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import HttpResponse
+from django.urls import reverse
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from transactions.models.base import *
 from transactions.forms import *
+from transactions.models.currency import REPORTING_CURRENCY, currency_symbol
+from transactions.services import fx, search
+from transactions.services.fragments import fragment_context
+from transactions.services.bulk import BulkItemError
+from transactions.services.recurring import schedule_recurring
 from django.contrib import messages
-from datetime import timedelta
 from django.db import transaction
-from dateutil.relativedelta import relativedelta
 from django.utils import timezone
 
 
+def is_htmx(request):
+    return request.headers.get('HX-Request') == 'true'
+
+
+def render_partial(request, template_name, context, status=200, retarget=None, reswap=None):
+    """
+    Risposta a una richiesta HTMX con il solo frammento cambiato (righe o
+    form); retarget e reswap cambiano il punto della pagina da sostituire
+    """
+    response = render(request, template_name, context, status=status)
+    if retarget:
+        response.headers['HX-Retarget'] = retarget
+    if reswap:
+        response.headers['HX-Reswap'] = reswap
+    return response
+
+
 class AccountView(LoginRequiredMixin, View):
     template_name = 'transactions/account.html'
     
     def get(self, request, *args, **kwargs):
-        # Recupera tutti i conti bancari
-        accounts = Account.objects.all()
+        return render(request, self.template_name, self.get_balances_context(request))
 
+    def get_balances_context(self, request):
         # Crea un dizionario con account come chiave e il saldo corrente come valore
         account_balances = {
-            account: account.current_balance() for account in accounts
+            account: account.current_balance() for account in Account.objects.all()
         }
-        
-        total_balance = sum(account_balances.values())
 
-        return render(request, self.template_name, {
+        # Il totale somma conti in valute diverse: lo esprimiamo nella valuta di report
+        try:
+            total_balance = fx.total_balance(account_balances)
+        except fx.ExchangeRateMissing as e:
+            messages.warning(request, f'Total balance unavailable: {e}.')
+            total_balance = None
+
+        return {
             'total_balance': total_balance,
+            'reporting_currency_symbol': currency_symbol(REPORTING_CURRENCY),
             'account_balances': account_balances,
             'account_form': AccountForm(),
-        })
+        }
 
     def post(self, request, *args, **kwargs):
         if 'create_account' in request.POST:
@@ -39,18 +67,7 @@ class AccountView(LoginRequiredMixin, View):
                 return redirect('transactions:account_view')
 
         # In caso di errore, ricarica i conti bancari e il form
-        accounts = Account.objects.all()
-        account_balances = {
-            account: account.current_balance() for account in accounts
-        }
-        
-        total_balance = sum(account_balances.values())
-
-        return render(request, self.template_name, {
-            'total_balance': total_balance,
-            'account_balances': account_balances,
-            'account_form': AccountForm(),
-        })
+        return render(request, self.template_name, self.get_balances_context(request))
 
 
 class AccountDetailView(LoginRequiredMixin, View):
@@ -61,22 +78,31 @@ class AccountDetailView(LoginRequiredMixin, View):
         form = AccountForm(instance=account) 
         transfer_form = TransferFundsForm(initial={'source_fund': account})
 
-        # Calcola il bilancio giornaliero
-        daily_balances = account.get_daily_balances()
-
         return render(request, self.template_name, {
             'account': account,
             'form': form,
             'transfer_form': transfer_form,
-            'daily_balances': daily_balances
+            # Calcolato dal template solo se la tabella non è in cache
+            'daily_balances': account.get_daily_balances,
+            **fragment_context(),
         })
 
     def post(self, request, account_id, *args, **kwargs):
         # Identifica il fondo attualmente selezionato come source_fund
         account = get_object_or_404(Account, id=account_id) 
         form = AccountForm(request.POST, instance=account) 
+        # Il form non inviato viene mostrato vuoto in caso di errore
+        transfer_form = TransferFundsForm(initial={'source_fund': account})
         
         if 'update_account' in request.POST:
+            if is_htmx(request):
+                if form.is_valid():
+                    form.save()
+                return render_partial(request, 'transactions/partials/account_form.html', {
+                    'account': account,
+                    'form': form,
+                    'saved': form.is_valid(),
+                })
             if form.is_valid():
                 form.save()
                 messages.success(request, 'Account updated successfully!')
@@ -85,6 +111,10 @@ class AccountDetailView(LoginRequiredMixin, View):
         elif 'delete_account' in request.POST:
             account.delete()
             messages.success(request, 'Account deleted successfully!')
+            if is_htmx(request):
+                response = HttpResponse('')
+                response.headers['HX-Redirect'] = reverse('transactions:account_view')
+                return response
             return redirect('transactions:account_view')
 
         elif 'transfer_funds' in request.POST:
@@ -143,102 +173,89 @@ class AccountDetailView(LoginRequiredMixin, View):
             'account': account,
             'form': form,
             'transfer_form': transfer_form,
+            'daily_balances': account.get_daily_balances,
+            **fragment_context(),
         })
 
 
+# Etichette del pulsante del form di creazione, usate anche dalle risposte parziali
+TRANSACTION_FORM_LABELS = {
+    'income': 'Crea Entrata',
+    'expense': 'Crea Spesa',
+}
+
+
 class IncomeView(LoginRequiredMixin, View):
     template_name = 'transactions/income.html'
 
     def get(self, request, *args, **kwargs):
         # Filtra solo le transazioni di tipo 'income'
-        transactions = Transaction.objects.filter(transaction_type='income').order_by('-date')
-        transaction_form = TransactionForm(
-                initial={
-                    'transaction_type': 'income', 
-                    'category': TransactionCategory.objects.filter(transaction_type='income')
-                })
-        recurring_transaction_form = RecurringTransactionForm(
-                initial={
-                    'transaction_type': 'income', 
-                    'category': TransactionCategory.objects.filter(transaction_type='income')
-                })
+        transactions = Transaction.objects.filter(transaction_type='income').select_related('account', 'category', 'anomaly').order_by('-date', '-created_at')
+        query = request.GET.get('q', '').strip()
+        if query:
+            # Risultati della ricerca full-text, dal più rilevante
+            transactions = search.search_transactions(transactions, query)
+        transaction_form = TransactionForm(initial={'transaction_type': 'income'}, transaction_type='income')
+        recurring_transaction_form = RecurringTransactionForm(initial={'transaction_type': 'income'}, transaction_type='income')
 
         return render(request, self.template_name, {
             'transactions': transactions,
+            'query': query,
             'transaction_form': transaction_form,
-            'recurring_transaction_form': recurring_transaction_form
+            'recurring_transaction_form': recurring_transaction_form,
+            **fragment_context(),
         })
 
     def post(self, request, *args, **kwargs):
+        # Il form non inviato viene mostrato vuoto in caso di errore
+        form = TransactionForm()
+        recurring_form = RecurringTransactionForm()
         if 'create_transaction' in request.POST:
             form = TransactionForm(request.POST)
             if form.is_valid():
                 form.instance.transaction_type = 'income'  # Imposta il tipo su 'income'
                 form.save()
+                if is_htmx(request):
+                    # Solo la nuova riga, in testa alla tabella
+                    return render_partial(request, 'transactions/partials/transaction_row.html', {
+                        'transaction': form.instance,
+                    }, status=201)
                 messages.success(request, 'Income transaction created successfully!')
                 return redirect('transactions:income_view')
+            elif is_htmx(request):
+                # Il form con gli errori al posto di quello inviato
+                return render_partial(request, 'transactions/partials/transaction_form.html', {
+                    'form': form,
+                    'action': reverse('transactions:income_view'),
+                    'transaction_type': 'income',
+                    'label': TRANSACTION_FORM_LABELS['income'],
+                }, retarget='#create-transaction-form', reswap='outerHTML')
             else:
                 messages.error(request, 'Error creating income transaction.')
 
         elif 'create_recurring_transaction' in request.POST:
             recurring_form = RecurringTransactionForm(request.POST)
             if recurring_form.is_valid():
-                start_date = recurring_form.cleaned_data['start_date']
-                end_date = recurring_form.cleaned_data.get('end_date')
-                frequency = recurring_form.cleaned_data['frequency']
-                category = recurring_form.cleaned_data['category']
-                amount = recurring_form.cleaned_data['amount']
-                description = recurring_form.cleaned_data.get('description')
-                account = recurring_form.cleaned_data['account']
-
-                # Crea la transazione per la data di inizio
-                Transaction.objects.create(
-                    date=start_date,
-                    amount=amount,
-                    description=description,
-                    transaction_type='income',
-                    category=category,
-                    account=account,
-                )
-
-                # Creazione delle transazioni ricorrenti
-                current_date = start_date
-                while current_date < end_date:
-                    # Calcola la prossima data in base alla frequenza
-                    if frequency == 'daily':
-                        current_date = current_date + timedelta(days=1)
-                    elif frequency == 'weekly':
-                        current_date = current_date + timedelta(weeks=1)
-                    elif frequency == 'monthly':
-                        # Usa relativedelta per gestire correttamente i mesi
-                        current_date = current_date + relativedelta(months=1)
-                    elif frequency == 'semi-annual':
-                        current_date = current_date + relativedelta(months=6)
-                    elif frequency == 'annual':
-                        current_date = current_date + relativedelta(years=1)
-
-                    # Crea la transazione per la nuova data
-                    if current_date <= end_date:
-                        Transaction.objects.create(
-                            date=current_date,
-                            amount=amount,
-                            description=description,
-                            transaction_type='income',
-                            category=category,
-                            account=account,
-                        )
-
-                messages.success(request, 'Recurring income transaction created successfully!')
+                try:
+                    job = schedule_recurring(recurring_form.cleaned_data, 'income')
+                except BulkItemError as e:
+                    messages.error(request, f'Error creating recurring income transaction: {e.errors}')
+                else:
+                    if job is not None:
+                        messages.success(request, 'Recurring income scheduled: the transactions will be created in the background.')
+                    else:
+                        messages.success(request, 'Recurring income transaction created successfully!')
                 return redirect('transactions:income_view')
             else:
                 messages.error(request, 'Error creating recurring income transaction.')
 
         # Ricarica le transazioni in caso di errore
-        transactions = Transaction.objects.filter(transaction_type='income').order_by('-date')
+        transactions = Transaction.objects.filter(transaction_type='income').select_related('account', 'category', 'anomaly').order_by('-date', '-created_at')
         return render(request, self.template_name, {
             'transactions': transactions,
             'transaction_form': form,
             'recurring_transaction_form': recurring_form,
+            **fragment_context(),
         })
 
 
@@ -247,94 +264,72 @@ class ExpenseView(LoginRequiredMixin, View):
 
     def get(self, request, *args, **kwargs):
         # Filtra solo le transazioni di tipo 'expense'
-        transactions = Transaction.objects.filter(transaction_type='expense').order_by('-date')
-        transaction_form = TransactionForm(
-                initial={
-                    'transaction_type': 'expense', 
-                    'category': TransactionCategory.objects.filter(transaction_type='expense')
-                })
-        recurring_transaction_form = RecurringTransactionForm(
-                initial={
-                    'transaction_type': 'expense', 
-                    'category': TransactionCategory.objects.filter(transaction_type='expense')
-                })
+        transactions = Transaction.objects.filter(transaction_type='expense').select_related('account', 'category', 'anomaly').order_by('-date', '-created_at')
+        query = request.GET.get('q', '').strip()
+        if query:
+            # Risultati della ricerca full-text, dal più rilevante
+            transactions = search.search_transactions(transactions, query)
+        transaction_form = TransactionForm(initial={'transaction_type': 'expense'}, transaction_type='expense')
+        recurring_transaction_form = RecurringTransactionForm(initial={'transaction_type': 'expense'}, transaction_type='expense')
 
         return render(request, self.template_name, {
             'transactions': transactions,
+            'query': query,
             'transaction_form': transaction_form,
-            'recurring_transaction_form': recurring_transaction_form
+            'recurring_transaction_form': recurring_transaction_form,
+            **fragment_context(),
         })
 
     def post(self, request, *args, **kwargs):
+        # Il form non inviato viene mostrato vuoto in caso di errore
+        form = TransactionForm()
+        recurring_form = RecurringTransactionForm()
         if 'create_transaction' in request.POST:
             form = TransactionForm(request.POST)
             if form.is_valid():
                 form.instance.transaction_type = 'expense'  # Imposta il tipo su 'expense'
                 form.save()
+                if is_htmx(request):
+                    # Solo la nuova riga, in testa alla tabella
+                    return render_partial(request, 'transactions/partials/transaction_row.html', {
+                        'transaction': form.instance,
+                    }, status=201)
                 messages.success(request, 'Expense transaction created successfully!')
                 return redirect('transactions:expense_view')
+            elif is_htmx(request):
+                # Il form con gli errori al posto di quello inviato
+                return render_partial(request, 'transactions/partials/transaction_form.html', {
+                    'form': form,
+                    'action': reverse('transactions:expense_view'),
+                    'transaction_type': 'expense',
+                    'label': TRANSACTION_FORM_LABELS['expense'],
+                }, retarget='#create-transaction-form', reswap='outerHTML')
             else:
                 messages.error(request, 'Error creating expense transaction.')
 
         elif 'create_recurring_transaction' in request.POST:
             recurring_form = RecurringTransactionForm(request.POST)
             if recurring_form.is_valid():
-                start_date = recurring_form.cleaned_data['start_date']
-                end_date = recurring_form.cleaned_data.get('end_date')
-                frequency = recurring_form.cleaned_data['frequency']
-                category = recurring_form.cleaned_data['category']
-                amount = recurring_form.cleaned_data['amount']
-                description = recurring_form.cleaned_data.get('description')
-                account = recurring_form.cleaned_data['account']
-
-                # Crea la transazione per la data di inizio
-                Transaction.objects.create(
-                    date=start_date,
-                    amount=amount,
-                    description=description,
-                    transaction_type='expense',
-                    category=category,
-                    account=account,
-                )
-
-                # Creazione delle transazioni ricorrenti
-                current_date = start_date
-                while current_date < end_date:
-                    # Calcola la prossima data in base alla frequenza
-                    if frequency == 'daily':
-                        current_date = current_date + timedelta(days=1)
-                    elif frequency == 'weekly':
-                        current_date = current_date + timedelta(weeks=1)
-                    elif frequency == 'monthly':
-                        # Usa relativedelta per gestire correttamente i mesi
-                        current_date = current_date + relativedelta(months=1)
-                    elif frequency == 'semi-annual':
-                        current_date = current_date + relativedelta(months=6)
-                    elif frequency == 'annual':
-                        current_date = current_date + relativedelta(years=1)
-
-                    # Crea la transazione per la nuova data
-                    if current_date <= end_date:
-                        Transaction.objects.create(
-                            date=current_date,
-                            amount=amount,
-                            description=description,
-                            transaction_type='expense',
-                            category=category,
-                            account=account,
-                        )
-
-                messages.success(request, 'Recurring expense transaction created successfully!')
+                try:
+                    job = schedule_recurring(recurring_form.cleaned_data, 'expense')
+                except BulkItemError as e:
+                    messages.error(request, f'Error creating recurring expense transaction: {e.errors}')
+                else:
+                    if job is not None:
+                        messages.success(request, 'Recurring expense scheduled: the transactions will be created in the background.')
+                    else:
+                        messages.success(request, 'Recurring expense transaction created successfully!')
                 return redirect('transactions:expense_view')
             else:
                 messages.error(request, 'Error creating recurring expense transaction.')
 
         # Ricarica le transazioni in caso di errore
-        transactions = Transaction.objects.filter(transaction_type='expense').order_by('-date')
+        transactions = Transaction.objects.filter(transaction_type='expense').select_related('account', 'category', 'anomaly').order_by('-date', '-created_at')
         return render(request, self.template_name, {
             'transactions': transactions,
             'transaction_form': form,
             'recurring_transaction_form': recurring_form,
+            **fragment_context(),
         })
 
 
@@ -356,6 +351,18 @@ class TransactionDetailView(LoginRequiredMixin, View):
         form = TransactionForm(request.POST, instance=transaction)
 
         if 'update_transaction' in request.POST:
+            if is_htmx(request):
+                # Il form (con gli eventuali errori) e la scheda aggiornata fuori banda
+                if form.is_valid():
+                    form.save()
+                else:
+                    # is_valid() ha già copiato i valori inviati sull'istanza:
+                    # la scheda deve mostrare quelli salvati
+                    transaction.refresh_from_db()
+                return render_partial(request, 'transactions/partials/transaction_update.html', {
+                    'transaction': transaction,
+                    'form': form,
+                })
             if form.is_valid():
                 form.save()
                 messages.success(request, 'Transaction updated successfully!')
@@ -369,8 +376,17 @@ class TransactionDetailView(LoginRequiredMixin, View):
         elif 'delete_transaction' in request.POST:
             transaction_type = transaction.transaction_type  # Salva il tipo per il redirect
             transaction.delete()
+            list_view = 'transactions:income_view' if transaction_type == 'income' else 'transactions:expense_view'
+            if is_htmx(request):
+                # Dalla riga della tabella: la riga viene sostituita dalla risposta vuota
+                if request.headers.get('HX-Target') == f'transaction-{transaction_id}':
+                    return HttpResponse('')
+                messages.success(request, 'Transaction deleted successfully!')
+                response = HttpResponse('')
+                response.headers['HX-Redirect'] = reverse(list_view)
+                return response
             messages.success(request, 'Transaction deleted successfully!')
-            return redirect('transactions:income_view' if transaction_type == 'income' else 'transactions:expense_view')
+            return redirect(list_view)
 
         return render(request, self.template_name, {
             'transaction': transaction,
@@ -0,0 +1,43 @@
+import json
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.views import View
+
+from transactions.services.bulk import apply_bulk
+
+
+BULK_MAX_ITEMS = getattr(settings, 'TRANSACTIONS_BULK_MAX_ITEMS', 10000)
+
+
+class TransactionBulkView(LoginRequiredMixin, View):
+    """
+    Endpoint JSON per creare, aggiornare e cancellare transazioni in blocco.
+
+    Accetta una lista di elementi (o un oggetto con chiave `transactions`) e
+    restituisce un risultato per elemento; `all_or_none` annulla l'intero lotto
+    al primo errore di validazione.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body)
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({'error': 'Invalid JSON payload.'}, status=400)
+
+        all_or_none = False
+        if isinstance(payload, dict):
+            all_or_none = bool(payload.get('all_or_none', False))
+            payload = payload.get('transactions')
+        if not isinstance(payload, list):
+            return JsonResponse({'error': 'Expected a list of transactions.'}, status=400)
+        if len(payload) > BULK_MAX_ITEMS:
+            return JsonResponse({'error': f'Too many items (max {BULK_MAX_ITEMS}).'}, status=400)
+
+        results = apply_bulk(payload, all_or_none=all_or_none)
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        status = 400 if all_or_none and 'error' in summary else 200
+        return JsonResponse({'summary': summary, 'results': results}, status=status)
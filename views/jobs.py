@@ -0,0 +1,67 @@
+from django.contrib import messages
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Count
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views import View
+
+from transactions.models.jobs import Job
+from transactions.services import jobs
+
+
+AGGREGATION_PERIODS = ('daily', 'weekly', 'monthly', 'quarterly', 'yearly')
+JOB_STATUS_LIMIT = 100
+
+
+class JobStatusView(LoginRequiredMixin, View):
+    """
+    Stato dei lavori in background e accodamento del ricalcolo delle aggregazioni
+    """
+    template_name = 'transactions/jobs.html'
+
+    def get(self, request, *args, **kwargs):
+        counts = dict(Job.objects.values_list('status').annotate(count=Count('pk')).order_by())
+        return render(request, self.template_name, {
+            'jobs': Job.objects.all()[:JOB_STATUS_LIMIT],
+            'counts': [(label, counts.get(status, 0)) for status, label in Job.STATUSES],
+            'periods': AGGREGATION_PERIODS,
+        })
+
+    def post(self, request, *args, **kwargs):
+        if 'rebuild_aggregations' in request.POST:
+            period = request.POST.get('period')
+            year = request.POST.get('year')
+            if period not in AGGREGATION_PERIODS or (year and not year.isdigit()):
+                messages.error(request, 'Invalid aggregation period or year.')
+                return redirect('transactions:job_status_view')
+            payload = {'period': period}
+            if year and period != 'daily':
+                payload['year'] = int(year)
+            elif year:
+                payload.update(start_date=f'{year}-01-01', end_date=f'{year}-12-31')
+            job = jobs.enqueue(
+                'aggregations.rebuild', payload, key=f"rebuild {period} {year or 'all'}",
+            )
+            messages.success(request, f'Aggregation rebuild queued (job #{job.pk}, {job.get_status_display()}).')
+        return redirect('transactions:job_status_view')
+
+
+class JobDetailView(LoginRequiredMixin, View):
+    """
+    Stato di un lavoro in JSON, per il polling delle pagine che lo hanno accodato
+    """
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(Job, pk=job_id)
+        return JsonResponse({
+            'id': job.pk,
+            'name': job.name,
+            'key': job.key,
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': job.max_attempts,
+            'run_after': job.run_after,
+            'finished_at': job.finished_at,
+            'result': job.result,
+            'error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+        })